@@ -0,0 +1,195 @@
+"""
+Drop-in fake for ``google.generativeai`` used by the offline benchmarks.
+
+``install()`` puts this module in ``sys.modules`` under ``google.generativeai`` so that
+``import google.generativeai as genai`` in konnect_ops.py picks it up. Behaviour is set with
+``configure_fake()`` (or KONNECTOPS_FAKE_* environment variables):
+
+- latency:          seconds before the first byte of every call
+- seconds_per_chunk: extra time per streamed chunk (and per chunk of a non-streamed answer)
+- chunks:           number of chunks an answer is split into
+- error_rate:       probability of a non-retryable error
+- rate_limit_every: every Nth call raises a 429 ResourceExhausted (0 disables)
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import threading
+import types
+
+SETTINGS = {
+    "latency": float(os.environ.get("KONNECTOPS_FAKE_LATENCY", "0.2")),
+    "seconds_per_chunk": float(os.environ.get("KONNECTOPS_FAKE_CHUNK_SECONDS", "0.02")),
+    "chunks": int(os.environ.get("KONNECTOPS_FAKE_CHUNKS", "20")),
+    "error_rate": float(os.environ.get("KONNECTOPS_FAKE_ERROR_RATE", "0")),
+    "rate_limit_every": int(os.environ.get("KONNECTOPS_FAKE_RATE_LIMIT_EVERY", "0")),
+    "seed": int(os.environ.get("KONNECTOPS_FAKE_SEED", "7")),
+}
+
+MODELS = [
+    {"name": "models/fake-embedding", "supported_generation_methods": ["embedContent"]},
+    {"name": "models/fake-gemini-pro", "supported_generation_methods": ["generateContent", "countTokens"]},
+    {"name": "models/fake-gemini-image", "supported_generation_methods": ["generateContent"]},
+]
+
+# 1x1 PNG returned by image-capable models.
+PNG_PIXEL = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d4944415478da63f8cfc0f01f0005000201a2a8f6e40000000049454e44ae426082"
+)
+
+_lock = threading.Lock()
+_rng = random.Random(SETTINGS["seed"])
+STATS = {"calls": 0, "stream_calls": 0, "errors": 0, "rate_limited": 0, "model_seconds": 0.0, "configured_keys": set()}
+
+
+class ResourceExhausted(Exception):
+    code = 429
+
+
+class InvalidArgument(Exception):
+    code = 400
+
+
+def configure_fake(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise TypeError(f"Unknown fake settings: {sorted(unknown)}")
+    SETTINGS.update(settings)
+    if "seed" in settings:
+        _rng.seed(settings["seed"])
+
+
+def reset_stats():
+    with _lock:
+        STATS.update(calls=0, stream_calls=0, errors=0, rate_limited=0, model_seconds=0.0, configured_keys=set())
+
+
+def configure(api_key=None, **kwargs):
+    with _lock:
+        STATS["configured_keys"].add(api_key)
+
+
+def list_models():
+    time.sleep(SETTINGS["latency"])
+    return [dict(m) for m in MODELS]
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, response_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+        self.total_token_count = prompt_tokens + response_tokens
+
+
+class _Blob:
+    def __init__(self, mime_type, data):
+        self.mime_type = mime_type
+        self.data = data
+
+
+class _Part:
+    def __init__(self, text=None, inline_data=None):
+        self.text = text
+        self.inline_data = inline_data
+
+
+class _Candidate:
+    def __init__(self, parts):
+        self.content = types.SimpleNamespace(parts=parts)
+
+
+class _Response:
+    def __init__(self, text, prompt, parts=None):
+        self.text = text
+        self.candidates = [_Candidate(parts or [_Part(text=text)])]
+        self.usage_metadata = _Usage(max(1, len(prompt) // 4), max(1, len(text) // 4))
+
+
+class _StreamResponse:
+    def __init__(self, chunks, prompt):
+        self._chunks = chunks
+        self._prompt = prompt
+        self.usage_metadata = None
+
+    def __iter__(self):
+        started = time.perf_counter()
+        try:
+            for chunk in self._chunks:
+                time.sleep(SETTINGS["seconds_per_chunk"])
+                yield _Response(chunk, self._prompt)
+        finally:
+            with _lock:
+                STATS["model_seconds"] += time.perf_counter() - started
+        text = "".join(self._chunks)
+        self.usage_metadata = _Usage(max(1, len(self._prompt) // 4), max(1, len(text) // 4))
+
+
+def _answer(prompt: str):
+    """Filler text in SETTINGS["chunks"] chunks; numbered <<n>> batch prompts get one "[ta] ..." line per number."""
+    words = ("Premium", "homes", "near", "the", "metro", "with", "clubhouse,", "pool", "and", "gym.")
+    n = max(1, SETTINGS["chunks"])
+    lines = re.findall(r"^<<(\d+)>> (.*)$", prompt, re.MULTILINE)
+    if lines:
+        body = "\n".join(f"<<{i}>> [ta] {text}" for i, text in lines)
+    else:
+        body = f"[fake answer to {len(prompt)} chars] " + " ".join(words[i % len(words)] for i in range(n * 6))
+    step = max(1, len(body) // n)
+    return [body[i:i + step] for i in range(0, len(body), step)]
+
+
+def _maybe_fail():
+    with _lock:
+        STATS["calls"] += 1
+        n = STATS["calls"]
+        every = SETTINGS["rate_limit_every"]
+        if every and n % every == 0:
+            STATS["rate_limited"] += 1
+            raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota).")
+        if SETTINGS["error_rate"] and _rng.random() < SETTINGS["error_rate"]:
+            STATS["errors"] += 1
+            raise InvalidArgument("400 Fake invalid argument.")
+
+
+class GenerativeModel:
+    def __init__(self, model_name="models/fake-gemini-pro", generation_config=None, **kwargs):
+        self.model_name = model_name
+        self._client = None
+
+    def generate_content(self, contents, stream=False, generation_config=None, **kwargs):
+        prompt = contents if isinstance(contents, str) else str(contents)
+        started = time.perf_counter()
+        time.sleep(SETTINGS["latency"])
+        try:
+            _maybe_fail()
+        finally:
+            with _lock:
+                STATS["model_seconds"] += time.perf_counter() - started
+        if "image" in self.model_name:
+            return _Response("", prompt, parts=[_Part(inline_data=_Blob("image/png", PNG_PIXEL))])
+        chunks = _answer(prompt)
+        if stream:
+            with _lock:
+                STATS["stream_calls"] += 1
+            return _StreamResponse(chunks, prompt)
+        started = time.perf_counter()
+        time.sleep(SETTINGS["seconds_per_chunk"] * len(chunks))
+        with _lock:
+            STATS["model_seconds"] += time.perf_counter() - started
+        return _Response("".join(chunks), prompt)
+
+
+def install():
+    """Register this module as ``google.generativeai`` (creating a bare ``google`` package if needed)."""
+    module = sys.modules[__name__]
+    google = sys.modules.get("google")
+    if google is None:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    google.generativeai = module
+    sys.modules["google.generativeai"] = module
+    return module
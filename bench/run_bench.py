@@ -0,0 +1,360 @@
+"""
+Offline benchmark for konnect_ops.py — no API key, network or browser needed.
+
+Runs scripted sessions through Streamlit's headless AppTest with bench/fake_genai.py standing
+in for google.generativeai and the Uploads tab's local folder standing in for a bucket.
+Each session connects, then goes through every tab: a landing page, a streamed content draft, an
+image prompt, a blog, an EMI, a Tamil translation (translation memory), a Deluge script (script
+library) and a cover upload. Reported per interaction: rerun wall time and bytes of markup emitted (with the
+render_tab_section share split out), plus peak memory and ask_ai overhead excluding model time.
+With --users N each user runs in its own process (AppTest keeps one mock Runtime per process), so
+they share the on-disk response cache and blob folders but not in-memory caches or the AI scheduler.
+
+Usage:
+    python bench/run_bench.py                              # one user, two iterations
+    python bench/run_bench.py --users 8 --iterations 3     # concurrent sessions, one process per user
+    python bench/run_bench.py --backgrounds inline         # old data-URL backgrounds
+    python bench/run_bench.py --compare bench/results/<earlier>.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+APP_PATH = os.path.join(APP_DIR, "konnect_ops.py")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, BENCH_DIR)
+# `streamlit run` puts the script's folder on sys.path for the life of the server; AppTest only does it
+# around each run, which concurrent sessions would race on when importing konnect_core/konnect_images.
+sys.path.insert(1, APP_DIR)
+
+import fake_genai  # noqa: E402
+
+TAB_KEYS = ["Landing", "Content", "Images", "Calendar", "Utilities", "Blog", "Uploads", "Zoho"]
+LANDING_TEMPLATE = ("<html><head><title>Casagrand Flagship</title><meta name='description' content='{DESC}'></head>"
+                    "<body><h1>Casagrand Flagship</h1><p>{LOCATION} — from {PRICE}</p>"
+                    + "<section>" + "x" * 20_000 + "</section></body></html>")
+
+
+def markup_bytes(at):
+    """Bytes of markdown/html/code bodies in the element tree, and the render_tab_section share."""
+    total = section = 0
+    for kind in ("markdown", "code", "caption"):
+        for el in at.get(kind):
+            body = getattr(el, "value", None) or getattr(el.proto, "body", "") or ""
+            n = len(body.encode("utf-8"))
+            total += n
+            if 'class="bg-section"' in body or "class='bg-section'" in body:
+                section += n
+    return total, section
+
+
+def find(elements, label):
+    for el in elements:
+        if el.label == label:
+            return el
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+def background_urls(mode, inline_kb):
+    if mode == "none":
+        return {}
+    if mode == "inline":
+        payload = "A" * (inline_kb * 1024)
+        return {t: f"data:image/jpeg;base64,{payload}" for t in TAB_KEYS}
+    return {t: f"app/static/bg/{name}" for t, name in zip(TAB_KEYS, static_background_names())}
+
+
+def static_background_names():
+    return [f"{i:032x}.webp" for i in range(len(TAB_KEYS))]
+
+
+def write_static_backgrounds():
+    """Placeholder files behind the url-mode backgrounds (the app drops URLs whose file is gone)."""
+    bg_dir = os.path.join(APP_DIR, "static", "bg")
+    os.makedirs(bg_dir, exist_ok=True)
+    paths = []
+    for name in static_background_names():
+        path = os.path.join(bg_dir, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as fh:
+                fh.write(b"RIFF\0\0\0\0WEBP")
+            paths.append(path)
+    return paths
+
+
+def cover_png():
+    try:
+        from io import BytesIO
+        from PIL import Image
+        buf = BytesIO()
+        Image.new("RGB", (1200, 628), (30, 60, 90)).save(buf, "PNG")
+        return buf.getvalue()
+    except Exception:
+        return fake_genai.PNG_PIXEL
+
+
+class Session:
+    def __init__(self, user, args, records):
+        from streamlit.testing.v1 import AppTest
+        self.user = user
+        self.args = args
+        self.records = records
+        self.at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+        self.at.session_state["ai_cache_enabled"] = args.cache
+        self.at.session_state["bg_images"] = background_urls(args.backgrounds, args.inline_kb)
+
+    def step(self, name, action=None):
+        at = self.at
+        started = time.perf_counter()
+        (action or (lambda: None))()
+        at.run()
+        elapsed = time.perf_counter() - started
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+        total, section = markup_bytes(at)
+        self.records.append({"user": self.user, "interaction": name, "seconds": elapsed,
+                             "markup_bytes": total, "section_bytes": section})
+
+    def run_script(self):
+        at = self.at
+        self.step("first_load")
+        if not at.session_state["model_name"]:
+            self.step("connect", lambda: (find(at.text_input, "Paste key (kept this session)").input(f"fake-key-{self.user % 2}"),
+                                          find(at.button, "Unlock Dashboard").click()))
+        self.step("idle_rerun")
+        self.step("landing_generate", lambda: (find(at.text_input, "Project Name").input(f"Project {self.user}"),
+                                               find(at.text_area, "Paste HTML Code").input(LANDING_TEMPLATE),
+                                               find(at.button, "Generate Page").click()))
+        self.step("content_draft", lambda: (find(at.text_input, "Topic").input(f"Why invest in OMR, take {self.user}?"),
+                                            find(at.button, "Draft Content").click()))
+        self.step("image_prompt", lambda: (find(at.text_input, "Image Concept").input("Luxury living room with sea view"),
+                                           find(at.button, "Generate Prompt").click()))
+        self.step("blog_generate", lambda: find(at.button, "Generate Home Konnect blog (Markdown)").click())
+        self.step("emi_select", lambda: find(at.radio, "Tool:").set_value("EMI Calculator"))
+        self.step("emi_calculate", lambda: find(at.button, "Calculate EMI").click())
+        self.step("translator_select", lambda: find(at.radio, "Tool:").set_value("Tamil Translator"))
+        self.step("translate", lambda: (find(at.text_area, "Enter English Text").input(
+            f"Exclusive launch offer at Project {self.user}. Book your site visit today!"), find(at.button, "Translate").click()))
+        self.check_no_errors("translate")
+        self.step("deluge_compile", lambda: (find(at.text_area, "Logic Needed").input("Update lead status when email opens"),
+                                             find(at.button, "Compile Code").click()))
+        self.check_no_errors("deluge_compile")
+        self.step("cover_ready", lambda: find(at.file_uploader, "Upload cover image").set_value(("cover.png", self.args.cover, "image/png")))
+        if "_last_cover_blob" not in at.session_state:
+            raise RuntimeError("cover_ready: the uploaded cover did not reach the blob store")
+        self.step("cover_renditions", self.wait_for_renditions)
+        self.step("upload_select", lambda: find(at.selectbox, "Upload destination").set_value("Local folder (offline test)"))
+        self.step("upload_local", lambda: find(at.button, "Upload to Local folder").click())
+
+    def check_no_errors(self, name):
+        """Model failures are shown, not raised; a scripted step that shows one has failed."""
+        shown = [el.value for kind in ("error", "warning") for el in self.at.get(kind)]
+        if shown:
+            raise RuntimeError(f"{name}: {shown[0]}")
+
+    def wait_for_renditions(self):
+        """Rerun while the cover sizes are pending, as the app's cover_watch fragment does in a browser."""
+        deadline = time.perf_counter() + self.args.timeout
+        while any("Preparing cover image sizes" in c.value for c in self.at.caption):
+            if time.perf_counter() > deadline:
+                raise RuntimeError("cover_renditions: the cover sizes were not ready in time")
+            time.sleep(0.05)
+            self.at.run()
+
+    def ai_seconds(self):
+        """(calls, call seconds, queue seconds) from the session's metrics registry."""
+        registry = self.at.session_state["_metrics"] if "_metrics" in self.at.session_state else None
+        calls = call_s = queue_s = 0.0
+        if registry is not None:
+            for (name, _), hist in registry.histograms.items():
+                if name == "ai_call_seconds":
+                    calls += hist.count
+                    call_s += hist.sum
+                elif name == "ai_queue_seconds":
+                    queue_s += hist.sum
+        return calls, call_s, queue_s
+
+
+def summarize(values):
+    values = sorted(values)
+    return {"count": len(values), "mean": statistics.fmean(values), "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(0.95 * len(values)))], "max": values[-1]}
+
+
+def user_loop(user, args, barrier=None):
+    """One user's scripted sessions, run in its own process when there are several users."""
+    fake_genai.install()
+    fake_genai.configure_fake(latency=args.latency, seconds_per_chunk=args.chunk_seconds, chunks=args.chunks,
+                              rate_limit_every=args.rate_limit_every, error_rate=args.error_rate)
+    fake_genai.reset_stats()
+    from streamlit.testing.v1 import AppTest  # noqa: F401  (imported before the start line, not timed)
+    if barrier is not None:
+        barrier.wait()
+    if args.tracemalloc:
+        tracemalloc.start()
+    records, errors, ai = [], [], [0.0, 0.0, 0.0]
+    started = time.time()
+    for _ in range(args.iterations):
+        session = Session(user, args, records)
+        try:
+            session.run_script()
+        except Exception as e:
+            errors.append(f"user {user}: {e}")
+        for i, value in enumerate(session.ai_seconds()):
+            ai[i] += value
+    ended = time.time()
+    peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    return {"user": user, "records": records, "errors": errors, "ai": ai, "started": started, "ended": ended, "traced_peak": peak_traced,
+            "fake_stats": {k: v for k, v in fake_genai.STATS.items() if k != "configured_keys"}}
+
+
+def user_process(user, args, barrier, results):
+    try:
+        results.put(user_loop(user, args, barrier))
+    except BaseException as e:
+        results.put({"user": user, "crashed": f"{type(e).__name__}: {e}"})
+        raise
+    finally:
+        from konnect_core import get_cover_pipeline
+        get_cover_pipeline().close()  # or this process would wait on the cover workers forever at exit
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="konnectops-bench-")
+    os.environ["KONNECTOPS_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["KONNECTOPS_LOCAL_BUCKET_DIR"] = os.path.join(workdir, "buckets")
+    os.environ["KONNECTOPS_METRICS_LOG"] = os.path.join(workdir, "metrics.jsonl")
+    args.cover = cover_png()
+
+    if args.users == 1:
+        users = [user_loop(0, args)]
+    else:
+        # AppTest installs its mock Runtime as a process-wide global for the length of each run, so two
+        # AppTests cannot run in one process at once. Each user gets a process of its own; they share the
+        # on-disk caches and start together once all have imported Streamlit.
+        # (Plain processes rather than a Pool: pool workers are daemonic and could not start cover workers.)
+        mp = multiprocessing.get_context("spawn")
+        barrier, results = mp.Barrier(args.users), mp.Queue()
+        procs = [mp.Process(target=user_process, args=(u, args, barrier, results), name=f"bench-user-{u}")
+                 for u in range(args.users)]
+        for p in procs:
+            p.start()
+        users = []
+        while len(users) < len(procs):
+            try:
+                users.append(results.get(timeout=1))
+            except queue.Empty:
+                if all(p.exitcode is not None for p in procs):
+                    break
+        for p in procs:
+            p.join()
+        crashed = [f"user {u['user']}: {u['crashed']}" for u in users if "crashed" in u]
+        crashed += [f"user {u}: exited with code {p.exitcode} and no results" for u, p in enumerate(procs)
+                    if u not in {r["user"] for r in users}]
+        if crashed:
+            raise RuntimeError("; ".join(crashed))
+        users.sort(key=lambda u: u["user"])
+    wall = max(u["ended"] for u in users) - min(u["started"] for u in users)
+    records = [r for u in users for r in u["records"]]
+    errors = [e for u in users for e in u["errors"]]
+    calls, call_s, queue_s = (sum(u["ai"][i] for u in users) for i in range(3))
+    fake_stats = {k: sum(u["fake_stats"][k] for u in users) for k in users[0]["fake_stats"]}
+    peaks = [u["traced_peak"] for u in users if u["traced_peak"] is not None]
+
+    interactions = {}
+    for name in dict.fromkeys(r["interaction"] for r in records):
+        rows = [r for r in records if r["interaction"] == name]
+        interactions[name] = {"seconds": summarize([r["seconds"] for r in rows]),
+                              "markup_bytes": summarize([r["markup_bytes"] for r in rows]),
+                              "section_bytes": summarize([r["section_bytes"] for r in rows])}
+    model_s = fake_stats["model_seconds"]
+    max_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "streamlit": __import__("streamlit").__version__, "argv": sys.argv[1:],
+                 "settings": {k: v for k, v in vars(args).items() if k not in ("cover", "compare", "out")}},
+        "wall_seconds": wall,
+        "sessions": args.users * args.iterations,
+        "errors": errors,
+        "interactions": interactions,
+        "memory": {"max_rss_kb": max_rss, "tracemalloc_peak_bytes": max(peaks) if peaks else None},
+        "ai": {"calls": calls, "call_seconds": call_s, "queue_seconds": queue_s, "model_seconds": model_s,
+               "overhead_ms_per_call": 1000 * (call_s - model_s) / calls if calls else None,
+               "fake_stats": fake_stats},
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"{result['sessions']} sessions in {result['wall_seconds']:.2f}s, {len(result['errors'])} errors")
+    for err in result["errors"][:5]:
+        print("  !", err)
+    print(f"{'interaction':<18}{'mean ms':>10}{'p95 ms':>10}{'markup KB':>12}{'section KB':>12}{'vs base':>10}")
+    for name, row in result["interactions"].items():
+        mean = row["seconds"]["mean"] * 1000
+        delta = ""
+        if baseline and name in baseline.get("interactions", {}):
+            base = baseline["interactions"][name]["seconds"]["mean"] * 1000
+            delta = f"{(mean - base) / base * 100:+.0f}%" if base else ""
+        print(f"{name:<18}{mean:>10.1f}{row['seconds']['p95'] * 1000:>10.1f}"
+              f"{row['markup_bytes']['mean'] / 1024:>12.1f}{row['section_bytes']['mean'] / 1024:>12.1f}{delta:>10}")
+    ai = result["ai"]
+    overhead = ai["overhead_ms_per_call"]
+    print(f"ask_ai: {int(ai['calls'])} calls, overhead excl. model {overhead:.1f} ms/call" if overhead is not None else "ask_ai: no calls")
+    mem = result["memory"]
+    print(f"max RSS {mem['max_rss_kb'] / 1024:.1f} MB" + (f", traced peak {mem['tracemalloc_peak_bytes'] / 2**20:.1f} MB"
+                                                            if mem["tracemalloc_peak_bytes"] else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1, help="concurrent users, one process each")
+    parser.add_argument("--iterations", type=int, default=2, help="scripted sessions per user")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency (s)")
+    parser.add_argument("--chunk-seconds", type=float, default=0.02, help="fake time per streamed chunk (s)")
+    parser.add_argument("--chunks", type=int, default=20, help="chunks per fake answer")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="every Nth fake call returns 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a fake 400 error")
+    parser.add_argument("--backgrounds", choices=["url", "inline", "none"], default="url")
+    parser.add_argument("--inline-kb", type=int, default=1500, help="size of each inline background (KB)")
+    parser.add_argument("--cache", action="store_true", help="leave the AI response cache on")
+    parser.add_argument("--tracemalloc", action="store_true", help="trace Python allocations (slower)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--out", help="results JSON path (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    placeholders = write_static_backgrounds() if args.backgrounds == "url" else []
+    try:
+        result = run(args)
+    finally:
+        for path in placeholders:
+            os.remove(path)
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(result, fh, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    print_report(result, baseline)
+    print(f"results written to {out}")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
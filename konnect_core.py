@@ -0,0 +1,2671 @@
+"""
+KonnectOps core — the generators behind the Streamlit app, usable without Streamlit.
+
+Landing pages, Home Konnect blogs, prompts for images, translation and Deluge, WhatsApp links
+and EMI, plus the shared plumbing they run on (model registry, response cache, AI scheduler,
+metrics, blob store, image renditions and uploads). Heavy or optional libraries (google-generativeai,
+Pillow, boto3, google-cloud-storage) are imported on first use, never at import time.
+
+CLI: python konnect_core.py jobs.jsonl -o results.jsonl --workers 8   (see main())
+"""
+
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import argparse
+import csv
+import hashlib
+import importlib.util
+import json
+import logging
+import math
+import mmap
+import os
+import queue
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import uuid
+import zipfile
+import zlib
+import mimetypes
+import base64
+from collections import OrderedDict, namedtuple, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from typing import Optional
+from urllib.parse import quote_plus
+
+logger = logging.getLogger("konnectops")
+
+def module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+# Optional libraries: probed here, imported where they are used.
+BOTO3_AVAILABLE = module_available("boto3")
+GCS_AVAILABLE = module_available("google.cloud.storage") and module_available("google.oauth2")
+PIL_AVAILABLE = module_available("PIL")
+XLSX_ENGINE = next((m for m in ("xlsxwriter", "openpyxl") if module_available(m)), None)
+
+def genai_module():
+    """google.generativeai, imported on first use."""
+    import google.generativeai as genai
+    return genai
+
+def singleton(factory):
+    """Process-wide instance created on first call (what st.cache_resource gave the app)."""
+    lock = threading.Lock()
+    instance = []
+
+    def get():
+        if not instance:
+            with lock:
+                if not instance: instance.append(factory())
+        return instance[0]
+    get.__name__ = factory.__name__
+    get.__doc__ = factory.__doc__
+    return get
+
+# ---------- Model helpers ----------
+DISCOVERY_TTL_SECONDS = int(os.environ.get("KONNECTOPS_DISCOVERY_TTL", "900"))
+MODEL_POOL_SIZE = int(os.environ.get("KONNECTOPS_MODEL_POOL_SIZE", "32"))
+
+def safe_name(obj):
+    try: return getattr(obj, "name", None) or (obj.get("name") if isinstance(obj, dict) else None)
+    except: return None
+
+def generation_methods(obj) -> set:
+    try:
+        methods = getattr(obj, "supported_generation_methods", None)
+        if methods is None and isinstance(obj, dict): methods = obj.get("supported_generation_methods")
+        return set(methods or [])
+    except:
+        return set()
+
+def model_capabilities(obj) -> dict:
+    methods = generation_methods(obj)
+    generate = "generateContent" in methods or "generate" in methods
+    short = (safe_name(obj) or "").split("/")[-1].lower()
+    return {
+        "generate": generate,
+        # The SDK streams through streamGenerateContent, which every generateContent model accepts.
+        "stream": "streamGenerateContent" in methods or "generateContent" in methods,
+        "image": generate and "image" in short,
+    }
+
+def key_fingerprint(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+class ModelRegistry:
+    """Process-wide model discovery (TTL, keyed by key fingerprint) and a bounded LRU of model clients.
+
+    genai.configure() is global, so configuring and binding a client to its key happen under one
+    lock; a pooled client keeps the transport it was created with.
+    """
+
+    def __init__(self, ttl_seconds: int = DISCOVERY_TTL_SECONDS, pool_size: int = MODEL_POOL_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._configure_lock = threading.RLock()
+        self._discovery_locks = {}
+        self._index = {}  # fingerprint -> (expires_at, {model name: capabilities})
+        self._pool = OrderedDict()  # (fingerprint, model name) -> GenerativeModel
+        self.counters = {"discoveries": 0, "discovery_hits": 0, "pool_hits": 0, "pool_misses": 0}
+
+    def _configure(self, key: str):
+        genai_module().configure(api_key=key)
+
+    def discover(self, key: str, force: bool = False) -> dict:
+        """Return {model name: capabilities} for this key, listing models at most once per TTL."""
+        fp = key_fingerprint(key)
+        with self._lock:
+            lock = self._discovery_locks.setdefault(fp, threading.Lock())
+        with lock:
+            entry = self._index.get(fp)
+            if entry and not force and entry[0] > time.time():
+                with self._lock: self.counters["discovery_hits"] += 1
+                return entry[1]
+            with self._configure_lock:
+                self._configure(key)
+                models = list(genai_module().list_models() or [])
+            index = OrderedDict((safe_name(m), model_capabilities(m)) for m in models if safe_name(m))
+            with self._lock:
+                self._index[fp] = (time.time() + self.ttl_seconds, index)
+                self.counters["discoveries"] += 1
+            return index
+
+    def default_model(self, key: str, capability: str = "generate") -> Optional[str]:
+        index = self.discover(key)
+        for name, caps in index.items():
+            if caps.get(capability): return name
+        return next(iter(index), None) if capability == "generate" else None
+
+    def client(self, key: str, model_name: str):
+        pool_key = (key_fingerprint(key), model_name)
+        with self._lock:
+            model = self._pool.get(pool_key)
+            if model is not None:
+                self._pool.move_to_end(pool_key)
+                self.counters["pool_hits"] += 1
+                return model
+            self.counters["pool_misses"] += 1
+        with self._configure_lock:
+            self._configure(key)
+            model = genai_module().GenerativeModel(model_name)
+            try:
+                from google.generativeai import client as genai_client
+                if getattr(model, "_client", "unset") is None:
+                    model._client = genai_client.get_default_generative_client()
+            except Exception as e:
+                logger.debug("Could not pre-bind model client: %s", e)
+        with self._lock:
+            model = self._pool.setdefault(pool_key, model)
+            self._pool.move_to_end(pool_key)
+            while len(self._pool) > self.pool_size: self._pool.popitem(last=False)
+        return model
+
+    def invalidate(self, key: str):
+        """Forget the key's model index and pooled clients (key changed, revoked or logged out)."""
+        fp = key_fingerprint(key)
+        with self._lock:
+            self._index.pop(fp, None)
+            for pool_key in [k for k in self._pool if k[0] == fp]: del self._pool[pool_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counters)
+            out["keys_indexed"] = len(self._index)
+            out["pooled_clients"] = len(self._pool)
+        return out
+
+@singleton
+def get_model_registry() -> ModelRegistry:
+    return ModelRegistry()
+
+# ---------- AI response cache ----------
+CACHE_DIR = os.environ.get("KONNECTOPS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "konnectops"))
+CACHE_TTL_SECONDS = int(os.environ.get("KONNECTOPS_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MEMORY_ITEMS = int(os.environ.get("KONNECTOPS_CACHE_MEMORY_ITEMS", "512"))
+CACHE_DISK_ITEMS = int(os.environ.get("KONNECTOPS_CACHE_DISK_ITEMS", "20000"))
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join((prompt or "").split())
+
+def cache_key(model_name: str, prompt: str, params: Optional[dict] = None) -> str:
+    payload = json.dumps([model_name or "", normalize_prompt(prompt), params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Two-tier (memory LRU + SQLite) cache of successful model responses."""
+
+    def __init__(self, db_path: Optional[str], memory_items: int = CACHE_MEMORY_ITEMS,
+                 disk_items: int = CACHE_DISK_ITEMS, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()  # key -> (expires_at, text)
+        self._writes_since_trim = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT NOT NULL, "
+                                 "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)")
+            except Exception as e:
+                logger.warning("Disk response cache disabled (%s): %s", db_path, e)
+                self._db = None
+
+    def _remember(self, key: str, expires_at: float, text: str):
+        self._mem[key] = (expires_at, text)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._mem.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[1]
+                del self._mem[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT text, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row and row[1] > now:
+                        self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._remember(key, row[1], row[0])
+                        self.counters["disk_hits"] += 1
+                        return row[0]
+                except sqlite3.Error as e:
+                    logger.warning("Response cache read failed: %s", e)
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, text: str):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, text)
+            self.counters["stores"] += 1
+            if self._db is None: return
+            try:
+                self._db.execute("INSERT OR REPLACE INTO responses (key, text, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                                 (key, text, expires_at, now))
+                self._writes_since_trim += 1
+                if self._writes_since_trim >= 100:
+                    self._trim_disk(now)
+            except sqlite3.Error as e:
+                logger.warning("Response cache write failed: %s", e)
+
+    def _trim_disk(self, now: float):
+        self._writes_since_trim = 0
+        cur = self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self.counters["evictions"] += max(cur.rowcount, 0)
+        cur = self._db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at DESC "
+                               "LIMIT -1 OFFSET ?)", (self.disk_items,))
+        self.counters["evictions"] += max(cur.rowcount, 0)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                try: self._db.execute("DELETE FROM responses")
+                except sqlite3.Error as e: logger.warning("Response cache clear failed: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counters)
+            out["memory_entries"] = len(self._mem)
+            if self._db is not None:
+                try: out["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                except sqlite3.Error: out["disk_entries"] = None
+        lookups = out["memory_hits"] + out["disk_hits"] + out["misses"]
+        out["hit_rate"] = round((out["memory_hits"] + out["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return out
+
+@singleton
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(os.path.join(CACHE_DIR, "responses.sqlite3") if CACHE_DIR else None)
+
+# ---------- Metrics ----------
+METRICS_LOG_PATH = os.environ.get("KONNECTOPS_METRICS_LOG", "")  # opt-in: no per-call event log unless a path is set
+METRICS_LOG_MAX_BYTES = 50 * 1024 * 1024
+METRICS_LOG_CHECK_EVERY = 200  # writes between size checks
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (100, 500, 1_000, 5_000, 20_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]: i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (max for the +Inf bucket)."""
+        target, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target: return min(bound, self.max)
+        return self.max
+
+class MetricsRegistry:
+    """Thread-safe in-process counters and histograms, labelled Prometheus-style."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        bounds = SECONDS_BUCKETS if name.endswith("_seconds") else SIZE_BUCKETS
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None: hist = self.histograms[key] = Histogram(bounds)
+            hist.observe(value)
+
+    def summary(self) -> list:
+        """Rows for display: one per counter and per histogram."""
+        with self._lock:
+            rows = [{"metric": n, "labels": ",".join(f"{k}={v}" for k, v in l), "count": c, "avg": None, "p95": None, "max": None}
+                    for (n, l), c in sorted(self.counters.items())]
+            for (n, l), h in sorted(self.histograms.items()):
+                rows.append({"metric": n, "labels": ",".join(f"{k}={v}" for k, v in l), "count": h.count,
+                             "avg": round(h.sum / h.count, 4) if h.count else None, "p95": round(h.quantile(0.95), 4), "max": round(h.max, 4)})
+        return rows
+
+    def to_prometheus(self, prefix: str = "konnectops_") -> str:
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items: return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in items) + "}"
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for (n, l), v in sorted(self.counters.items()):
+                    if n == name: lines.append(f"{prefix}{name}{fmt(l)} {v}")
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for (n, l), h in sorted(self.histograms.items()):
+                    if n != name: continue
+                    cumulative = 0
+                    for bound, c in zip(list(h.bounds) + ["+Inf"], h.counts):
+                        cumulative += c
+                        lines.append(f"{prefix}{name}_bucket{fmt(l, [('le', bound)])} {cumulative}")
+                    lines.append(f"{prefix}{name}_sum{fmt(l)} {h.sum}")
+                    lines.append(f"{prefix}{name}_count{fmt(l)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+class MetricsLog:
+    """Append-only JSON-lines event log, rotated once it passes METRICS_LOG_MAX_BYTES.
+
+    The file stays open between writes and its size is only checked every METRICS_LOG_CHECK_EVERY
+    writes, so a logged event costs one line-buffered write.
+    """
+
+    def __init__(self, path: str, check_every: int = METRICS_LOG_CHECK_EVERY):
+        self.path = path
+        self.check_every = max(1, check_every)
+        self._fh = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8", buffering=1)
+
+    def _rotate_if_large(self):
+        if self._fh.tell() <= METRICS_LOG_MAX_BYTES: return
+        self._fh.close()
+        self._fh = None
+        os.replace(self.path, self.path + ".1")
+        self._open()
+
+    def write(self, event: dict):
+        if not self.path: return
+        line = json.dumps(event, default=str)
+        with self._lock:
+            try:
+                if self._fh is None: self._open()
+                self._writes += 1
+                if self._writes % self.check_every == 0: self._rotate_if_large()
+                self._fh.write(line + "\n")
+            except OSError as e:
+                logger.debug("Metrics log write failed: %s", e)
+                self._close()
+
+    def _close(self):
+        if self._fh is not None:
+            try: self._fh.close()
+            except OSError: pass
+        self._fh = None
+
+    def close(self):
+        with self._lock: self._close()
+
+class Metrics:
+    """Fans each measurement out to several registries (process-wide and per-session) and the event log."""
+
+    def __init__(self, registries=(), log: Optional[MetricsLog] = None):
+        self.registries = [r for r in registries if r is not None]
+        self.log = log
+
+    def inc(self, name: str, value: float = 1, **labels):
+        for r in self.registries: r.inc(name, value, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        for r in self.registries: r.observe(name, value, **labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time a block as ``<name>_seconds``; the yielded dict collects extra fields for the event log."""
+        extra = {}
+        status = "ok"
+        started = time.perf_counter()
+        try:
+            yield extra
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(f"{name}_seconds", elapsed, **labels)
+            self.inc(f"{name}_total", status=status, **labels)
+            if self.log is not None:
+                self.log.write({"ts": time.time(), "event": name, "seconds": round(elapsed, 6), "status": status, **labels, **extra})
+
+NULL_METRICS = Metrics()
+
+@singleton
+def get_metrics_registry() -> MetricsRegistry:
+    return MetricsRegistry()
+
+@singleton
+def get_metrics_log() -> MetricsLog:
+    return MetricsLog(METRICS_LOG_PATH)
+
+# ---------- AI call scheduler ----------
+AI_RATE_PER_SECOND = float(os.environ.get("KONNECTOPS_AI_RATE", "2"))
+AI_RATE_BURST = int(os.environ.get("KONNECTOPS_AI_BURST", "5"))
+AI_MAX_CONCURRENCY = int(os.environ.get("KONNECTOPS_AI_CONCURRENCY", "8"))
+AI_MAX_ATTEMPTS = 4
+AI_BACKOFF_BASE_SECONDS = 1.0
+AI_BACKOFF_CAP_SECONDS = 30.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+                    "InternalServerError", "GatewayTimeout", "BadGateway"}
+
+def is_retryable(exc: Exception) -> bool:
+    code = getattr(exc, "code", None)
+    try:
+        if int(code) in RETRYABLE_STATUS: return True
+    except (TypeError, ValueError):
+        pass
+    if type(exc).__name__ in RETRYABLE_ERRORS: return True
+    msg = str(exc).lower()
+    return "429" in msg or "quota" in msg or "rate limit" in msg or "temporarily unavailable" in msg
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class AIScheduler:
+    """Process-wide gate for model calls: per-key token bucket, global concurrency cap,
+    retry with exponential backoff and full jitter, and coalescing of identical in-flight calls."""
+
+    def __init__(self, rate: float = AI_RATE_PER_SECOND, burst: int = AI_RATE_BURST,
+                 max_concurrency: int = AI_MAX_CONCURRENCY, max_attempts: int = AI_MAX_ATTEMPTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._buckets = {}  # key fingerprint -> TokenBucket
+        self._inflight = {}  # coalesce key -> Future
+        self._waits = deque(maxlen=500)
+        self.queued = 0
+        self.running = 0
+        self.counters = {"submitted": 0, "coalesced": 0, "retries": 0, "failures": 0}
+
+    def _bucket(self, api_key: str) -> TokenBucket:
+        fp = key_fingerprint(api_key or "")
+        with self._lock:
+            bucket = self._buckets.get(fp)
+            if bucket is None: bucket = self._buckets[fp] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+    def run(self, api_key: str, coalesce_key: Optional[str], fn):
+        """Run ``fn()`` under the limits. Callers passing the same ``coalesce_key`` while a call
+        is in flight wait for that call and share its result (or exception)."""
+        with self._lock:
+            self.counters["submitted"] += 1
+            fut = self._inflight.get(coalesce_key) if coalesce_key else None
+            if fut is not None:
+                self.counters["coalesced"] += 1
+            elif coalesce_key:
+                self._inflight[coalesce_key] = leader = Future()
+        if fut is not None:
+            return fut.result()
+        try:
+            result = self._execute(api_key, fn)
+        except BaseException as e:
+            if coalesce_key: leader.set_exception(e)
+            raise
+        else:
+            if coalesce_key: leader.set_result(result)
+            return result
+        finally:
+            if coalesce_key:
+                with self._lock: self._inflight.pop(coalesce_key, None)
+
+    def _execute(self, api_key: str, fn):
+        bucket = self._bucket(api_key)
+        for attempt in range(1, self.max_attempts + 1):
+            enqueued = time.monotonic()
+            with self._lock: self.queued += 1
+            try:
+                bucket.acquire()
+                self._slots.acquire()
+            finally:
+                with self._lock: self.queued -= 1
+            with self._lock:
+                self.running += 1
+                self._waits.append(time.monotonic() - enqueued)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    with self._lock: self.counters["failures"] += 1
+                    raise
+                with self._lock: self.counters["retries"] += 1
+                delay = random.uniform(0, min(AI_BACKOFF_CAP_SECONDS, AI_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+                logger.warning("Retryable AI error (attempt %d/%d), retrying in %.1fs: %s", attempt, self.max_attempts, delay, e)
+            finally:
+                with self._lock: self.running -= 1
+                self._slots.release()
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            out = dict(self.counters, queue_depth=self.queued, running=self.running, in_flight_groups=len(self._inflight))
+        if waits:
+            out["wait_ms_avg"] = round(1000 * sum(waits) / len(waits), 1)
+            out["wait_ms_p95"] = round(1000 * waits[min(len(waits) - 1, int(0.95 * len(waits)))], 1)
+            out["wait_ms_max"] = round(1000 * waits[-1], 1)
+        return out
+
+@singleton
+def get_ai_scheduler() -> AIScheduler:
+    return AIScheduler()
+
+# ---------- AI calls ----------
+class AIContext:
+    """Everything a model call needs, captured from the session so worker threads never touch st.session_state."""
+
+    def __init__(self, model_name: Optional[str], api_key: str = "", cache: Optional[ResponseCache] = None,
+                 registry: Optional[ModelRegistry] = None, use_cache: bool = True,
+                 scheduler: Optional[AIScheduler] = None, metrics: Optional[Metrics] = None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.cache = cache
+        self.registry = registry
+        self.use_cache = use_cache
+        self.scheduler = scheduler
+        self.metrics = metrics or NULL_METRICS
+
+    def client(self, model_name: Optional[str] = None):
+        model_name = model_name or self.model_name
+        if self.registry is not None and self.api_key:
+            return self.registry.client(self.api_key, model_name)
+        return genai_module().GenerativeModel(model_name)
+
+    def call(self, coalesce_key: Optional[str], fn):
+        if self.scheduler is None: return fn()
+        return self.scheduler.run(self.api_key, coalesce_key, fn)
+
+def generate_text(ctx: AIContext, prompt: str, generation_config: Optional[dict] = None,
+                  use_cache: Optional[bool] = None) -> str:
+    """Session-free core of ask_ai, safe to call from worker threads. Raises on model errors."""
+    if use_cache is None: use_cache = ctx.use_cache
+    key = cache_key(ctx.model_name, prompt, generation_config)
+    metrics = ctx.metrics
+    metrics.observe("ai_prompt_chars", len(prompt))
+    if ctx.cache is not None and use_cache:
+        cached = ctx.cache.get(key)
+        if cached is not None:
+            metrics.inc("ai_calls_total", outcome="cache_hit")
+            return cached
+    submitted = time.perf_counter()
+    model = ctx.client()
+    started = {}
+    def call():
+        started["at"] = time.perf_counter()
+        res = model.generate_content(prompt, generation_config=generation_config) if generation_config else model.generate_content(prompt)
+        record_token_usage(metrics, res)
+        return response_text(res)
+    try:
+        text = ctx.call(f"{key_fingerprint(ctx.api_key or '')}:{key}", call)
+    except Exception:
+        metrics.inc("ai_calls_total", outcome="error")
+        raise
+    finished = time.perf_counter()
+    metrics.observe("ai_call_seconds", finished - submitted)
+    if "at" in started:
+        metrics.observe("ai_queue_seconds", started["at"] - submitted)
+        metrics.observe("ai_model_seconds", finished - started["at"])
+        metrics.inc("ai_calls_total", outcome="ok")
+    else:
+        metrics.observe("ai_queue_seconds", finished - submitted)
+        metrics.inc("ai_calls_total", outcome="coalesced")
+    metrics.observe("ai_response_chars", len(text or ""))
+    if text and ctx.cache is not None: ctx.cache.set(key, text)
+    return text
+
+def stream_text(ctx: AIContext, prompt: str, generation_config: Optional[dict] = None,
+                use_cache: Optional[bool] = None):
+    """Streaming core of ask_ai_stream: yields text chunks as the model produces them. Raises on model errors.
+
+    A cached answer is yielded as a single chunk.
+    """
+    if use_cache is None: use_cache = ctx.use_cache
+    key = cache_key(ctx.model_name, prompt, generation_config)
+    metrics = ctx.metrics
+    if use_cache and ctx.cache is not None:
+        cached = ctx.cache.get(key)
+        if cached is not None:
+            metrics.inc("ai_calls_total", outcome="cache_hit", mode="stream")
+            yield cached
+            return
+    parts = []
+    submitted = time.perf_counter()
+    first_chunk_at = None
+    try:
+        model = ctx.client()
+        kwargs = {"stream": True}
+        if generation_config: kwargs["generation_config"] = generation_config
+        # Streams are rate-limited and retried only up to the first response; they are not coalesced.
+        response = ctx.call(None, lambda: model.generate_content(prompt, **kwargs))
+        for chunk in response:
+            text = chunk_text(chunk)
+            if text:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                    metrics.observe("ai_first_chunk_seconds", first_chunk_at - submitted)
+                parts.append(text)
+                yield text
+        record_token_usage(metrics, response)
+    except Exception:
+        metrics.inc("ai_calls_total", outcome="error", mode="stream")
+        raise
+    metrics.inc("ai_calls_total", outcome="ok", mode="stream")
+    metrics.observe("ai_model_seconds", time.perf_counter() - submitted, mode="stream")
+    metrics.observe("ai_call_seconds", time.perf_counter() - submitted, mode="stream")
+    metrics.observe("ai_response_chars", sum(len(p) for p in parts), mode="stream")
+    if parts and ctx.cache is not None: ctx.cache.set(key, "".join(parts))
+
+def record_token_usage(metrics: Metrics, res):
+    usage = getattr(res, "usage_metadata", None)
+    if usage is None: return
+    for kind, attr in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+        n = getattr(usage, attr, None)
+        if isinstance(n, int) and n: metrics.inc("ai_tokens_total", n, kind=kind)
+
+def response_text(res) -> str:
+    return getattr(res, "text", None) or (res.get("text") if isinstance(res, dict) else str(res))
+
+def chunk_text(chunk) -> str:
+    # Streamed chunks without text parts (e.g. a trailing safety/finish chunk) raise on `.text`.
+    try: return getattr(chunk, "text", None) or (chunk.get("text", "") if isinstance(chunk, dict) else "")
+    except Exception: return ""
+
+# ---------- Template engine ----------
+PLACEHOLDER_RE = re.compile(r"\{([A-Z][A-Z0-9_]*)\}")
+TEMPLATE_CACHE_SIZE = 32
+RenderResult = namedtuple("RenderResult", ["text", "missing", "unused"])
+
+class CompiledTemplate:
+    """A template split once into literal segments and slots.
+
+    Slots are ``{NAME}`` placeholders or legacy literal swaps (e.g. the old project name).
+    Rendering is a single pass with one join, so substituted values are never re-scanned.
+    """
+
+    def __init__(self, template: str, literals=(), digest: Optional[str] = None):
+        self.digest = digest or template_digest(template)
+        self.literals = tuple(sorted({l for l in literals if l}, key=len, reverse=True))
+        alternatives = [re.escape(l) for l in self.literals] + [PLACEHOLDER_RE.pattern]
+        pattern = re.compile("|".join(f"(?:{a})" for a in alternatives))
+        self.segments, self.slots = [], []  # len(segments) == len(slots) + 1
+        pos = 0
+        for m in pattern.finditer(template):
+            self.segments.append(template[pos:m.start()])
+            name = m.group(1) if m.lastindex else None
+            self.slots.append(("placeholder", name) if name else ("literal", m.group(0)))
+            pos = m.end()
+        self.segments.append(template[pos:])
+        self.placeholders = {v for k, v in self.slots if k == "placeholder"}
+
+    def render(self, values: dict, swaps: Optional[dict] = None) -> RenderResult:
+        """Fill placeholders from ``values`` and literals from ``swaps``; unfilled slots keep their text."""
+        swaps = swaps or {}
+        out, missing = [self.segments[0]], set()
+        for (kind, key), seg in zip(self.slots, self.segments[1:]):
+            if kind == "placeholder":
+                val = values.get(key)
+                if val is None:
+                    missing.add(key)
+                    val = "{" + key + "}"
+            else:
+                val = swaps.get(key, key)
+            out.append(val)
+            out.append(seg)
+        unused = {k for k, v in values.items() if v is not None and k not in self.placeholders}
+        return RenderResult("".join(out), sorted(missing), sorted(unused))
+
+def template_digest(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8", "surrogatepass")).hexdigest()
+
+class TemplateCache:
+    def __init__(self, size: int = TEMPLATE_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def compile(self, template: str, literals=()) -> CompiledTemplate:
+        digest = template_digest(template)
+        key = (digest, tuple(sorted(l for l in literals if l)))
+        with self._lock:
+            tpl = self._items.get(key)
+            if tpl is not None:
+                self._items.move_to_end(key)
+                return tpl
+        tpl = CompiledTemplate(template, literals, digest)
+        with self._lock:
+            self._items[key] = tpl
+            while len(self._items) > self.size: self._items.popitem(last=False)
+        return tpl
+
+@singleton
+def get_template_cache() -> TemplateCache:
+    return TemplateCache()
+
+def compile_template(template: str, literals=()) -> CompiledTemplate:
+    return get_template_cache().compile(template, literals)
+
+# ---------- Landing page helpers ----------
+LANDING_BATCH_WORKERS = int(os.environ.get("KONNECTOPS_LANDING_WORKERS", "4"))
+LANDING_CSV_FIELDS = {"project": ("project", "project name", "name"), "location": ("location", "loc"),
+                      "price": ("price",), "old_name": ("old name", "old_name", "oldname", "old")}
+
+def landing_desc_prompt(proj: str, loc: str) -> str:
+    return f"Write 150 char SEO description for {proj} in {loc}."
+
+def landing_values(price: str, loc: str, extra: Optional[dict] = None) -> dict:
+    values = dict(extra or {})
+    values.update({"PRICE": price or "", "LOCATION": loc or ""})
+    return values
+
+def placeholder_name(column: str) -> str:
+    return re.sub(r"[^A-Z0-9_]+", "_", column.strip().upper()).strip("_")
+
+def csv_header_map(fieldnames, fields: dict) -> dict:
+    """Map CSV columns to field names via their aliases, ignoring case, spaces and underscores."""
+    header_map = {}
+    for col in fieldnames or []:
+        norm = " ".join(col.strip().lower().replace("_", " ").split())
+        for field, aliases in fields.items():
+            if norm in aliases and field not in header_map.values():
+                header_map[col] = field
+    return header_map
+
+def read_landing_rows(csv_bytes: bytes) -> list:
+    """Parse the batch CSV into dicts with project/location/price/old_name keys (header names are forgiving).
+
+    Any other column is kept under ``extra`` as a ``{COLUMN_NAME}`` placeholder value.
+    """
+    text = csv_bytes.decode("utf-8-sig", errors="replace")
+    reader = csv.DictReader(text.splitlines())
+    header_map = csv_header_map(reader.fieldnames, LANDING_CSV_FIELDS)
+    if "project" not in header_map.values():
+        raise ValueError("CSV needs a 'project' column (optional: location, price, old name).")
+    extra_cols = {col: placeholder_name(col) for col in reader.fieldnames if col not in header_map and placeholder_name(col)}
+    rows = []
+    for raw in reader:
+        row = {field: "" for field in LANDING_CSV_FIELDS}
+        for col, field in header_map.items():
+            row[field] = (raw.get(col) or "").strip()
+        row["extra"] = {name: (raw.get(col) or "").strip() for col, name in extra_cols.items()}
+        if row["project"]: rows.append(row)
+    return rows
+
+def unique_file_name(stem: str, used: set, ext: str = ".html") -> str:
+    base = re.sub(r"[^A-Za-z0-9._-]+", "_", stem or "page").strip("_") or "page"
+    name, n = f"{base}{ext}", 1
+    while name in used:
+        n += 1
+        name = f"{base}_{n}{ext}"
+    used.add(name)
+    return name
+
+def build_landing_zip(template: str, rows: list, ctx: AIContext, default_old: str = "",
+                      workers: int = LANDING_BATCH_WORKERS, progress=None):
+    """Fill every row of the template and write the pages into a ZIP as they complete.
+
+    {DESC} calls run on a bounded thread pool, one call per distinct project/location.
+    Returns (zip_file, errors, missing) where zip_file is a rewound temporary file, errors is
+    a list of {"row", "project", "error"} dicts (failed rows keep their {DESC} placeholder)
+    and missing lists placeholders that no row filled.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+    errors, used_names, missing = [], set(), set()
+    needs_desc = "DESC" in compile_template(template).placeholders
+    groups = OrderedDict()
+    for idx, row in enumerate(rows, start=1):
+        groups.setdefault((row["project"].lower(), row["location"].lower()), []).append((idx, row))
+    total, done = len(rows), 0
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        def write_group(members, desc: Optional[str], error: Optional[str]):
+            nonlocal done
+            for idx, row in members:
+                old_name = row["old_name"] or default_old
+                values = landing_values(row["price"], row["location"], row.get("extra"))
+                if desc is not None: values["DESC"] = desc
+                page, row_missing, _ = compile_template(template, (old_name,)).render(values, {old_name: row["project"]})
+                missing.update(row_missing)
+                if error: errors.append({"row": idx, "project": row["project"], "error": error})
+                zf.writestr(unique_file_name(row["project"], used_names), page)
+                done += 1
+                if progress: progress(done, total)
+
+        if not needs_desc or not ctx.model_name:
+            for members in groups.values():
+                write_group(members, None, "No model connected; {DESC} left unfilled." if needs_desc else None)
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                futures = {}
+                for members in groups.values():
+                    first = members[0][1]
+                    prompt = landing_desc_prompt(first["project"], first["location"])
+                    futures[pool.submit(generate_text, ctx, prompt)] = members
+                for fut in as_completed(futures):
+                    try:
+                        write_group(futures[fut], fut.result(), None)
+                    except Exception as e:
+                        logger.warning("Batch SEO description failed: %s", e)
+                        write_group(futures[fut], None, f"Error (AI): {e}")
+        if errors:
+            buf = StringIO()
+            writer = csv.DictWriter(buf, fieldnames=["row", "project", "error"])
+            writer.writeheader()
+            writer.writerows(errors)
+            zf.writestr("_errors.csv", buf.getvalue())
+    out.seek(0)
+    return out, errors, sorted(missing - {"DESC"})
+
+# ---------- Blog pipeline ----------
+# A Home Konnect blog is generated section by section: every section is its own model call from the
+# same project inputs, run concurrently and assembled in BLOG_SECTIONS order. The contact block
+# needs no model and is filled in locally.
+BLOG_SECTION_WORKERS = int(os.environ.get("KONNECTOPS_BLOG_WORKERS", "8"))
+BlogSection = namedtuple("BlogSection", ["key", "heading", "instructions"])
+BLOG_SECTIONS = [
+    BlogSection("intro", None, "A markdown H1 title with the project name, a 2-line 'Preview' with emojis, "
+                               "then an '## Introduction' of one or two short paragraphs."),
+    BlogSection("highlights", "Project Highlights", "5-7 bullet points, each starting with a fitting emoji."),
+    BlogSection("location", "Location Advantages", "Bullet points on connectivity, schools, hospitals, IT parks and shopping nearby."),
+    BlogSection("specifications", "Premium Specifications", "Bullet points on structure, flooring, kitchen, doors and windows, electrical."),
+    BlogSection("amenities", "Amenities", "Bullet points, each starting with a fitting emoji."),
+    BlogSection("developer", "About the Developer", "One short paragraph on the developer's track record."),
+    BlogSection("contact", "Contact", None),
+    BlogSection("faq", "FAQ", "Exactly 5 questions and answers; each question in bold on its own line."),
+    BlogSection("seo", "SEO", "'**Meta Title:**' (max 60 characters), '**Meta Description:**' (max 150 characters), "
+                              "then '**Tags:**' with 8-12 comma separated tags."),
+]
+BLOG_FIELDS = {"project": ("project", "project name", "name"), "location": ("location", "loc"),
+               "developer": ("developer", "builder"), "usps": ("usps", "usp", "highlights"),
+               "price": ("price", "price hint"), "possession": ("possession",),
+               "phone": ("phone", "sales phone", "mobile"), "email": ("email", "sales email")}
+
+def blog_section_prompt(project: dict, section: BlogSection) -> str:
+    start = f"Start with the heading '## {section.heading}'. " if section.heading else ""
+    return (f"You are a professional real estate content writer for the Home Konnect blog.\n"
+            f"Write ONLY the {section.heading or 'title, preview and introduction'} part of a blog post about this project. "
+            f"{start}{section.instructions}\n"
+            f"Project: {project['project']}\nLocation: {project['location']}\nDeveloper: {project['developer']}\n"
+            f"USPs: {project['usps']}\nPrice hint: {project['price']}\nPossession: {project['possession']}\n"
+            "Return only markdown for this part, without code fences or any other section.")
+
+def contact_section(project: dict) -> str:
+    digits = re.sub(r"\D", "", project.get("phone") or "")
+    lines = [f"## Contact\n\nInterested in **{project['project']}**? Talk to our sales team today."]
+    if digits: lines.append(f"📞 Call: +{digits}  \n💬 WhatsApp: https://wa.me/{digits}")
+    if project.get("email"): lines.append(f"✉️ Email: {project['email']}")
+    return "\n\n".join(lines)
+
+def clean_section(text: str, heading: Optional[str]) -> str:
+    text = re.sub(r"^```(?:markdown|md)?\s*\n|\n?```\s*$", "", (text or "").strip()).strip()
+    if heading and not text.startswith("#"):
+        text = f"## {heading}\n\n{text}"
+    return text
+
+def blog_jobs(projects: list, only: Optional[dict] = None) -> list:
+    """(project index, section) pairs to generate; ``only`` maps a project index to the section keys to redo."""
+    return [(i, s) for i in range(len(projects)) for s in BLOG_SECTIONS
+            if s.instructions and (only is None or s.key in only.get(i, ()))]
+
+def run_blog_sections(projects: list, jobs: list, ctx: AIContext, workers: int = BLOG_SECTION_WORKERS,
+                      on_section=None, on_chunk=None) -> dict:
+    """Generate the sections in ``jobs`` concurrently.
+
+    Returns {(project index, key): (text, error)}. ``on_section(index, key, text, error)`` runs on the
+    calling thread as each section completes, so it may update Streamlit elements. Given
+    ``on_chunk(index, key, text so far)``, sections are streamed and it runs, also on the calling thread,
+    as their chunks arrive.
+    """
+    results = {}
+    if not ctx.model_name:
+        for i, s in jobs:
+            results[(i, s.key)] = (None, "Error: Offline (no model configured).")
+            if on_section: on_section(i, s.key, *results[(i, s.key)])
+        return results
+    chunks, streamed = queue.Queue(), {}
+
+    def generate(i, s):
+        prompt = blog_section_prompt(projects[i], s)
+        if on_chunk is None:
+            return generate_text(ctx, prompt)
+        parts = []
+        for chunk in stream_text(ctx, prompt):
+            parts.append(chunk)
+            chunks.put((i, s.key, chunk))
+        return "".join(parts)
+
+    def drain():
+        while True:
+            try: i, key, chunk = chunks.get_nowait()
+            except queue.Empty: return
+            streamed[(i, key)] = streamed.get((i, key), "") + chunk
+            on_chunk(i, key, streamed[(i, key)])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(generate, i, s): (i, s) for i, s in jobs}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.1 if on_chunk else None, return_when=FIRST_COMPLETED)
+            if on_chunk: drain()  # a finished section's chunks were all queued before it finished
+            for fut in done:
+                i, s = futures[fut]
+                try:
+                    text, error = clean_section(fut.result(), s.heading), None
+                    if not text: error = "Error (AI): empty response"
+                except Exception as e:
+                    logger.warning("Blog section %s failed: %s", s.key, e)
+                    text, error = None, f"Error (AI): {e}"
+                results[(i, s.key)] = (text, error)
+                if on_section: on_section(i, s.key, text, error)
+    return results
+
+def assemble_blog(project: dict, sections: dict) -> str:
+    """Markdown in Home Konnect order; a failed section keeps its heading and a short note."""
+    parts = []
+    for s in BLOG_SECTIONS:
+        if s.instructions is None:
+            parts.append(contact_section(project))
+        elif sections.get(s.key):
+            parts.append(sections[s.key])
+        else:
+            parts.append(f"## {s.heading or project['project']}\n\n_(Not generated yet.)_")
+    return "\n\n".join(parts) + "\n"
+
+def read_blog_projects(csv_bytes: bytes, defaults: dict) -> list:
+    """One project dict per CSV row; columns that are missing or empty fall back to ``defaults``."""
+    reader = csv.DictReader(csv_bytes.decode("utf-8-sig", errors="replace").splitlines())
+    header_map = csv_header_map(reader.fieldnames, BLOG_FIELDS)
+    if "project" not in header_map.values():
+        raise ValueError("CSV needs a 'project' column (optional: " + ", ".join(list(BLOG_FIELDS)[1:]) + ").")
+    projects = []
+    for raw in reader:
+        project = dict(defaults, project="")
+        for col, field in header_map.items():
+            value = (raw.get(col) or "").strip()
+            if value: project[field] = value
+        if project["project"]: projects.append(project)
+    return projects
+
+# ---------- Blob store ----------
+# Uploaded and generated images live here once per content hash, shared by every session; session
+# state keeps only the sha256 handle. Blobs over the memory budgets are spilled to disk and
+# memory-mapped when read back, so they cost page cache instead of process heap.
+BLOB_DIR = os.path.join(CACHE_DIR, "blobs")
+BLOB_MEMORY_BUDGET = int(os.environ.get("KONNECTOPS_BLOB_MEMORY_MB", "256")) * 1024 * 1024
+BLOB_SESSION_BUDGET = int(os.environ.get("KONNECTOPS_BLOB_SESSION_MB", "32")) * 1024 * 1024
+BLOB_SESSION_IDLE_SECONDS = int(os.environ.get("KONNECTOPS_SESSION_IDLE_SECONDS", str(6 * 3600)))
+BLOB_SWEEP_INTERVAL = 60
+
+class BlobStore:
+    """Content-addressed, refcounted bytes. A blob lives while at least one session references it.
+
+    Resident blobs are kept in LRU order; when the process budget or one session's resident share is
+    exceeded, the least recently used ones are written under ``root`` and dropped from memory. The write
+    happens outside the store lock: a blob stays resident (and readable) until its spill file exists.
+    """
+
+    def __init__(self, root: str = BLOB_DIR, memory_budget: int = BLOB_MEMORY_BUDGET,
+                 session_budget: int = BLOB_SESSION_BUDGET):
+        self.root = root
+        self.memory_budget = memory_budget
+        self.session_budget = session_budget
+        self._lock = threading.Lock()
+        self._resident = OrderedDict()  # digest -> bytes
+        self._meta = {}                 # digest -> {"size", "content_type", "owners"}
+        self._sessions = {}             # session id -> {"blobs": set, "seen": float}
+        self._resident_bytes = 0
+        self._spilling = set()          # digests being written out by some thread
+        self._last_sweep = time.time()
+        self.dedup_hits = self.spills = self.disk_reads = 0
+        self._remove_orphans()
+
+    def _remove_orphans(self):
+        """Spill files are per process (root/<pid>/); those of processes that are gone have no owners."""
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if name.isdigit() and name != str(os.getpid()):
+                try:
+                    os.kill(int(name), 0)
+                    continue
+                except ProcessLookupError:
+                    pass
+                except OSError:
+                    continue
+            elif name != str(os.getpid()):
+                continue
+            for dirpath, _, files in os.walk(os.path.join(self.root, name), topdown=False):
+                for f in files:
+                    try: os.remove(os.path.join(dirpath, f))
+                    except OSError: pass
+                try: os.rmdir(dirpath)
+                except OSError: pass
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, str(os.getpid()), digest[:2], digest)
+
+    def _session(self, session: str) -> dict:
+        entry = self._sessions.setdefault(session, {"blobs": set(), "seen": time.time()})
+        entry["seen"] = time.time()
+        return entry
+
+    def put(self, session: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            meta = self._meta.get(digest)
+            if meta is None:
+                self._meta[digest] = meta = {"size": len(data), "content_type": content_type, "owners": set()}
+                self._resident[digest] = bytes(data)
+                self._resident_bytes += len(data)
+            else:
+                self.dedup_hits += 1
+                if digest in self._resident: self._resident.move_to_end(digest)
+            meta["owners"].add(session)
+            self._session(session)["blobs"].add(digest)
+            victims = self._enforce(session)
+        for victim in victims:
+            self._spill(*victim)
+        return digest
+
+    def get(self, digest: Optional[str]):
+        """The blob's bytes: a bytes object if resident, else a read-only mmap of its spill file. None if unknown."""
+        with self._lock:
+            if not digest or digest not in self._meta:
+                return None
+            data = self._resident.get(digest)
+            if data is not None:
+                self._resident.move_to_end(digest)
+                return data
+            self.disk_reads += 1
+        try:
+            with open(self._path(digest), "rb") as fh:
+                return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning("Blob %s unreadable: %s", digest[:12], e)
+            return None
+
+    def content_type(self, digest: str) -> Optional[str]:
+        meta = self._meta.get(digest)
+        return meta["content_type"] if meta else None
+
+    def release(self, session: str, digest: Optional[str]):
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is not None: entry["blobs"].discard(digest)
+            meta = self._meta.get(digest)
+            if meta is None:
+                return
+            meta["owners"].discard(session)
+            if not meta["owners"]:
+                self._drop(digest)
+
+    def release_session(self, session: str):
+        with self._lock:
+            entry = self._sessions.pop(session, None)
+            for digest in (entry or {}).get("blobs", ()):
+                meta = self._meta.get(digest)
+                if meta is None: continue
+                meta["owners"].discard(session)
+                if not meta["owners"]: self._drop(digest)
+
+    def touch(self, session: str):
+        with self._lock: self._session(session)
+
+    def sweep(self, idle_seconds: int = BLOB_SESSION_IDLE_SECONDS, is_active=None):
+        """Release sessions that the runtime no longer knows or that have been idle too long."""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < BLOB_SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+            stale = [sid for sid, entry in self._sessions.items()
+                     if now - entry["seen"] > idle_seconds or (is_active is not None and not is_active(sid))]
+        for sid in stale:
+            self.release_session(sid)
+
+    def _drop(self, digest: str):
+        meta = self._meta.pop(digest)
+        if self._resident.pop(digest, None) is not None:
+            self._resident_bytes -= meta["size"]
+        try: os.remove(self._path(digest))
+        except OSError: pass
+
+    def _enforce(self, session: str) -> list:
+        """(digest, bytes) of the resident blobs to spill, oldest first. Lock held; the caller writes them."""
+        victims, pending = [], sum(self._meta[d]["size"] for d in self._spilling)
+        owned = [d for d in self._resident if session in self._meta[d]["owners"] and d not in self._spilling]
+        used = sum(self._meta[d]["size"] for d in owned)
+        for digest in owned:
+            if used <= self.session_budget: break
+            used -= self._meta[digest]["size"]
+            pending += self._meta[digest]["size"]
+            victims.append(digest)
+            self._spilling.add(digest)
+        for digest in list(self._resident):
+            if self._resident_bytes - pending <= self.memory_budget: break
+            if digest in self._spilling: continue
+            pending += self._meta[digest]["size"]
+            victims.append(digest)
+            self._spilling.add(digest)
+        return [(d, self._resident[d]) for d in victims]
+
+    def _spill(self, digest: str, data: bytes):
+        """Write one victim of _enforce to disk without the lock, then drop its resident copy."""
+        path = self._path(digest)
+        try:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as fh: fh.write(data)
+                os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Could not spill blob %s: %s", digest[:12], e)
+            with self._lock: self._spilling.discard(digest)
+            return
+        with self._lock:
+            self._spilling.discard(digest)
+            if digest not in self._meta:  # released while it was being written
+                try: os.remove(path)
+                except OSError: pass
+                return
+            if self._resident.pop(digest, None) is not None:
+                self._resident_bytes -= len(data)
+                self.spills += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"blobs": len(self._meta), "resident": len(self._resident), "resident_bytes": self._resident_bytes,
+                    "spilled_bytes": sum(m["size"] for d, m in self._meta.items() if d not in self._resident),
+                    "sessions": len(self._sessions), "dedup_hits": self.dedup_hits, "spills": self.spills,
+                    "disk_reads": self.disk_reads}
+
+@singleton
+def get_blob_store() -> BlobStore:
+    return BlobStore()
+
+# ---------- Image helpers ----------
+BG_MAX_SIZE = (1600, 1000)
+BG_QUALITY = 80
+BG_EXTENSIONS = {"image/webp": "webp", "image/jpeg": "jpg", "image/png": "png"}
+BG_MAX_FILES = int(os.environ.get("KONNECTOPS_BG_MAX_FILES", "200"))
+BG_MAX_AGE_SECONDS = int(os.environ.get("KONNECTOPS_BG_MAX_AGE_DAYS", "30")) * 24 * 3600
+BG_TMP_MAX_AGE_SECONDS = 3600
+
+def prune_backgrounds(bg_dir: str, max_files: int = BG_MAX_FILES, max_age_seconds: int = BG_MAX_AGE_SECONDS) -> int:
+    """Delete stored backgrounds beyond the newest max_files or unused for max_age_seconds; returns the count.
+
+    A file's mtime is its last use (reuses touch it). Temp files left by interrupted writes go after an hour.
+    """
+    now, files, doomed = time.time(), [], []
+    try:
+        entries = list(os.scandir(bg_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if not entry.is_file(): continue
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        if entry.name.startswith("."):
+            if now - mtime > BG_TMP_MAX_AGE_SECONDS: doomed.append(entry.path)
+        else:
+            files.append((mtime, entry.path))
+    files.sort(reverse=True)
+    doomed += [path for i, (mtime, path) in enumerate(files) if i >= max_files or now - mtime > max_age_seconds]
+    removed = 0
+    for path in doomed:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not remove background %s: %s", path, e)
+    return removed
+
+def recompress_background(img_bytes: bytes):
+    """Downscale to display resolution and re-encode as WebP (JPEG fallback). Returns (bytes, mime)."""
+    from PIL import Image, ImageOps
+    with Image.open(BytesIO(img_bytes)) as im:
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGB")
+        im.thumbnail(BG_MAX_SIZE, Image.LANCZOS)
+        out = BytesIO()
+        try:
+            im.save(out, format="WEBP", quality=BG_QUALITY, method=4)
+            return out.getvalue(), "image/webp"
+        except (OSError, KeyError):
+            out = BytesIO()
+            im.save(out, format="JPEG", quality=BG_QUALITY, optimize=True, progressive=True)
+            return out.getvalue(), "image/jpeg"
+
+# ---------- Image generation stub (best-effort) ----------
+def inline_image_bytes(res) -> Optional[bytes]:
+    for cand in getattr(res, "candidates", None) or []:
+        for part in getattr(getattr(cand, "content", None), "parts", None) or []:
+            blob = getattr(part, "inline_data", None)
+            if blob is not None and (getattr(blob, "mime_type", "") or "").startswith("image/") and blob.data:
+                return blob.data
+    return None
+
+def generate_cover_image_via_genai(prompt: str, size: str = "1200x628", ctx: Optional[AIContext] = None) -> Optional[bytes]:
+    metrics = ctx.metrics if ctx is not None else NULL_METRICS
+    with metrics.timer("cover_image") as extra:
+        img = _generate_cover_image(prompt, size, ctx)
+        extra["bytes"] = len(img or b"")
+    return img
+
+def _generate_cover_image(prompt: str, size: str, ctx: Optional[AIContext]) -> Optional[bytes]:
+    try:
+        if ctx is not None and ctx.registry is not None and ctx.api_key:
+            image_model = ctx.registry.default_model(ctx.api_key, capability="image")
+            if image_model:
+                model = ctx.client(image_model)
+                image_prompt = f"{prompt} Output size: {size}."
+                coalesce_key = "image:" + cache_key(f"{key_fingerprint(ctx.api_key)}:{image_model}", image_prompt)
+                return ctx.call(coalesce_key, lambda: inline_image_bytes(model.generate_content(image_prompt)))
+        genai = genai_module()
+        if hasattr(genai, "images") and hasattr(genai.images, "generate"):
+            resp = genai.images.generate(model="image-alpha-001", prompt=prompt, size=size)
+            b64 = None
+            if hasattr(resp, "data"):
+                item = resp.data[0]
+                b64 = getattr(item, "b64_json", None) or (item.get("b64_json") if isinstance(item, dict) else None)
+            elif isinstance(resp, list) and resp:
+                item = resp[0]
+                b64 = getattr(item, "b64_json", None) or (item.get("b64_json") if isinstance(item, dict) else None)
+            else:
+                b64 = getattr(resp, "b64_json", None) or (resp.get("b64_json") if isinstance(resp, dict) else None)
+            if b64:
+                return base64.b64decode(b64)
+            return None
+        return None
+    except Exception as e:
+        logger.warning("Image generation via genai failed: %s", e)
+        return None
+
+# ---------- Cover image pipeline ----------
+# Covers are decoded once per content hash in worker processes (konnect_images.py) and cut into
+# renditions that downloads and uploads pick from.
+COVER_WORKERS = int(os.environ.get("KONNECTOPS_IMAGE_WORKERS", "2"))
+COVER_CACHE_MAX_BYTES = int(os.environ.get("KONNECTOPS_COVER_CACHE_MB", "128")) * 1024 * 1024
+def make_image_executor(workers: int):
+    # Spawned, not forked: the pool starts lazily from a script thread of the multi-threaded server, and a
+    # forked child would inherit whatever locks (logging, SQLite caches, the blob store) other threads held.
+    # Workers only import konnect_images; konnect_ops.py gives itself a __main__ spec so they skip the app.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+class CoverPipeline:
+    """Process-wide rendition cache keyed by sha256 of the source bytes, LRU-bounded by encoded size."""
+
+    def __init__(self, workers: int = COVER_WORKERS, max_bytes: int = COVER_CACHE_MAX_BYTES):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._done = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self._executor = make_image_executor(workers)
+        self.hits = self.misses = self.failures = 0
+
+    def future(self, digest: str, img_bytes) -> Future:
+        """Renditions for the blob with this sha256; ``img_bytes`` may be a callable, only used on a miss."""
+        with self._lock:
+            if digest in self._done:
+                self._done.move_to_end(digest)
+                self.hits += 1
+                fut = Future()
+                fut.set_result(self._done[digest])
+                return fut
+            fut = self._inflight.get(digest)
+            if fut is not None:
+                self.hits += 1
+                return fut
+            data = img_bytes() if callable(img_bytes) else img_bytes
+            if data is None:
+                fut = Future()
+                fut.set_exception(LookupError(f"No bytes for {digest[:12]}"))
+                return fut
+            self.misses += 1
+            import konnect_images
+            from concurrent.futures.process import BrokenProcessPool
+            executor = self._executor
+            try:
+                fut = executor.submit(konnect_images.render_renditions, bytes(data))
+            except BrokenProcessPool:  # a worker died while the pool was idle
+                self.failures += 1
+                executor = self._replace_executor(executor)
+                fut = executor.submit(konnect_images.render_renditions, bytes(data))
+            self._inflight[digest] = fut
+        fut.add_done_callback(lambda f: self._finish(digest, f, executor))
+        return fut
+
+    def _finish(self, digest: str, fut: Future, executor):
+        from concurrent.futures.process import BrokenProcessPool
+        exc = fut.exception()
+        with self._lock:
+            self._inflight.pop(digest, None)
+            if isinstance(exc, BrokenProcessPool):
+                self.failures += 1
+                self._replace_executor(executor)
+                return
+            result = {"error": str(exc)} if exc is not None else fut.result()
+            size = sum(len(r["jpeg"]) + len(r["webp"] or b"") for r in result.get("renditions", {}).values())
+            result["bytes"] = size
+            self._done[digest] = result
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._done) > 1:
+                _, old = self._done.popitem(last=False)
+                self._bytes -= old["bytes"]
+        if exc is not None:
+            self.failures += 1
+            logger.warning("Cover renditions failed for %s: %s", digest[:12], exc)
+
+    def _replace_executor(self, broken):
+        """Swap out a broken pool (once, however many of its futures fail) and shut it down. Lock held."""
+        if broken is self._executor:
+            logger.warning("Cover worker pool broke; starting a new one")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = make_image_executor(self.workers)
+        return self._executor
+
+    def close(self):
+        """Stop the workers. A multiprocessing.Process that used the pipeline must call this before it
+        returns: its exit joins child processes before the pool's own shutdown hook would run."""
+        with self._lock:
+            executor = self._executor
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def result(fut: Future) -> Optional[dict]:
+        """The finished renditions, or None if they failed or are not ready."""
+        if not fut.done() or fut.exception() is not None:
+            return None
+        result = fut.result()
+        return None if "error" in result else result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._done), "bytes": self._bytes, "inflight": len(self._inflight),
+                    "hits": self.hits, "misses": self.misses, "failures": self.failures,
+                    "executor": type(self._executor).__name__}
+
+@singleton
+def get_cover_pipeline() -> CoverPipeline:
+    return CoverPipeline()
+
+# ---------- Cloud upload helpers ----------
+UPLOAD_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+UPLOAD_PART_SIZE = 8 * 1024 * 1024  # also the GCS resumable chunk size; must be a multiple of 256 KiB
+UPLOAD_CONCURRENCY = int(os.environ.get("KONNECTOPS_UPLOAD_CONCURRENCY", "4"))
+UPLOAD_RETRIES = 3
+UPLOAD_CLIENT_CACHE_SIZE = 16
+LOCAL_BUCKET_DIR = os.environ.get("KONNECTOPS_LOCAL_BUCKET_DIR", os.path.join(CACHE_DIR, "buckets"))
+UploadItem = namedtuple("UploadItem", ["object_name", "data", "content_type"])
+
+def detect_content_type(data: bytes, object_name: str = "") -> str:
+    head = data[:16]
+    if head.startswith(b"\x89PNG\r\n\x1a\n"): return "image/png"
+    if head.startswith(b"\xff\xd8\xff"): return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP": return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"): return "image/gif"
+    return mimetypes.guess_type(object_name)[0] or "application/octet-stream"
+
+def extension_for(content_type: str) -> str:
+    return {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}.get(
+        content_type, mimetypes.guess_extension(content_type) or "")
+
+class UploadClients:
+    """Storage clients shared across sessions, keyed by a hash of their credentials."""
+
+    def __init__(self, size: int = UPLOAD_CLIENT_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+
+    def _get(self, key: tuple, factory):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+        client = factory()
+        with self._lock:
+            client = self._clients.setdefault(key, client)
+            while len(self._clients) > self.size: self._clients.popitem(last=False)
+        return client
+
+    def s3(self, region: str, access_key: str, secret_key: str):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("boto3 not available; install boto3 to use S3 uploads.")
+        import boto3
+        from botocore.config import Config as BotoConfig
+        key = ("s3", hashlib.sha256(f"{region}\0{access_key}\0{secret_key}".encode()).hexdigest())
+        return self._get(key, lambda: boto3.client(
+            "s3", region_name=region, aws_access_key_id=access_key, aws_secret_access_key=secret_key,
+            config=BotoConfig(max_pool_connections=UPLOAD_CONCURRENCY * 4)))
+
+    def gcs(self, credentials_json: dict):
+        if not GCS_AVAILABLE:
+            raise RuntimeError("google-cloud-storage not available; install google-cloud-storage to use GCS uploads.")
+        key = ("gcs", hashlib.sha256(json.dumps(credentials_json, sort_keys=True).encode()).hexdigest())
+        def factory():
+            from google.cloud import storage as gcs_storage
+            from google.oauth2 import service_account
+            credentials = service_account.Credentials.from_service_account_info(credentials_json)
+            return gcs_storage.Client(credentials=credentials, project=credentials.project_id)
+        return self._get(key, factory)
+
+@singleton
+def get_upload_clients() -> UploadClients:
+    return UploadClients()
+
+def upload_to_s3(bytes_data: bytes, bucket: str, object_name: str, region: str, access_key: str, secret_key: str,
+                 content_type: Optional[str] = None, progress=None, metrics: Metrics = NULL_METRICS) -> str:
+    """Upload via the managed transfer: multipart with concurrent parts above UPLOAD_MULTIPART_THRESHOLD."""
+    with metrics.timer("upload", backend="s3") as event:
+        event["bytes"] = len(bytes_data)
+        s3 = get_upload_clients().s3(region, access_key, secret_key)
+        from boto3.s3.transfer import TransferConfig
+        config = TransferConfig(multipart_threshold=UPLOAD_MULTIPART_THRESHOLD, multipart_chunksize=UPLOAD_PART_SIZE,
+                                max_concurrency=UPLOAD_CONCURRENCY, use_threads=True)
+        extra = {"ACL": "public-read", "ContentType": content_type or detect_content_type(bytes_data, object_name)}
+        s3.upload_fileobj(BytesIO(bytes_data), bucket, object_name, ExtraArgs=extra, Config=config, Callback=progress)
+    metrics.observe("upload_bytes", len(bytes_data), backend="s3")
+    return f"https://{bucket}.s3.{region}.amazonaws.com/{object_name}"
+
+class ProgressReader:
+    """Read-only view of bytes that reports each newly read byte count to progress (re-reads after a seek are not counted)."""
+
+    def __init__(self, data: bytes, progress=None):
+        self._buf = BytesIO(data)
+        self._progress = progress
+        self._reported = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._buf.read(size)
+        pos = self._buf.tell()
+        if self._progress and pos > self._reported:
+            self._progress(pos - self._reported)
+            self._reported = pos
+        return chunk
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        return self._buf.seek(pos, whence)
+
+    def tell(self) -> int:
+        return self._buf.tell()
+
+def upload_to_gcs(bytes_data: bytes, bucket_name: str, object_name: str, credentials_json: dict,
+                  content_type: Optional[str] = None, progress=None, metrics: Metrics = NULL_METRICS) -> str:
+    """Large objects go up as concurrent XML-API parts when transfer_manager exists, else as a chunked resumable upload.
+
+    The resumable upload reports progress per chunk; transfer_manager has no progress hook, so concurrent
+    parts report the whole object once it is done.
+    """
+    with metrics.timer("upload", backend="gcs") as event:
+        event["bytes"] = len(bytes_data)
+        url = _upload_to_gcs(bytes_data, bucket_name, object_name, credentials_json, content_type, progress)
+    metrics.observe("upload_bytes", len(bytes_data), backend="gcs")
+    return url
+
+def _upload_to_gcs(bytes_data: bytes, bucket_name: str, object_name: str, credentials_json: dict,
+                   content_type: Optional[str], progress) -> str:
+    client = get_upload_clients().gcs(credentials_json)
+    bucket = client.bucket(bucket_name)
+    content_type = content_type or detect_content_type(bytes_data, object_name)
+    large = len(bytes_data) >= UPLOAD_MULTIPART_THRESHOLD
+    blob = bucket.blob(object_name, chunk_size=UPLOAD_PART_SIZE if large else None)
+    blob.content_type = content_type
+    try:
+        from google.cloud.storage import transfer_manager as gcs_transfer_manager
+    except ImportError:
+        gcs_transfer_manager = None
+    if large and gcs_transfer_manager is not None:
+        with tempfile.NamedTemporaryFile(suffix=extension_for(content_type)) as tmp:
+            tmp.write(bytes_data)
+            tmp.flush()
+            # Threads, not the default worker processes: forking the multi-threaded server can deadlock.
+            gcs_transfer_manager.upload_chunks_concurrently(tmp.name, blob, content_type=content_type,
+                                                            chunk_size=UPLOAD_PART_SIZE, max_workers=UPLOAD_CONCURRENCY,
+                                                            worker_type=gcs_transfer_manager.THREAD)
+        if progress: progress(len(bytes_data))
+    else:
+        blob.upload_from_file(ProgressReader(bytes_data, progress), size=len(bytes_data), content_type=content_type)
+    blob.make_public()
+    return blob.public_url
+
+def upload_to_local(bytes_data: bytes, bucket: str, object_name: str, content_type: Optional[str] = None,
+                    progress=None, root: str = LOCAL_BUCKET_DIR, metrics: Metrics = NULL_METRICS) -> str:
+    """Filesystem stand-in for a bucket (offline testing and benchmarks); returns a file:// URL."""
+    with metrics.timer("upload", backend="local") as event:
+        event["bytes"] = len(bytes_data)
+        url = _upload_to_local(bytes_data, bucket, object_name, content_type, progress, root)
+    metrics.observe("upload_bytes", len(bytes_data), backend="local")
+    return url
+
+def _upload_to_local(bytes_data: bytes, bucket: str, object_name: str, content_type: Optional[str], progress, root: str) -> str:
+    bucket_dir = os.path.realpath(os.path.join(root, bucket or "default"))
+    path = os.path.realpath(os.path.join(bucket_dir, object_name))
+    if not path.startswith(bucket_dir + os.sep):
+        raise ValueError(f"Object name escapes the bucket: {object_name}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.part"
+    with open(tmp, "wb") as fh:
+        view = memoryview(bytes_data)
+        for start in range(0, len(view), UPLOAD_PART_SIZE):
+            fh.write(view[start:start + UPLOAD_PART_SIZE])
+            if progress: progress(min(UPLOAD_PART_SIZE, len(view) - start))
+    os.replace(tmp, path)
+    with open(path + ".meta.json", "w") as fh:
+        json.dump({"content_type": content_type or detect_content_type(bytes_data, object_name)}, fh)
+    return "file://" + path
+
+def upload_batch(put, items: list, workers: int = UPLOAD_CONCURRENCY, retries: int = UPLOAD_RETRIES, on_progress=None) -> dict:
+    """Upload items in parallel with per-object retries (exponential backoff with jitter).
+
+    ``put(data, object_name, content_type, progress)`` returns the object URL; ``progress`` receives
+    byte increments. ``on_progress(state)`` runs on the calling thread while uploads are in flight.
+    Returns {object_name: {"status", "sent", "total", "attempts", "url", "error"}}.
+    """
+    lock = threading.Lock()
+    state = {it.object_name: {"status": "queued", "sent": 0, "total": len(it.data), "attempts": 0, "url": None, "error": None}
+             for it in items}
+
+    def run(item: UploadItem):
+        entry = state[item.object_name]
+        def progress(n):
+            with lock: entry["sent"] = min(entry["total"], entry["sent"] + n)
+        for attempt in range(1, retries + 1):
+            with lock: entry.update(status="uploading", attempts=attempt, sent=0)
+            try:
+                url = put(item.data, item.object_name, item.content_type, progress)
+                with lock: entry.update(status="done", url=url, sent=entry["total"], error=None)
+                return
+            except Exception as e:
+                logger.warning("Upload of %s failed (attempt %d/%d): %s", item.object_name, attempt, retries, e)
+                with lock: entry.update(status="retrying" if attempt < retries else "failed", error=str(e))
+                if attempt < retries: time.sleep(min(8.0, 0.5 * 2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {pool.submit(run, it) for it in items}
+        while pending:
+            _, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            if on_progress:
+                with lock: snapshot = {k: dict(v) for k, v in state.items()}
+                on_progress(snapshot)
+    return state
+
+# ---------- Generators ----------
+CONTENT_TYPES = ["Blog Post", "Instagram Carousel", "LinkedIn Post", "Client Email"]
+IMAGE_STYLES = ["Photorealistic 8k", "Architectural render", "Lifestyle"]
+FESTIVALS_2026 = [("Jan 14", "Pongal"), ("Jan 26", "Republic Day"), ("Mar 04", "Holi"), ("Mar 20", "Ramzan"),
+                  ("Apr 14", "Tamil New Year"), ("Aug 15", "Independence Day"), ("Aug 26", "Onam"),
+                  ("Sep 14", "Ganesh Chaturthi"), ("Oct 20", "Ayudha Puja"), ("Nov 08", "Diwali"), ("Dec 25", "Christmas")]
+
+def content_prompt(content_type: str, topic: str) -> str:
+    return f"Act as a Senior Marketing Manager. Write a professional {content_type} about: {topic}."
+
+def image_concept_prompt(concept: str, style: str) -> str:
+    return f"Write a detailed Midjourney prompt for: {concept}. Style: {style}."
+
+def cover_image_prompt(project: str, location: str, usps: str) -> str:
+    usps_short = "; ".join([u.strip() for u in (usps or "").split(",") if u.strip()][:4])
+    return (f"Blog cover for '{project}' in {location}. Photorealistic 1200x628, modern mid-rise exterior at golden hour, "
+            f"landscaped foreground, safe family silhouettes, room for title overlay, no recognizable faces. Emphasize: {usps_short}.")
+
+def deluge_prompt(logic: str) -> str:
+    return f"Write Zoho Deluge script: {logic}"
+
+def whatsapp_link(phone: str, message: str = "") -> str:
+    return f"https://wa.me/{phone.strip()}?text={quote_plus(message or '')}"
+
+def render_landing(template: str, ctx: "AIContext", project: str, location: str = "", price: str = "",
+                   old_name: str = "", extra: Optional[dict] = None) -> RenderResult:
+    """Single landing page: {DESC} from the model when the template uses it, old name swapped for the project."""
+    tpl = compile_template(template, (old_name,))
+    values = landing_values(price, location, extra)
+    if "DESC" in tpl.placeholders and ctx.model_name:
+        values["DESC"] = generate_text(ctx, landing_desc_prompt(project, location))
+    return tpl.render(values, {old_name: project or ""})
+
+def generate_blog(project: dict, ctx: "AIContext", workers: int = BLOG_SECTION_WORKERS) -> tuple:
+    """(markdown, {section key: error}) for one project, sections generated concurrently."""
+    project = dict({field: "" for field in BLOG_FIELDS}, **project)
+    results = run_blog_sections([project], blog_jobs([project]), ctx, workers)
+    sections = {key: text for (_, key), (text, error) in results.items() if not error}
+    return assemble_blog(project, sections), {key: error for (_, key), (text, error) in results.items() if error}
+
+# ---------- WhatsApp bulk links ----------
+# Lead exports are read in chunks and every step is a pandas column operation. Percent-encoding
+# works character by character, so quote_plus(a + b) == quote_plus(a) + quote_plus(b). A message is
+# therefore built from its template segments, each quoted once, and its field values, each distinct
+# value quoted once per run.
+WHATSAPP_COUNTRY_CODE = os.environ.get("KONNECTOPS_WA_COUNTRY", "91")
+WHATSAPP_CHUNK_ROWS = 20_000
+WHATSAPP_CSV_FIELDS = {"phone": ("mobile", "mobile number", "phone", "phone number", "whatsapp", "whatsapp number", "contact number"),
+                       "name": ("name", "full name", "lead name", "first name", "contact name"),
+                       "project": ("project", "project name"), "template": ("message", "template", "message template")}
+MOBILE_PATTERNS = {"91": r"91[6-9]\d{9}"}  # country code -> full-number pattern for mobiles
+WHATSAPP_TEMPLATE = "Hi {NAME}, thanks for your interest in {PROJECT}. Can we share the price list and floor plans?"
+
+def normalize_phones(raw, country_code: str = WHATSAPP_COUNTRY_CODE):
+    """Free-form numbers -> (digits with country code, rejection reason or ""), both as Series.
+
+    '+' or '00' marks an international number. Otherwise a 10-digit number, or an 11-digit number with
+    a trunk 0, gets country_code.
+    """
+    import numpy as np
+    import pandas as pd
+    s = raw.fillna("").astype(str).str.strip()
+    intl = s.str.startswith("+") | s.str.startswith("00")
+    digits = s.str.replace(r"\D+", "", regex=True)
+    digits = digits.mask(s.str.startswith("00"), digits.str[2:])
+    n = digits.str.len()
+    digits = digits.mask(~intl & (n == 10), country_code + digits)
+    digits = digits.mask(~intl & (n == 11) & digits.str.startswith("0"), country_code + digits.str[1:])
+    n = digits.str.len()
+    conditions = [s == "", (n < 11) | (n > 15)]
+    pattern = MOBILE_PATTERNS.get(country_code)
+    if pattern:
+        conditions.append(digits.str.startswith(country_code) & ~digits.str.fullmatch(pattern))
+    reason = np.select(conditions, ["missing phone", "invalid length", "not a mobile number"][:len(conditions)], "")
+    return digits.astype(object), pd.Series(reason, index=raw.index, dtype=object)
+
+def quote_values(values, cache: dict):
+    """quote_plus for a Series, calling it once per distinct value (remembered in cache across chunks)."""
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(values.fillna(""), sort=False)
+    quoted = np.array([cache[u] if u in cache else cache.setdefault(u, quote_plus(u)) for u in uniques], dtype=object)
+    return pd.Series(quoted[codes] if len(uniques) else np.array([], dtype=object), index=values.index)
+
+def quoted_messages(template: str, fields: dict, index, cache: dict):
+    """URL-quoted messages for rows ``index``; fields maps a placeholder to a Series or a constant."""
+    import pandas as pd
+    tpl = compile_template(template)
+    out = pd.Series(quote_plus(tpl.segments[0]), index=index, dtype=object)
+    for (kind, key), seg in zip(tpl.slots, tpl.segments[1:]):
+        value = fields.get(key)
+        if value is None:
+            out = out + quote_plus("{" + key + "}")
+        elif isinstance(value, str):
+            out = out + quote_plus(value)
+        else:
+            out = out + quote_values(value.loc[index], cache)
+        out = out + quote_plus(seg)
+    return out
+
+def build_whatsapp_links(source, template: str, out, rejected, country_code: str = WHATSAPP_COUNTRY_CODE,
+                         project: str = "", blank_name: str = "", chunk_rows: int = WHATSAPP_CHUNK_ROWS) -> dict:
+    """Stream a lead CSV into a links CSV (``out``) and a rejected-rows CSV (``rejected``).
+
+    A 'message' column, where filled, overrides ``template`` for that row. Placeholders are {NAME},
+    {PROJECT} (column or ``project``) and {COLUMN_NAME} for any other column. Numbers are normalized
+    and deduplicated across the whole file. Returns counts for the run.
+    """
+    import pandas as pd
+    started = time.perf_counter()
+    try:
+        chunks = pd.read_csv(source, dtype=object, keep_default_na=False, chunksize=chunk_rows, encoding="utf-8-sig")
+    except pd.errors.EmptyDataError:
+        raise ValueError("The CSV is empty.") from None
+    seen, cache, reasons = set(), {}, {}
+    rows = links = 0
+    for i, chunk in enumerate(chunks):
+        header_map = {field: col for col, field in csv_header_map(list(chunk.columns), WHATSAPP_CSV_FIELDS).items()}
+        if "phone" not in header_map:
+            raise ValueError("CSV needs a phone or mobile column (optional: name, project, message).")
+        phones, reason = normalize_phones(chunk[header_map["phone"]], country_code)
+        valid = reason == ""
+        dup = valid & (phones.where(valid).duplicated() | phones.isin(seen))
+        reason = reason.mask(dup, "duplicate")
+        keep = reason == ""
+        seen.update(phones[keep])
+
+        fields = {placeholder_name(col): chunk[col] for col in chunk.columns if placeholder_name(col)}
+        name = chunk[header_map["name"]] if "name" in header_map else pd.Series("", index=chunk.index)
+        fields["NAME"] = name.mask(name.str.strip() == "", blank_name)
+        if "project" in header_map:
+            fields["PROJECT"] = chunk[header_map["project"]].mask(chunk[header_map["project"]].str.strip() == "", project)
+        else:
+            fields["PROJECT"] = project
+        good = chunk.index[keep]
+        text = pd.Series("", index=good, dtype=object)
+        own = chunk[header_map["template"]].loc[good].str.strip() if "template" in header_map else pd.Series("", index=good)
+        for tpl, idx in own.groupby(own).groups.items():
+            text.loc[idx] = quoted_messages(tpl or template, fields, idx, cache)
+        chunk.loc[good].assign(whatsapp_number=phones[keep], whatsapp_link="https://wa.me/" + phones[keep] + "?text=" + text) \
+            .to_csv(out, header=i == 0, index=False)
+        chunk.loc[~keep].assign(reason=reason[~keep]).to_csv(rejected, header=i == 0, index=False)
+        rows += len(chunk)
+        links += int(keep.sum())
+        for r, count in reason[~keep].value_counts().items():
+            reasons[r] = reasons.get(r, 0) + int(count)
+    return {"rows": rows, "links": links, "rejected": rows - links, "reasons": reasons,
+            "quoted_values": len(cache), "seconds": round(time.perf_counter() - started, 3)}
+
+# ---------- Translation memory ----------
+# Text is split into sentence segments. Names from the glossary are masked as [[1]], [[2]]... so they
+# are never translated and "Launch offer at X" reuses the entry made for "Launch offer at Y". Masked
+# segments are looked up in a SQLite memory, exact first and then normalized. Only the misses go to
+# the model, packed many per call as numbered <<n>> lines and mapped back by number.
+TM_BATCH_SEGMENTS = int(os.environ.get("KONNECTOPS_TM_BATCH", "40"))
+TM_BATCH_CHARS = int(os.environ.get("KONNECTOPS_TM_BATCH_CHARS", "6000"))
+TM_WORKERS = int(os.environ.get("KONNECTOPS_TM_WORKERS", "4"))
+TM_RETRY_BATCH = 5
+SEGMENT_ABBREVIATIONS = ("Rs.", "No.", "Nos.", "Sq.", "Ft.", "Sqft.", "Dr.", "Mr.", "Mrs.", "Ms.", "St.", "Nr.", "Opp.", "Approx.")
+SENTENCE_GAP_RE = re.compile(r"(?<=[.!?])(\s+)(?=\S)")
+GLOSSARY_MARK_RE = re.compile(r"\[\[(\d+)\]\]")
+BATCH_LINE_RE = re.compile(r"^\s*<<(\d+)>>\s?(.*)$")
+TRAILING_PUNCT = ".!?।"
+TRANSLATION_CSV_FIELDS = {"text": ("text", "english", "source", "copy", "message", "content")}
+
+def split_segments(text: str) -> list:
+    """[(is_segment, piece)] for text; joining the pieces gives the text back. Segments are sentences within a line."""
+    out = []
+    for part in re.split(r"(\s*\n\s*)", text or ""):
+        if not part: continue
+        if not part.strip():
+            out.append((False, part))
+            continue
+        lead, body, tail = part[:len(part) - len(part.lstrip())], part.strip(), part[len(part.rstrip()):]
+        if lead: out.append((False, lead))
+        pieces = SENTENCE_GAP_RE.split(body)
+        sentence = pieces[0]
+        for gap, nxt in zip(pieces[1::2], pieces[2::2]):
+            if sentence.endswith(SEGMENT_ABBREVIATIONS):
+                sentence += gap + nxt
+            else:
+                out += [(True, sentence), (False, gap)]
+                sentence = nxt
+        out.append((True, sentence))
+        if tail: out.append((False, tail))
+    return out
+
+def glossary_pattern(terms) -> Optional[re.Pattern]:
+    terms = sorted({t.strip() for t in terms or () if t and t.strip()}, key=len, reverse=True)
+    if not terms: return None
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(t) for t in terms) + r")(?!\w)", re.IGNORECASE)
+
+def protect(segment: str, pattern: Optional[re.Pattern]):
+    """(segment with glossary terms as [[n]] markers, the terms in marker order)."""
+    if pattern is None: return segment, []
+    names = []
+    def mark(m):
+        if m.group(0) not in names: names.append(m.group(0))
+        return f"[[{names.index(m.group(0)) + 1}]]"
+    return pattern.sub(mark, segment), names
+
+def restore(masked: str, names: list) -> str:
+    return GLOSSARY_MARK_RE.sub(lambda m: names[int(m.group(1)) - 1], masked)
+
+def markers_match(source: str, target: str) -> bool:
+    return sorted(set(GLOSSARY_MARK_RE.findall(source))) == sorted(set(GLOSSARY_MARK_RE.findall(target)))
+
+def needs_translation(masked: str) -> bool:
+    return bool(re.search(r"[A-Za-z]", GLOSSARY_MARK_RE.sub("", masked)))
+
+def tm_norm(segment: str) -> str:
+    return " ".join(segment.casefold().replace("’", "'").split()).rstrip(TRAILING_PUNCT + " ")
+
+def match_punctuation(query: str, target: str) -> str:
+    """A normalized hit may differ from the query in its final punctuation; follow the query."""
+    end = query.rstrip()[-1:] if query.rstrip()[-1:] in TRAILING_PUNCT else ""
+    return target.rstrip().rstrip(TRAILING_PUNCT) + end
+
+class TranslationMemory:
+    """Segment -> Tamil pairs plus the do-not-translate glossary, in SQLite (in memory if the file can't be used)."""
+
+    def __init__(self, db_path: Optional[str]):
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "normalized_hits": 0, "misses": 0, "stores": 0}
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                self._db = self._open(db_path)
+            except Exception as e:
+                logger.warning("Translation memory file disabled (%s): %s", db_path, e)
+        if self._db is None:
+            self._db = self._open(":memory:")
+
+    @staticmethod
+    def _open(path: str):
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:": db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS segments (source TEXT PRIMARY KEY, norm TEXT NOT NULL, target TEXT NOT NULL, "
+                   "model TEXT, uses INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS segments_norm ON segments(norm)")
+        db.execute("CREATE TABLE IF NOT EXISTS glossary (term TEXT PRIMARY KEY)")
+        return db
+
+    def _select(self, sql: str, keys: list) -> list:
+        rows = []
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows += self._db.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall()
+        return rows
+
+    def lookup(self, segments) -> dict:
+        """{segment: target} for the segments the memory knows, exactly or after normalization."""
+        segments = list(dict.fromkeys(segments))
+        with self._lock:
+            try:
+                found = dict(self._select("SELECT source, target FROM segments WHERE source IN ({})", segments))
+                exact = len(found)
+                rest = {tm_norm(s): s for s in segments if s not in found}
+                by_norm = {}
+                for norm, target in self._select("SELECT norm, target FROM segments WHERE norm IN ({}) ORDER BY uses", list(rest)):
+                    by_norm[norm] = target  # most used wins
+                for norm, target in by_norm.items():
+                    found[rest[norm]] = match_punctuation(rest[norm], target)
+                if found:
+                    self._db.executemany("UPDATE segments SET uses = uses + 1 WHERE source = ?", [(s,) for s in found])
+            except sqlite3.Error as e:
+                logger.warning("Translation memory lookup failed: %s", e)
+                found, exact = {}, 0
+            self.counters["exact_hits"] += exact
+            self.counters["normalized_hits"] += len(found) - exact
+            self.counters["misses"] += len(segments) - len(found)
+        return found
+
+    def add(self, pairs: dict, model: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.executemany("INSERT INTO segments (source, norm, target, model, updated_at) VALUES (?, ?, ?, ?, ?) "
+                                     "ON CONFLICT(source) DO UPDATE SET target = excluded.target, model = excluded.model, "
+                                     "updated_at = excluded.updated_at",
+                                     [(src, tm_norm(src), tgt, model, now) for src, tgt in pairs.items()])
+                self.counters["stores"] += len(pairs)
+            except sqlite3.Error as e:
+                logger.warning("Translation memory write failed: %s", e)
+
+    def glossary(self) -> list:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT term FROM glossary ORDER BY term COLLATE NOCASE")]
+
+    def set_glossary(self, terms):
+        terms = sorted({t.strip() for t in terms if t and t.strip()})
+        with self._lock:
+            self._db.execute("DELETE FROM glossary")
+            self._db.executemany("INSERT INTO glossary (term) VALUES (?)", [(t,) for t in terms])
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counters)
+            try: out["entries"] = self._db.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            except sqlite3.Error: out["entries"] = None
+        return out
+
+@singleton
+def get_translation_memory() -> TranslationMemory:
+    return TranslationMemory(os.path.join(CACHE_DIR, "translation_memory.sqlite3") if CACHE_DIR else None)
+
+def translation_batch_prompt(segments: list) -> str:
+    lines = "\n".join(f"<<{i}>> {seg}" for i, seg in enumerate(segments, 1))
+    return ("Translate each numbered line of real estate marketing copy below to professional Tamil.\n"
+            "Reply with exactly one line per number, starting with the same <<n>> marker, and nothing else.\n"
+            "Copy markers like [[1]] unchanged; they stand for names that must stay in English.\n\n" + lines)
+
+def parse_batch_reply(reply: str) -> dict:
+    """{n: text} from '<<n>> text' lines; a line without a marker continues the previous one."""
+    out, current = {}, None
+    for line in (reply or "").splitlines():
+        m = BATCH_LINE_RE.match(line)
+        if m:
+            current = int(m.group(1))
+            out[current] = m.group(2).strip()
+        elif current is not None and line.strip() and not line.strip().startswith("```"):
+            out[current] = (out[current] + " " + line.strip()).strip()
+    return out
+
+def translation_batches(segments: list, size: int = TM_BATCH_SEGMENTS, chars: int = TM_BATCH_CHARS) -> list:
+    batches, batch, used = [], [], 0
+    for seg in segments:
+        if batch and (len(batch) >= size or used + len(seg) > chars):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(seg)
+        used += len(seg)
+    if batch: batches.append(batch)
+    return batches
+
+def translate_segments(ctx: AIContext, segments: list, workers: int = TM_WORKERS, progress=None):
+    """Masked segments -> ({segment: masked Tamil}, {segment: error}, model calls).
+
+    Batches run concurrently. Segments whose line is missing or whose [[n]] markers changed are retried
+    once in small batches. ``progress(done, total)`` runs on the calling thread.
+    """
+    done, errors, calls = {}, {}, 0
+
+    def run(batch):
+        parsed = parse_batch_reply(generate_text(ctx, translation_batch_prompt(batch)))
+        return {seg: parsed.get(i) for i, seg in enumerate(batch, 1)}
+
+    pending = list(segments)
+    for size in (TM_BATCH_SEGMENTS, TM_RETRY_BATCH):
+        retry = []
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="tm") as pool:
+            futures = {pool.submit(run, b): b for b in translation_batches(pending, size)}
+            for fut in as_completed(futures):
+                calls += 1
+                try:
+                    for seg, target in fut.result().items():
+                        if target and markers_match(seg, target):
+                            done[seg] = target
+                            errors.pop(seg, None)
+                        else:
+                            retry.append(seg)
+                            errors[seg] = "missing or altered line in the model reply"
+                except Exception as e:
+                    logger.warning("Translation batch failed: %s", e)
+                    retry += futures[fut]
+                    errors.update((seg, f"Error (AI): {e}") for seg in futures[fut])
+                if progress: progress(len(done), len(segments))
+        pending = retry
+        if not pending: break
+    return done, errors, calls
+
+def translate_texts(texts: list, ctx: AIContext, tm: Optional[TranslationMemory] = None, glossary=None,
+                    workers: int = TM_WORKERS, progress=None):
+    """Tamil for each text, reusing the translation memory; returns (translations, stats).
+
+    glossary defaults to the memory's stored terms. A segment that could not be translated is left in
+    English and counted under "failed".
+    """
+    tm = tm or get_translation_memory()
+    pattern = glossary_pattern(tm.glossary() if glossary is None else glossary)
+    docs = []
+    for text in texts:
+        docs.append([(protect(piece, pattern) if is_seg else None, piece) for is_seg, piece in split_segments(text)])
+    wanted = list(dict.fromkeys(m[0] for doc in docs for m, _ in doc if m and needs_translation(m[0])))
+    known = tm.lookup(wanted)
+    misses = [m for m in wanted if m not in known]
+    errors, calls = {}, 0
+    if misses and not ctx.model_name:
+        errors = {m: "Error: Offline (no model configured)." for m in misses}
+    elif misses:
+        fresh, errors, calls = translate_segments(ctx, misses, workers, progress)
+        tm.add(fresh, ctx.model_name)
+        known.update(fresh)
+    out = []
+    for doc in docs:
+        parts = []
+        for masked, piece in doc:
+            if masked is None or masked[0] not in known:
+                parts.append(piece)
+            else:
+                parts.append(restore(known[masked[0]], masked[1]))
+        out.append("".join(parts))
+    stats = {"texts": len(texts), "segments": sum(1 for doc in docs for m, _ in doc if m), "unique": len(wanted),
+             "from_memory": len(wanted) - len(misses), "model_segments": len(misses), "model_calls": calls,
+             "failed": len(errors), "errors": sorted(set(errors.values()))[:3]}
+    return out, stats
+
+# ---------- Deluge script library ----------
+# Every generated Deluge script is kept with the request that produced it. Requests are embedded as
+# signed, hashed word, bigram and character n-gram counts: no vocabulary, so adding a script never
+# re-weights the others. The L2-normalized vectors form a float32 matrix, so cosine top-k is one
+# matrix-vector product. On disk the store is scripts.jsonl plus vectors.f32, both append-only; the
+# vectors can always be rebuilt from the jsonl. Hashed n-grams cannot tell "won" from "lost" or "do not
+# update" from "update" (0.64-0.86 cosine), so reuse also compares content words: a negation on one side
+# only or a word swapped for a known opposite is never reused, while near-synonyms (set/update/change)
+# count as the same word. Anything rejected is still shown as a similar script.
+DELUGE_DIR = os.path.join(CACHE_DIR, "deluge_library") if CACHE_DIR else ""
+DELUGE_DIM = int(os.environ.get("KONNECTOPS_DELUGE_DIM", "1024"))
+DELUGE_MATCH_THRESHOLD = float(os.environ.get("KONNECTOPS_DELUGE_MATCH", "0.9"))  # reuse with one word swapped
+DELUGE_REWORD_THRESHOLD = float(os.environ.get("KONNECTOPS_DELUGE_REWORD_MATCH", "0.5"))  # reuse with the same words
+DELUGE_SHOW_THRESHOLD = 0.3
+DELUGE_TOP_K = 3
+DELUGE_STOPWORDS = frozenset("""a an the and or of to in on at by for from with into when whenever if then than as is are be been
+    it its this that these those should must will would can could please i we you need want write create make generate give
+    script scripts code deluge zoho crm function automation workflow""".split())
+FEATURE_WEIGHTS = {"word": 1.0, "pair": 0.7, "gram": 0.35}
+DELUGE_SYNONYMS = [("update", "set", "change", "modify", "edit"), ("create", "add", "insert"), ("delete", "remove"),
+                   ("open", "view", "read"), ("win", "won"), ("lose", "lost"), ("notify", "alert"), ("not", "no", "never", "dont")]
+DELUGE_OPPOSITES = [("win", "lose"), ("open", "bounce"), ("create", "delete"), ("enable", "disable"), ("approve", "reject"),
+                    ("accept", "reject"), ("start", "stop"), ("before", "after"), ("increase", "decrease"), ("show", "hide"),
+                    ("lock", "unlock"), ("assign", "unassign"), ("subscribe", "unsubscribe"), ("activate", "deactivate"),
+                    ("check", "uncheck"), ("first", "last"), ("min", "max"), ("true", "false"), ("incoming", "outgoing")]
+
+def stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if word.endswith("e") and len(word) > 4 else word
+
+def request_words(text: str) -> list:
+    return [stem(w) for w in re.findall(r"[a-z0-9_]+", (text or "").lower()) if w not in DELUGE_STOPWORDS]
+
+def request_features(text: str) -> dict:
+    """Weighted features of a request: stemmed words, adjacent word pairs and 4-grams of each word."""
+    words = request_words(text)
+    feats = {}
+    def add(key, weight):
+        feats[key] = feats.get(key, 0.0) + weight
+    for w in words:
+        add("w:" + w, FEATURE_WEIGHTS["word"])
+        padded = f"<{w}>"
+        for i in range(max(1, len(padded) - 3)):
+            add("g:" + padded[i:i + 4], FEATURE_WEIGHTS["gram"])
+    for a, b in zip(words, words[1:]):
+        add(f"p:{a} {b}", FEATURE_WEIGHTS["pair"])
+    return feats
+
+def request_vectors(texts, dim: int = DELUGE_DIM):
+    """(len(texts), dim) float32 matrix of L2-normalized, signed feature hashes."""
+    import numpy as np
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feat, weight in request_features(text).items():
+            h = zlib.crc32(feat.encode("utf-8"))
+            out[row, h % dim] += weight if h & 0x80000000 else -weight
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+@singleton
+def word_classes() -> tuple:
+    """({stemmed word: its synonym group's first word, "" for a stopword's}, {stemmed word: stemmed opposites})."""
+    canon = {stem(w): "" if group[0] in DELUGE_STOPWORDS else stem(group[0]) for group in DELUGE_SYNONYMS for w in group}
+    opposites = {}
+    for a, b in DELUGE_OPPOSITES:
+        opposites.setdefault(stem(a), set()).add(stem(b))
+        opposites.setdefault(stem(b), set()).add(stem(a))
+    return canon, opposites
+
+def match_words(text: str) -> set:
+    """Content words of a request with synonyms merged; any negation ("not", "don't", "never") becomes "not"."""
+    canon = word_classes()[0]
+    text = re.sub(r"n't\b", " not", (text or "").lower().replace("’", "'"))
+    return {canon.get(w, w) for w in request_words(text)} - {""}
+
+def close_match(request: str, matches: list, threshold: float = DELUGE_MATCH_THRESHOLD,
+                reword_threshold: float = DELUGE_REWORD_THRESHOLD) -> Optional[dict]:
+    """The best of matches whose script can stand in for request, or None.
+
+    From reword_threshold up the content words must be the same up to inflection, order and synonyms;
+    from threshold up one content word may be swapped for another. A negation on one side only, or a
+    word swapped for a known opposite (won/lost, opens/bounces), is never reused.
+    """
+    asked, opposites = match_words(request), word_classes()[1]
+    for m in matches:
+        if m["score"] < reword_threshold:
+            break
+        words = match_words(m["request"])
+        added, dropped = asked - words, words - asked
+        if "not" in added | dropped or any(opposites.get(w, set()) & dropped for w in added):
+            continue
+        if not added and not dropped or len(added) == len(dropped) == 1 and m["score"] >= threshold:
+            return m
+    return None
+
+class DelugeLibrary:
+    """Generated scripts with a cosine similarity index over their requests, shared by all sessions."""
+
+    def __init__(self, root: str, dim: int = DELUGE_DIM):
+        self.root, self.dim = root, dim
+        self._lock = threading.Lock()
+        self._records, self._vecs, self._size = [], None, 0
+        self._offset = 0  # bytes of scripts.jsonl already loaded
+        self.counters = {"searches": 0, "close_matches": 0, "adds": 0, "last_search_ms": 0.0}
+        self._paths = (os.path.join(root, "scripts.jsonl"), os.path.join(root, "vectors.f32")) if root else None
+        if self._paths:
+            try:
+                os.makedirs(root, exist_ok=True)
+                self._load()
+            except OSError as e:
+                logger.warning("Deluge library on disk disabled (%s): %s", root, e)
+                self._paths = None
+
+    def _grow(self, extra: int):
+        import numpy as np
+        need = self._size + extra
+        if self._vecs is None or need > len(self._vecs):
+            vecs = np.zeros((max(need, 2 * (len(self._vecs) if self._vecs is not None else 0), 256), self.dim), dtype=np.float32)
+            if self._size: vecs[:self._size] = self._vecs[:self._size]
+            self._vecs = vecs
+
+    def _append(self, records: list, vecs):
+        self._grow(len(records))
+        self._vecs[self._size:self._size + len(records)] = vecs
+        self._size += len(records)
+        self._records += records
+
+    def _load(self):
+        """Read scripts.jsonl from the last offset; reuse stored vectors, embedding any rows they lack."""
+        import numpy as np
+        records_path, vectors_path = self._paths
+        if not os.path.exists(records_path) or os.path.getsize(records_path) <= self._offset:
+            return
+        new = []
+        with open(records_path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"): break  # a writer is mid-line; pick it up next time
+                self._offset += len(line)
+                try: new.append(json.loads(line))
+                except ValueError: logger.warning("Skipping a corrupt Deluge library line")
+        if not new: return
+        first = len(self._records)
+        stored = os.path.getsize(vectors_path) // (4 * self.dim) if os.path.exists(vectors_path) else 0
+        have = max(0, min(stored, first + len(new)) - first)
+        vecs = np.empty((len(new), self.dim), dtype=np.float32)
+        if have:
+            vecs[:have] = np.fromfile(vectors_path, dtype=np.float32, count=have * self.dim,
+                                      offset=first * self.dim * 4).reshape(have, self.dim)
+        if have < len(new):
+            vecs[have:] = request_vectors([r["request"] for r in new[have:]], self.dim)
+            with open(vectors_path, "r+b" if os.path.exists(vectors_path) else "wb") as f:
+                f.truncate((first + have) * self.dim * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(vecs[have:].tobytes())
+        self._append(new, vecs)
+
+    def add(self, request: str, script: str, model: Optional[str] = None) -> dict:
+        vec = request_vectors([request], self.dim)
+        record = {"id": uuid.uuid4().hex[:12], "request": request, "script": script, "model": model, "created_at": time.time()}
+        with self._lock:
+            if self._paths:
+                try:
+                    self._load()
+                    records_path, vectors_path = self._paths
+                    with open(vectors_path, "ab") as f:
+                        f.truncate(self._size * self.dim * 4)
+                        f.write(vec.tobytes())
+                    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                    with open(records_path, "ab") as f:
+                        f.write(line)
+                    self._offset += len(line)
+                except OSError as e:
+                    logger.warning("Could not save Deluge script: %s", e)
+            self._append([record], vec)
+            self.counters["adds"] += 1
+        return record
+
+    def search(self, request: str, k: int = DELUGE_TOP_K, min_score: float = DELUGE_SHOW_THRESHOLD) -> list:
+        """Up to k stored scripts most similar to request, best first, as records with a "score"."""
+        import numpy as np
+        started = time.perf_counter()
+        q = request_vectors([request], self.dim)[0]
+        with self._lock:
+            if self._paths:
+                try: self._load()
+                except OSError as e: logger.warning("Deluge library refresh failed: %s", e)
+            if not self._size or not q.any():
+                return []
+            scores = self._vecs[:self._size] @ q
+            top = np.argpartition(-scores, min(k, self._size) - 1)[:k] if self._size > k else np.arange(self._size)
+            top = sorted(top, key=lambda i: (-scores[i], -i))  # ties: newest first
+            out = [dict(self._records[i], score=float(scores[i])) for i in top if scores[i] >= min_score]
+            self.counters["searches"] += 1
+            self.counters["close_matches"] += close_match(request, out) is not None
+            self.counters["last_search_ms"] = round(1000 * (time.perf_counter() - started), 2)
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, scripts=self._size, dim=self.dim,
+                        index_mb=round(self._size * self.dim * 4 / 1e6, 1), on_disk=bool(self._paths))
+
+@singleton
+def get_deluge_library() -> DelugeLibrary:
+    return DelugeLibrary(DELUGE_DIR)
+
+def deluge_script(ctx: AIContext, logic: str, library: Optional[DelugeLibrary] = None,
+                  threshold: float = DELUGE_MATCH_THRESHOLD, regenerate: bool = False):
+    """(script, library match or None). A close_match from the library is returned without a model call."""
+    library = library or get_deluge_library()
+    if not regenerate:
+        match = close_match(logic, library.search(logic, min_score=min(threshold, DELUGE_REWORD_THRESHOLD)), threshold)
+        if match:
+            return match["script"], match
+    require_model(ctx)
+    script = generate_text(ctx, deluge_prompt(logic), use_cache=False if regenerate else None)
+    library.add(logic, script, ctx.model_name)
+    return script, None
+
+# ---------- EMI engine ----------
+# EMIs, rate x tenure x loan grids and amortization schedules as NumPy arrays. (1+r)^n is taken as
+# exp(n*log1p(r)) so small monthly rates stay accurate; a zero rate is an exact straight line, P/n.
+EMI_GRID_MAX_CELLS = 1_000_000
+SCHEDULE_COLUMNS = ("month", "opening", "emi", "interest", "principal", "prepayment", "closing")
+YEARLY_COLUMNS = ("year", "emi", "interest", "principal", "prepayment", "closing")
+GRID_COLUMNS = ("principal", "rate", "years", "emi", "total_interest", "total_paid")
+EMI_PAID_OFF = 0.005  # balances under half a paisa are rounding noise
+
+def _check_loan(months, monthly_rate):
+    if months <= 0: raise ValueError("Tenure must be at least one month.")
+    if monthly_rate < 0: raise ValueError("Interest rate cannot be negative.")
+
+def _emi(principal: float, monthly_rate: float, months: int) -> float:
+    _check_loan(months, monthly_rate)
+    if monthly_rate == 0: return principal / months
+    return principal * monthly_rate / -math.expm1(-months * math.log1p(monthly_rate))
+
+def monthly_emi(principal: float, annual_rate_pct: float, years: float) -> float:
+    return _emi(principal, annual_rate_pct / 1200, int(round(years * 12)))
+
+def emi_array(principal, annual_rate_pct, months):
+    """Vectorized EMI; the arguments broadcast against each other like NumPy operands."""
+    import numpy as np
+    p = np.asarray(principal, dtype=float)
+    r = np.asarray(annual_rate_pct, dtype=float) / 1200
+    n = np.asarray(months, dtype=float)
+    if np.any(n <= 0): raise ValueError("Tenure must be at least one month.")
+    if np.any(r < 0): raise ValueError("Interest rate cannot be negative.")
+    denom = -np.expm1(-n * np.log1p(r))
+    return np.divide(p * r, denom, out=np.broadcast_to(p / n, np.broadcast(p, r, n).shape).copy(), where=r > 0)
+
+def emi_grid(principals, rates, years) -> dict:
+    """EMI and totals for every loan x rate x tenure, as arrays shaped (loans, rates, tenures)."""
+    import numpy as np
+    p, r, y = (np.atleast_1d(np.asarray(v, dtype=float)).ravel() for v in (principals, rates, years))
+    if p.size * r.size * y.size > EMI_GRID_MAX_CELLS:
+        raise ValueError(f"Grid has {p.size * r.size * y.size:,} scenarios; the limit is {EMI_GRID_MAX_CELLS:,}.")
+    months = np.rint(y * 12)
+    emi = emi_array(p[:, None, None], r[None, :, None], months[None, None, :])
+    total = emi * months
+    return {"principal": p, "rate": r, "years": y, "emi": emi, "total_paid": total,
+            "total_interest": total - p[:, None, None]}
+
+def grid_columns(grid: dict) -> dict:
+    """The grid in long form: one row per scenario, columns as in GRID_COLUMNS."""
+    import numpy as np
+    p, r, y = np.meshgrid(grid["principal"], grid["rate"], grid["years"], indexing="ij")
+    return {"principal": p.ravel(), "rate": r.ravel(), "years": y.ravel(), "emi": grid["emi"].ravel(),
+            "total_interest": grid["total_interest"].ravel(), "total_paid": grid["total_paid"].ravel()}
+
+def amortization_schedule(principal: float, annual_rate_pct: float, years: float, prepayments: Optional[dict] = None,
+                          step_up_pct: float = 0.0, prepay_reduces: str = "tenure") -> dict:
+    """Month-by-month schedule as arrays keyed by SCHEDULE_COLUMNS.
+
+    prepayments maps a month number (1-based, paid after that month's EMI) to a lump sum. step_up_pct
+    raises the EMI every 12 months. A prepayment shortens the loan, or with prepay_reduces="emi" lowers
+    the EMI over the remaining tenure. Between those events the balance has a closed form, so each
+    stretch of months is computed in one vectorized step.
+    """
+    import numpy as np
+    n, r = int(round(years * 12)), annual_rate_pct / 1200
+    _check_loan(n, r)
+    if principal < 0 or step_up_pct < 0: raise ValueError("Loan amount and step-up cannot be negative.")
+    if prepay_reduces not in ("tenure", "emi"): raise ValueError("prepay_reduces must be 'tenure' or 'emi'.")
+    prepay = {}
+    for m, amount in (prepayments or {}).items():
+        if 1 <= int(m) <= n and float(amount) > 0:
+            prepay[int(m)] = prepay.get(int(m), 0.0) + float(amount)
+    stops = sorted(({m for m in range(12, n, 12)} if step_up_pct else set()) | {m for m in prepay if m < n}) + [n]
+
+    emi, balance, month = _emi(principal, r, n), float(principal), 0
+    parts = []
+    for stop in stops:
+        if balance <= EMI_PAID_OFF or stop <= month:
+            continue
+        k = np.arange(1, stop - month + 1, dtype=float)
+        growth = np.exp(k * math.log1p(r))
+        closing = balance * growth - (emi * (growth - 1) / r if r else emi * k)
+        paid = np.full(k.size, emi)
+        done = np.flatnonzero(closing <= EMI_PAID_OFF)
+        if done.size:
+            closing = closing[:done[0] + 1]
+            paid = paid[:done[0] + 1]
+        opening = np.concatenate(([balance], closing[:-1]))
+        interest = opening * r
+        if done.size or stop == n:  # last instalment settles whatever is left
+            paid[-1] = opening[-1] + interest[-1]
+            closing[-1] = 0.0
+        extra = np.zeros(closing.size)
+        if stop in prepay and not done.size:
+            extra[-1] = min(prepay[stop], closing[-1])
+            closing[-1] -= extra[-1]
+        parts.append((np.arange(month + 1, month + closing.size + 1), opening, paid, interest, paid - interest, extra, closing))
+        month, balance = month + closing.size, float(closing[-1])
+        if stop in prepay and prepay_reduces == "emi" and balance > EMI_PAID_OFF:
+            emi = _emi(balance, r, n - month)
+        if step_up_pct and stop % 12 == 0:
+            emi *= 1 + step_up_pct / 100
+    if not parts:
+        return {c: np.zeros(0, dtype=int if c == "month" else float) for c in SCHEDULE_COLUMNS}
+    return {c: np.concatenate([part[i] for part in parts]) for i, c in enumerate(SCHEDULE_COLUMNS)}
+
+def schedule_totals(schedule: dict) -> dict:
+    emi = schedule["emi"]
+    return {"months": int(emi.size), "total_interest": float(schedule["interest"].sum()),
+            "total_prepaid": float(schedule["prepayment"].sum()),
+            "total_paid": float(emi.sum() + schedule["prepayment"].sum()),
+            "first_emi": float(emi[0]) if emi.size else 0.0, "last_emi": float(emi[-1]) if emi.size else 0.0}
+
+def yearly_schedule(schedule: dict) -> dict:
+    """Schedule rolled up per loan year: payments summed, closing balance at year end."""
+    import numpy as np
+    year = (schedule["month"] - 1) // 12 + 1
+    if not year.size:
+        return {c: np.zeros(0, dtype=int if c == "year" else float) for c in YEARLY_COLUMNS}
+    years, first = np.unique(year, return_index=True)
+    last = np.r_[first[1:], year.size] - 1
+    out = {"year": years}
+    for c in ("emi", "interest", "principal", "prepayment"):
+        out[c] = np.add.reduceat(schedule[c], first)
+    out["closing"] = schedule["closing"][last]
+    return out
+
+def number_list(text: str) -> list:
+    """'8.4, 8.75 9.1' or a range 'start:stop:step' (stop included) -> floats."""
+    values = []
+    for token in re.split(r"[,\s;]+", (text or "").strip()):
+        if not token: continue
+        try:
+            if ":" in token:
+                start, stop, step = (float(x) for x in token.split(":"))
+                if step <= 0: raise ValueError
+                count = int(math.floor((stop - start) / step + 1e-9)) + 1
+                values.extend(round(start + i * step, 10) for i in range(max(count, 0)))
+            else:
+                values.append(float(token.replace("_", "")))
+        except ValueError:
+            raise ValueError(f"Not a number or start:stop:step range: {token!r}") from None
+    return values
+
+def prepayment_plan(text: str = "", annual_amount: float = 0.0, months: int = 0) -> dict:
+    """Prepayments from 'month:amount' pairs plus an optional amount at every 12th month."""
+    plan = {m: float(annual_amount) for m in range(12, months + 1, 12)} if annual_amount > 0 else {}
+    for token in re.split(r"[,\s;]+", (text or "").strip()):
+        if not token: continue
+        try:
+            m, amount = token.split(":")
+            plan[int(m)] = plan.get(int(m), 0.0) + float(amount.replace("_", ""))
+        except ValueError:
+            raise ValueError(f"Prepayments are month:amount pairs, got {token!r}") from None
+    return plan
+
+def iter_csv(columns: dict, formats: Optional[dict] = None, chunk_rows: int = 5000):
+    """CSV text for equal-length column arrays, yielded a chunk of rows at a time."""
+    import numpy as np
+    names = list(columns)
+    fmt = [(formats or {}).get(c, "%.2f") for c in names]
+    yield ",".join(names) + "\n"
+    rows = len(columns[names[0]]) if names else 0
+    for start in range(0, rows, chunk_rows):
+        block = np.column_stack([np.asarray(columns[c][start:start + chunk_rows], dtype=float) for c in names])
+        buf = StringIO()
+        np.savetxt(buf, block, fmt=fmt, delimiter=",")
+        yield buf.getvalue()
+
+def xlsx_bytes(sheets: dict) -> Optional[bytes]:
+    """{sheet name: columns dict} as an Excel workbook, or None without an xlsx writer installed."""
+    if XLSX_ENGINE is None:
+        return None
+    import pandas as pd
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine=XLSX_ENGINE) as writer:
+        for name, columns in sheets.items():
+            pd.DataFrame(columns).to_excel(writer, sheet_name=name[:31], index=False)
+    return buf.getvalue()
+
+# ---------- CLI ----------
+# One JSON object per input line: {"id": ..., "type": <JOB_TYPES key>, ...fields}. One result per
+# output line: {"id", "type", "ok", "result" | "error", "seconds"}. At most 2 x workers jobs are
+# held in memory, so job files of any size stream through.
+def require_model(ctx: "AIContext"):
+    if not ctx.model_name: raise RuntimeError("Offline (no model configured).")
+
+def job_text(ctx, job):
+    require_model(ctx)
+    return generate_text(ctx, job["prompt"])
+
+def job_content(ctx, job):
+    require_model(ctx)
+    return generate_text(ctx, content_prompt(job.get("content_type", CONTENT_TYPES[0]), job["topic"]))
+
+def job_image_prompt(ctx, job):
+    require_model(ctx)
+    return generate_text(ctx, image_concept_prompt(job["concept"], job.get("style", IMAGE_STYLES[0])))
+
+def job_cover_prompt(ctx, job):
+    return cover_image_prompt(job["project"], job.get("location", ""), job.get("usps", ""))
+
+def job_translate(ctx, job):
+    """text -> Tamil string, or texts -> list; segments come from the translation memory where possible."""
+    texts = [job["text"]] if "texts" not in job else list(job["texts"])
+    out, stats = translate_texts(texts, ctx, glossary=job.get("glossary"))
+    if stats["failed"]: raise RuntimeError(f"{stats['failed']} segments not translated: {'; '.join(stats['errors'])}")
+    return out if "texts" in job else out[0]
+
+def job_deluge(ctx, job):
+    """logic -> script; a close match from the script library is reused unless regenerate is set."""
+    script, match = deluge_script(ctx, job["logic"], regenerate=bool(job.get("regenerate")))
+    return {"script": script, "from_library": match is not None,
+            "similar_request": match["request"] if match else None, "score": round(match["score"], 3) if match else None}
+
+def job_landing(ctx, job):
+    res = render_landing(job["template"], ctx, job.get("project", ""), job.get("location", ""), job.get("price", ""),
+                         job.get("old_name", ""), job.get("extra"))
+    return {"html": res.text, "missing": res.missing, "unused": res.unused}
+
+def job_blog(ctx, job):
+    require_model(ctx)
+    markdown, errors = generate_blog({k: str(v) for k, v in job.items() if k in BLOG_FIELDS}, ctx,
+                                     int(job.get("section_workers", BLOG_SECTION_WORKERS)))
+    return {"markdown": markdown, "section_errors": errors}
+
+def job_whatsapp(ctx, job):
+    return whatsapp_link(str(job["phone"]), job.get("message", ""))
+
+def job_whatsapp_bulk(ctx, job):
+    """csv -> output (links) and rejected (default: <output>_rejected.csv) files."""
+    rejected_path = job.get("rejected") or os.path.splitext(job["output"])[0] + "_rejected.csv"
+    with open(job["csv"], "rb") as src, open(job["output"], "w", encoding="utf-8", newline="") as out, \
+            open(rejected_path, "w", encoding="utf-8", newline="") as rejected:
+        stats = build_whatsapp_links(src, job.get("template") or WHATSAPP_TEMPLATE, out, rejected,
+                                     str(job.get("country_code", WHATSAPP_COUNTRY_CODE)), job.get("project", ""),
+                                     job.get("blank_name", ""))
+    return dict(stats, output=job["output"], rejected_file=rejected_path)
+
+def job_emi(ctx, job):
+    return {"emi": round(monthly_emi(float(job["principal"]), float(job["rate"]), float(job["years"])), 2)}
+
+def job_emi_grid(ctx, job):
+    """principal, rate and years may each be a number, a list or a number_list() string."""
+    import numpy as np
+    axes = [number_list(v) if isinstance(v, str) else v for v in (job["principal"], job["rate"], job["years"])]
+    grid = emi_grid(*axes)
+    return {k: np.round(v, 2).tolist() for k, v in grid.items()}
+
+def job_amortization(ctx, job):
+    """prepayments is {month: amount} or a prepayment_plan() string; annual_prepayment adds one every 12 months."""
+    import numpy as np
+    years = float(job["years"])
+    prepay = job.get("prepayments") or ""
+    if isinstance(prepay, dict):
+        prepay = " ".join(f"{m}:{a}" for m, a in prepay.items())
+    plan = prepayment_plan(prepay, float(job.get("annual_prepayment", 0)), int(round(years * 12)))
+    schedule = amortization_schedule(float(job["principal"]), float(job["rate"]), years, plan,
+                                     float(job.get("step_up_pct", 0)), job.get("prepay_reduces", "tenure"))
+    out = {k: round(v, 2) for k, v in schedule_totals(schedule).items()}
+    if job.get("schedule"):
+        out["schedule"] = {k: np.round(v, 2).tolist() for k, v in schedule.items()}
+    return out
+
+JOB_TYPES = {"text": job_text, "content": job_content, "image_prompt": job_image_prompt, "cover_prompt": job_cover_prompt,
+             "translate": job_translate, "deluge": job_deluge, "landing": job_landing, "blog": job_blog,
+             "whatsapp": job_whatsapp, "whatsapp_bulk": job_whatsapp_bulk, "emi": job_emi, "emi_grid": job_emi_grid,
+             "amortization": job_amortization}
+# Required fields per job type; a tuple means any one of those fields.
+JOB_FIELDS = {"text": ("prompt",), "content": ("topic",), "image_prompt": ("concept",), "cover_prompt": ("project",),
+              "translate": (("text", "texts"),), "deluge": ("logic",), "landing": ("template",), "blog": ("project",),
+              "whatsapp": ("phone",), "whatsapp_bulk": ("csv", "output"), "emi": ("principal", "rate", "years"),
+              "emi_grid": ("principal", "rate", "years"), "amortization": ("principal", "rate", "years")}
+LOCAL_JOB_TYPES = {"cover_prompt", "whatsapp", "emi", "emi_grid", "amortization"}  # never call the model: their time is pure overhead
+
+def missing_fields(job: dict) -> list:
+    missing = []
+    for field in JOB_FIELDS.get(job.get("type"), ()):
+        options = field if isinstance(field, tuple) else (field,)
+        if all(job.get(f) is None for f in options):
+            missing.append(" or ".join(options))
+    return missing
+
+def run_job(ctx: "AIContext", seq: int, line: str) -> dict:
+    started = time.perf_counter()
+    out = {"id": seq, "type": None}
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict): raise ValueError("job must be a JSON object")
+        out.update(id=job.get("id", seq), type=job.get("type"))
+        handler = JOB_TYPES.get(job.get("type"))
+        if handler is None: raise ValueError(f"unknown job type {job.get('type')!r}; expected one of {', '.join(JOB_TYPES)}")
+        missing = missing_fields(job)
+        if missing: raise ValueError(f"missing field{'s' if len(missing) > 1 else ''}: {', '.join(missing)}")
+        out.update(ok=True, result=handler(ctx, job))
+    except Exception as e:
+        out.update(ok=False, error=f"{type(e).__name__}: {e}")
+    out["seconds"] = round(time.perf_counter() - started, 6)
+    return out
+
+def run_jobs(lines, ctx: "AIContext", workers: int = 4, ordered: bool = False):
+    """Run JSONL job lines on a thread pool, yielding result dicts as they finish (or in input order)."""
+    window = max(1, workers) * 2
+    pending, ready, next_out = {}, {}, 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job") as pool:
+        def drain(block: bool):
+            nonlocal next_out
+            done, _ = wait(list(pending), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for fut in done:
+                ready[pending.pop(fut)] = fut.result()
+            if not ordered:
+                for seq in sorted(ready): yield ready.pop(seq)
+            while next_out in ready:
+                yield ready.pop(next_out)
+                next_out += 1
+
+        seq = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            pending[pool.submit(run_job, ctx, seq, line)] = seq
+            seq += 1
+            while len(pending) + len(ready) >= window:
+                yield from drain(block=True)
+        while pending:
+            yield from drain(block=True)
+        for s in sorted(ready): yield ready.pop(s)
+
+def headless_context(api_key: str = "", model_name: Optional[str] = None, use_cache: bool = True,
+                     metrics: Optional["Metrics"] = None) -> "AIContext":
+    """AIContext outside Streamlit; the model defaults to the key's first generate-capable model."""
+    registry = get_model_registry()
+    if api_key and not model_name:
+        model_name = registry.default_model(api_key)
+    return AIContext(model_name, api_key, get_response_cache(), registry, use_cache, get_ai_scheduler(),
+                     metrics or Metrics([get_metrics_registry()], get_metrics_log()))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run KonnectOps generator jobs from JSONL. Job types: " + ", ".join(JOB_TYPES))
+    parser.add_argument("jobs", help="JSONL job file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=4, help="jobs run concurrently")
+    parser.add_argument("--api-key", default=os.environ.get("KONNECTOPS_API_KEY") or os.environ.get("GOOGLE_API_KEY", ""))
+    parser.add_argument("--model", help="model name (default: first available for the key)")
+    parser.add_argument("--no-cache", action="store_true", help="skip the response cache lookup")
+    parser.add_argument("--ordered", action="store_true", help="write results in input order")
+    parser.add_argument("--stats", action="store_true", help="print import time and the mean time of jobs that make no model call to stderr")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    try:
+        ctx = headless_context(args.api_key, args.model, not args.no_cache)
+    except Exception as e:
+        print(f"Model discovery failed: {e}", file=sys.stderr)
+        return 2
+    src = sys.stdin if args.jobs == "-" else open(args.jobs, encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started = time.perf_counter()
+    count = failed = 0
+    local_seconds, local_count = 0.0, 0
+    try:
+        for result in run_jobs(src, ctx, args.workers, args.ordered):
+            dst.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            count += 1
+            failed += not result.get("ok")
+            if result.get("type") in LOCAL_JOB_TYPES:
+                local_seconds += result["seconds"]
+                local_count += 1
+    finally:
+        if src is not sys.stdin: src.close()
+        if dst is not sys.stdout: dst.close()
+    wall = time.perf_counter() - started
+    if args.stats:
+        stats = {"import_ms": round(IMPORT_SECONDS * 1000, 1), "jobs": count, "failed": failed, "wall_seconds": round(wall, 3),
+                 "jobs_per_second": round(count / wall, 1) if wall else None,
+                 "local_jobs": local_count,
+                 "overhead_ms_per_job": round(1000 * local_seconds / local_count, 3) if local_count else None}
+        print(json.dumps(stats), file=sys.stderr)
+    return 1 if failed else 0
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Cover image renditions for KonnectOps.
+
+Kept out of konnect_ops.py so it can run in worker processes: it imports only Pillow, and its
+functions are picklable by reference. Each source is decoded once and every rendition is cut
+from that decoded image.
+"""
+
+import time
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# name -> (width, height, mode): "crop" fills the box exactly, "fit" keeps the aspect ratio inside it.
+RENDITIONS = {
+    "og": (1200, 628, "crop"),       # Open Graph / social cover, what the image prompt asks for
+    "hero": (1600, 900, "fit"),      # blog hero
+    "preview": (720, 377, "crop"),   # shown in the app
+    "thumb": (320, 168, "crop"),     # listings
+}
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+MAX_SOURCE_PIXELS = 60_000_000
+
+
+def _encode(im, fmt: str) -> bytes:
+    out = BytesIO()
+    if fmt == "jpeg":
+        im.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        im.save(out, format="WEBP", quality=WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def decode(img_bytes: bytes):
+    """Open, orient and convert to RGB. Large JPEGs are decoded at a reduced DCT scale."""
+    im = Image.open(BytesIO(img_bytes))
+    if im.width * im.height > MAX_SOURCE_PIXELS:
+        raise ValueError(f"Image too large: {im.width}x{im.height}")
+    source = {"width": im.width, "height": im.height, "format": im.format}
+    longest = max(w for w, _, _ in RENDITIONS.values())
+    im.draft("RGB", (longest, longest))  # no-op for non-JPEG sources
+    im = ImageOps.exif_transpose(im)
+    if im.mode in ("RGBA", "LA", "P"):
+        rgba = im.convert("RGBA")
+        im = Image.new("RGB", rgba.size, (255, 255, 255))
+        im.paste(rgba, mask=rgba.getchannel("A"))
+    else:
+        im = im.convert("RGB")
+    return im, source
+
+
+def render_renditions(img_bytes: bytes, renditions: dict = RENDITIONS) -> dict:
+    """Decode once and encode every rendition as progressive JPEG and WebP.
+
+    Returns {"source": {...}, "renditions": {name: {"size": (w, h), "jpeg": bytes, "webp": bytes|None}},
+    "seconds": float}. WebP is None when Pillow was built without it.
+    """
+    started = time.perf_counter()
+    im, source = decode(img_bytes)
+    out = {}
+    for name, (width, height, mode) in renditions.items():
+        if mode == "crop":
+            resized = ImageOps.fit(im, (width, height), Image.LANCZOS)
+        else:
+            resized = im.copy()
+            resized.thumbnail((width, height), Image.LANCZOS)
+        entry = {"size": resized.size, "jpeg": _encode(resized, "jpeg"), "webp": None}
+        try:
+            entry["webp"] = _encode(resized, "webp")
+        except (OSError, KeyError):
+            pass
+        out[name] = entry
+    return {"source": source, "renditions": out, "seconds": time.perf_counter() - started}
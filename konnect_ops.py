@@ -6,40 +6,67 @@ Ready to upload to GitHub and deploy on Streamlit Cloud.
 Notes:
 - Paste your Google Generative AI key in the sidebar (kept only for the session).
 - Optional: install boto3 / google-cloud-storage if you need S3 / GCS uploads.
+- This file is the UI only; the generators live in konnect_core.py, which also runs without Streamlit.
 - Tested for Streamlit 1.##+ and python 3.10+.
 """
 
+# Streamlit runs this file as __main__, and spawned worker processes (cover renditions) re-import __main__
+# from its file, which would run the whole app in them. A spec named __main__ makes multiprocessing skip it.
+import importlib.machinery
+__spec__ = importlib.machinery.ModuleSpec("__main__", None)
+
 import streamlit as st
-import google.generativeai as genai
 import pandas as pd
+import numpy as np
 import time
+import os
+import json
+import hashlib
 import logging
-from functools import lru_cache
-from urllib.parse import quote_plus
+import tempfile
+import threading
+import zipfile
+import cProfile
+import pstats
+import uuid
+import weakref
+from functools import wraps
 import streamlit.components.v1 as components
 import base64
-from io import BytesIO
+from io import BytesIO, StringIO
 from typing import Optional
 
-# Optional cloud libs (import only if available)
-try:
-    import boto3
-    from botocore.exceptions import BotoCoreError, ClientError
-    BOTO3_AVAILABLE = True
-except Exception:
-    BOTO3_AVAILABLE = False
+from konnect_core import (
+    BOTO3_AVAILABLE, GCS_AVAILABLE, PIL_AVAILABLE, BG_EXTENSIONS, prune_backgrounds, LANDING_BATCH_WORKERS, LOCAL_BUCKET_DIR,
+    CONTENT_TYPES, IMAGE_STYLES, FESTIVALS_2026, METRICS_LOG_PATH,
+    AIContext, Metrics, MetricsRegistry, UploadItem,
+    get_model_registry, get_response_cache, get_metrics_registry, get_metrics_log, get_ai_scheduler,
+    get_blob_store, get_cover_pipeline, generate_text, stream_text,
+    compile_template, landing_values, landing_desc_prompt, read_landing_rows, build_landing_zip, unique_file_name,
+    blog_jobs, run_blog_sections, assemble_blog, read_blog_projects, cover_image_prompt,
+    content_prompt, image_concept_prompt, deluge_prompt, whatsapp_link, monthly_emi,
+    emi_grid, grid_columns, amortization_schedule, schedule_totals, yearly_schedule, number_list, prepayment_plan,
+    iter_csv, xlsx_bytes, XLSX_ENGINE, build_whatsapp_links, WHATSAPP_TEMPLATE, WHATSAPP_COUNTRY_CODE,
+    translate_texts, get_translation_memory, TRANSLATION_CSV_FIELDS, csv_header_map,
+    get_deluge_library, close_match,
+    recompress_background, generate_cover_image_via_genai, detect_content_type, extension_for,
+    upload_to_s3, upload_to_gcs, upload_to_local, upload_batch, UPLOAD_MULTIPART_THRESHOLD,
+)
 
+# Streamlit internals used to release uploader buffers and detect closed sessions (best-effort)
 try:
-    from google.cloud import storage as gcs_storage
-    from google.oauth2 import service_account
-    GCS_AVAILABLE = True
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
 except Exception:
-    GCS_AVAILABLE = False
+    Runtime = None
+    get_script_run_ctx = None
 
 # ---------- Logging ----------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("konnectops")
 
+RERUN_STARTED = time.perf_counter()
+
 # ---------- Page config ----------
 st.set_page_config(page_title="KonnectOps Mobile", page_icon="🏢", layout="wide", initial_sidebar_state="expanded")
 
@@ -75,121 +102,347 @@ if "s3_access_key" not in st.session_state: st.session_state.s3_access_key = ""
 if "s3_secret_key" not in st.session_state: st.session_state.s3_secret_key = ""
 if "s3_region" not in st.session_state: st.session_state.s3_region = ""
 if "gcs_credentials_json" not in st.session_state: st.session_state.gcs_credentials_json = ""
+if "ai_cache_enabled" not in st.session_state: st.session_state.ai_cache_enabled = True
+if "profile_reruns" not in st.session_state: st.session_state.profile_reruns = False
 
-# ---------- Model helpers ----------
-@lru_cache(maxsize=1)
-def fetch_models_for_key(key: str):
-    genai.configure(api_key=key)
-    return list(genai.list_models() or [])
-
-def safe_name(obj):
-    try: return getattr(obj, "name", None) or (obj.get("name") if isinstance(obj, dict) else None)
-    except: return None
-
-def supports_gen(obj):
+# A rerun interrupted by st.rerun() never reaches finish_rerun(), so drop its profiler first.
+if st.session_state.get("_rerun_profiler") is not None:
+    st.session_state.pop("_rerun_profiler").disable()
+if st.session_state.profile_reruns:
     try:
-        methods = getattr(obj, "supported_generation_methods", None)
-        if methods is None and isinstance(obj, dict): methods = obj.get("supported_generation_methods")
-        return methods and ("generateContent" in methods or "generate" in methods)
-    except:
-        return False
+        profiler = cProfile.Profile()
+        profiler.enable()
+        st.session_state["_rerun_profiler"] = profiler
+    except ValueError as e:  # another profiler is already active on this thread
+        logger.warning("Rerun profiler not started: %s", e)
 
+# ---------- Model helpers ----------
 def try_connect(key: str) -> Optional[str]:
     if not key: return None
+    registry = get_model_registry()
     try:
-        models = fetch_models_for_key(key)
+        with current_metrics().timer("connect"):
+            index = registry.discover(key)
     except Exception as e:
         logger.exception("Model fetch failed: %s", e)
         return None
-    for m in models:
-        if supports_gen(m):
-            nm = safe_name(m)
-            if nm:
-                st.session_state.available_models = [safe_name(x) for x in models if safe_name(x)]
-                return nm
-    if models:
-        nm = safe_name(models[0])
-        st.session_state.available_models = [safe_name(x) for x in models if safe_name(x)]
-        return nm
-    return None
-
-def ask_ai(prompt: str) -> str:
-    if not st.session_state.get("model_name"): return "Error: Offline (no model configured)."
+    st.session_state.available_models = list(index)
+    return registry.default_model(key)
+
+# ---------- Metrics ----------
+PROFILE_TOP_N = 25
+
+def session_metrics_registry() -> MetricsRegistry:
+    if "_metrics" not in st.session_state: st.session_state["_metrics"] = MetricsRegistry()
+    return st.session_state["_metrics"]
+
+def current_metrics() -> Metrics:
+    return Metrics([get_metrics_registry(), session_metrics_registry()], get_metrics_log())
+
+def finish_rerun():
+    """Record the full-script rerun time and collect the profile, if one is running."""
+    current_metrics().observe("rerun_seconds", time.perf_counter() - RERUN_STARTED)
+    profiler = st.session_state.pop("_rerun_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        out = StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        st.session_state["_last_profile"] = out.getvalue()
+
+def timed_fragment(func):
+    """st.fragment that also records each (partial) rerun as fragment_seconds{fragment=...}."""
+    @wraps(func)
+    def run(*args, **kwargs):
+        with current_metrics().timer("fragment", fragment=func.__name__):
+            return func(*args, **kwargs)
+    return fragment(run)
+
+# ---------- AI calls ----------
+def ai_context() -> AIContext:
+    return AIContext(st.session_state.get("model_name"), st.session_state.get("api_key", ""), get_response_cache(),
+                     get_model_registry(), st.session_state.get("ai_cache_enabled", True), get_ai_scheduler(),
+                     current_metrics())
+
+def ask_ai(prompt: str, use_cache: Optional[bool] = None, generation_config: Optional[dict] = None) -> str:
+    """Run one prompt through the connected model.
+
+    ``use_cache=False`` bypasses the cache lookup for this call; the fresh answer
+    still replaces the cached one. ``None`` follows the sidebar setting.
+    """
+    ctx = ai_context()
+    if not ctx.model_name: return "Error: Offline (no model configured)."
     try:
-        model = genai.GenerativeModel(st.session_state.model_name)
-        res = model.generate_content(prompt)
-        text = getattr(res, "text", None) or (res.get("text") if isinstance(res, dict) else str(res))
-        return text
+        return generate_text(ctx, prompt, generation_config, use_cache)
     except Exception as e:
         st.session_state.last_ai_error = str(e)
         logger.exception("AI error: %s", e)
         return f"Error (AI): {e}"
 
-# ---------- Image generation stub (best-effort) ----------
-def generate_cover_image_via_genai(prompt: str, size: str = "1200x628") -> Optional[bytes]:
+def ask_ai_stream(prompt: str, use_cache: Optional[bool] = None, generation_config: Optional[dict] = None):
+    """Streaming variant of ask_ai: yields text chunks as the model produces them.
+
+    Follows the same error contract; on failure the last chunk is "Error (AI): ...".
+    A cached answer is yielded as a single chunk.
+    """
+    ctx = ai_context()
+    if not ctx.model_name:
+        yield "Error: Offline (no model configured)."
+        return
     try:
-        if hasattr(genai, "images") and hasattr(genai.images, "generate"):
-            resp = genai.images.generate(model="image-alpha-001", prompt=prompt, size=size)
-            b64 = None
-            if hasattr(resp, "data"):
-                item = resp.data[0]
-                b64 = getattr(item, "b64_json", None) or (item.get("b64_json") if isinstance(item, dict) else None)
-            elif isinstance(resp, list) and resp:
-                item = resp[0]
-                b64 = getattr(item, "b64_json", None) or (item.get("b64_json") if isinstance(item, dict) else None)
-            else:
-                b64 = getattr(resp, "b64_json", None) or (resp.get("b64_json") if isinstance(resp, dict) else None)
-            if b64:
-                return base64.b64decode(b64)
-            return None
-        return None
+        yield from stream_text(ctx, prompt, generation_config, use_cache)
     except Exception as e:
-        logger.warning("Image generation via genai failed: %s", e)
+        st.session_state.last_ai_error = str(e)
+        logger.exception("AI error: %s", e)
+        yield f"Error (AI): {e}"
+
+def stream_ai_to(placeholder, prompt: str, language: str = "text", refresh_seconds: float = 0.15) -> str:
+    """Render ask_ai_stream into a placeholder as chunks arrive; returns the full text."""
+    text = ""
+    last_paint = 0.0
+    for chunk in ask_ai_stream(prompt):
+        if chunk.lower().startswith("error"):
+            placeholder.error(chunk)
+            return chunk
+        text += chunk
+        now = time.monotonic()
+        if now - last_paint >= refresh_seconds:
+            placeholder.code(text, language=language)
+            last_paint = now
+    placeholder.code(text, language=language)
+    return text
+
+# ---------- Session blobs ----------
+class BlobLease:
+    """Kept in session state; when Streamlit disposes of the session, the finalizer releases its blobs."""
+    __slots__ = ("session", "__weakref__")
+
+    def __init__(self, session: str):
+        self.session = session
+
+def blob_session() -> str:
+    """This session's owner id in the blob store (the Streamlit session id when available)."""
+    lease = st.session_state.get("_blob_lease")
+    store = get_blob_store()
+    if lease is None:
+        ctx = get_script_run_ctx() if get_script_run_ctx else None
+        lease = BlobLease(getattr(ctx, "session_id", None) or uuid.uuid4().hex)
+        weakref.finalize(lease, store.release_session, lease.session)
+        st.session_state["_blob_lease"] = lease
+    store.touch(lease.session)
+    return lease.session
+
+def server_session():
+    """(runtime, session id) of the script run, or None outside a live server (bare mode, tests, teardown)."""
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+    if Runtime is None or ctx is None or not getattr(ctx, "session_id", None) or not Runtime.exists():
+        return None
+    try:
+        return Runtime.instance(), ctx.session_id
+    except RuntimeError:  # the runtime went away between the two calls
+        return None
+
+def sweep_blob_sessions():
+    """Release blobs of sessions the server has closed or that have been idle too long."""
+    server = server_session()
+    if server is None:
+        return
+    get_blob_store().sweep(is_active=server[0].is_active_session)
+
+def upload_key(name: str) -> str:
+    """Widget key for a file_uploader; forget_upload() moves it on so the widget comes back empty."""
+    return f"{name}_{st.session_state.get('_upload_gen', {}).get(name, 0)}"
+
+def forget_upload(name: str, *uploaded):
+    """Drop Streamlit's buffered copies of uploads whose bytes have been consumed."""
+    gens = st.session_state.setdefault("_upload_gen", {})
+    gens[name] = gens.get(name, 0) + 1
+    server = server_session()
+    if server is None:
+        return
+    runtime, session_id = server
+    for f in uploaded:
+        file_id = getattr(f, "file_id", None)
+        try: runtime.uploaded_file_mgr.remove_file(session_id, file_id)
+        except Exception as e: logger.debug("Could not release upload %s: %s", file_id, e)
+
+# ---------- Background images ----------
+# Backgrounds are recompressed once and written under ./static (served by Streamlit at app/static/...
+# when server.enableStaticServing is on), so each rerun only ships a short URL per tab. Files are named
+# by the hash of the uploaded bytes; each new file prunes the directory to the most recently used ones.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BG_DIR = os.path.join(STATIC_DIR, "bg")
+BG_URL_PREFIX = "app/static/bg"
+
+def store_background(img_bytes: bytes, mime: str) -> str:
+    """Content-address an uploaded background and return the URL to use in CSS.
+
+    The same source bytes always map to the same file, so a re-upload only marks it as recently used.
+    Falls back to a (recompressed) data URL when static serving is disabled.
+    """
+    digest = hashlib.sha256(img_bytes).hexdigest()[:32]
+    static_ok = bool(st.get_option("server.enableStaticServing"))
+    if static_ok:
+        for ext in BG_EXTENSIONS.values():
+            try:
+                os.utime(os.path.join(BG_DIR, f"{digest}.{ext}"))  # marks it used for pruning
+                return f"{BG_URL_PREFIX}/{digest}.{ext}"
+            except FileNotFoundError:
+                continue
+    data, out_mime = img_bytes, mime
+    if PIL_AVAILABLE:
+        try: data, out_mime = recompress_background(img_bytes)
+        except Exception as e: logger.warning("Background recompression failed, keeping original: %s", e)
+    if not static_ok:
+        return f"data:{out_mime};base64,{base64.b64encode(data).decode()}"
+    name = f"{digest}.{BG_EXTENSIONS.get(out_mime, 'jpg')}"
+    os.makedirs(BG_DIR, exist_ok=True)
+    tmp = os.path.join(BG_DIR, f".{name}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as fh: fh.write(data)
+    os.replace(tmp, os.path.join(BG_DIR, name))
+    prune_backgrounds(BG_DIR)
+    return f"{BG_URL_PREFIX}/{name}"
+
+def set_background(tab: str, url: str):
+    """Remember a tab's background. Data URLs go to the blob store; the session keeps a blob: handle."""
+    store, session = get_blob_store(), blob_session()
+    if url.startswith("data:"):
+        url = "blob:" + store.put(session, url.encode("ascii"), "text/uri-list")
+    old = st.session_state.bg_images.get(tab, "")
+    if old.startswith("blob:") and old != url and old not in [v for k, v in st.session_state.bg_images.items() if k != tab]:
+        store.release(session, old[5:])
+    st.session_state.bg_images[tab] = url
+
+def background_url(tab: str) -> str:
+    url = st.session_state.bg_images.get(tab, "")
+    if url.startswith("blob:"):
+        data = get_blob_store().get(url[5:])
+        return str(data, "ascii") if data is not None else ""
+    if url.startswith(BG_URL_PREFIX + "/") and not os.path.exists(os.path.join(BG_DIR, url[len(BG_URL_PREFIX) + 1:])):
+        st.session_state.bg_images.pop(tab, None)  # pruned while this session was idle
+        return ""
+    return url
+
+# ---------- Cover image pipeline ----------
+# Renditions come from the shared CoverPipeline (konnect_core). The app shows the small preview;
+# downloads and uploads pick the size they need.
+COVER_POLL_SECONDS = 1.0
+COVER_FILES = {"OG cover 1200x628 (JPEG)": ("og", "jpeg"), "OG cover 1200x628 (WebP)": ("og", "webp"),
+               "Blog hero (JPEG)": ("hero", "jpeg"), "Blog hero (WebP)": ("hero", "webp"),
+               "Thumbnail (WebP)": ("thumb", "webp"), "Original upload": None}
+
+def set_cover(img_bytes: bytes, source: str):
+    """Make img_bytes the session's cover and start its renditions in the background."""
+    store, session = get_blob_store(), blob_session()
+    digest = store.put(session, img_bytes, detect_content_type(img_bytes))
+    old = st.session_state.get("_last_cover_blob")
+    if old and old != digest: store.release(session, old)
+    st.session_state["_last_cover_blob"] = digest
+    st.session_state["_last_cover_source"] = source
+    if PIL_AVAILABLE: get_cover_pipeline().future(digest, img_bytes)
+
+def cover_bytes():
+    """The current cover's bytes (possibly an mmap of a spilled blob), or None."""
+    digest = st.session_state.get("_last_cover_blob")
+    data = get_blob_store().get(digest)
+    if digest and data is None:  # the store was reset (e.g. cache cleared); the handle is dangling
+        st.session_state.pop("_last_cover_blob", None)
+    return data
+
+def cover_renditions() -> Optional[dict]:
+    """Renditions of the current cover once the worker has made them; None while pending, without Pillow or on failure.
+
+    Never blocks the script: while the worker runs, the caller shows the original and cover_watch reruns
+    the app when the renditions are ready.
+    """
+    digest = st.session_state.get("_last_cover_blob")
+    if not PIL_AVAILABLE or not digest:
+        return None
+    pipeline = get_cover_pipeline()
+    fut = pipeline.future(digest, cover_bytes)
+    if not fut.done():
+        st.caption("Preparing cover image sizes… the original is shown until they are ready.")
+        cover_watch(digest)
         return None
+    return pipeline.result(fut)
+
+def cover_file_options(rend: Optional[dict]) -> list:
+    if not rend:
+        return ["Original upload"]
+    return [label for label, spec in COVER_FILES.items()
+            if spec is None or rend["renditions"].get(spec[0], {}).get(spec[1])]
+
+def cover_file(rend: Optional[dict], label: str):
+    """(bytes, content type, file suffix) for one of COVER_FILES."""
+    spec = COVER_FILES.get(label) if rend else None
+    if spec is None:
+        data = bytes(cover_bytes())
+        ctype = detect_content_type(data)
+        return data, ctype, extension_for(ctype)
+    name, fmt = spec
+    ctype = f"image/{fmt}"
+    return rend["renditions"][name][fmt], ctype, f"_{name}{extension_for(ctype)}"
+
+def cover_preview(rend: Optional[dict]) -> bytes:
+    if not rend:
+        return bytes(cover_bytes())
+    preview = rend["renditions"]["preview"]
+    return preview["webp"] or preview["jpeg"]
+
+# ---------- Fragments ----------
+# Each tab and the sidebar settings run as a fragment: a widget interaction reruns only its own
+# fragment. Anything that changes what other fragments show (key, backgrounds, cover image)
+# asks for a full app rerun. Streamlit < 1.33 has no fragments and simply runs everything.
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+def polling_fragment(seconds: float):
+    """Decorator for a fragment that reruns itself every ``seconds`` (a plain function without fragments)."""
+    api = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    return (lambda func: api(func, run_every=seconds)) if api else (lambda func: func)
+
+def rerun_app():
+    if hasattr(st, "rerun"):
+        try: st.rerun(scope="app")
+        except TypeError: st.rerun()
+    else:
+        st.experimental_rerun()
+
+@polling_fragment(COVER_POLL_SECONDS)
+def cover_watch(digest: str):
+    """Shown while the cover worker runs; reruns the app once the renditions are ready."""
+    if digest == st.session_state.get("_last_cover_blob") and get_cover_pipeline().future(digest, cover_bytes).done():
+        rerun_app()
 
-# ---------- Cloud upload helpers ----------
-def upload_to_s3(bytes_data: bytes, bucket: str, object_name: str, region: str, access_key: str, secret_key: str) -> str:
-    if not BOTO3_AVAILABLE:
-        raise RuntimeError("boto3 not available; install boto3 to use S3 uploads.")
-    s3 = boto3.client("s3", region_name=region, aws_access_key_id=access_key, aws_secret_access_key=secret_key)
-    s3.put_object(Bucket=bucket, Key=object_name, Body=bytes_data, ACL="public-read", ContentType="image/jpeg")
-    return f"https://{bucket}.s3.{region}.amazonaws.com/{object_name}"
-
-def upload_to_gcs(bytes_data: bytes, bucket_name: str, object_name: str, credentials_json: dict) -> str:
-    if not GCS_AVAILABLE:
-        raise RuntimeError("google-cloud-storage not available; install google-cloud-storage to use GCS uploads.")
-    credentials = service_account.Credentials.from_service_account_info(credentials_json)
-    client = gcs_storage.Client(credentials=credentials, project=credentials.project_id)
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(object_name)
-    blob.upload_from_string(bytes_data, content_type="image/jpeg")
-    blob.make_public()
-    return blob.public_url
+TAB_LAYOUT = [("Landing", "📄 Landing"), ("Content", "✍️ Content"), ("Images", "🎨 Images"), ("Calendar", "📅 Calendar"),
+              ("Utilities", "🛠️ Utilities"), ("Blog", "📝 Blog"), ("Uploads", "☁️ Uploads"), ("Zoho", "👨‍💻 Zoho")]
 
 # ---------- Sidebar ----------
-with st.sidebar:
+@timed_fragment
+def sidebar_settings():
     st.header("⚙️ Settings")
     st.caption("Paste your Generative AI key (kept only for this session).")
     api_key_in = st.text_input("Generative AI Key", type="password", value=st.session_state.api_key)
     if api_key_in and api_key_in != st.session_state.api_key:
+        if st.session_state.api_key: get_model_registry().invalidate(st.session_state.api_key)
         st.session_state.api_key = api_key_in
-        try:
-            fetch_models_for_key.cache_clear()
-        except: pass
+        rerun_app()
 
     st.markdown("---")
     st.subheader("Page backgrounds")
     st.write("Upload a background image per tab (1200×700 recommended).")
-    tab_names = ["Landing", "Content", "Images", "Calendar", "Utilities", "Blog", "Uploads", "Zoho"]
-    for t in tab_names:
-        uploaded = st.file_uploader(f"{t} background", type=["jpg","jpeg","png"], key=f"bg_{t}")
+    bg_changed = False
+    for t, _ in TAB_LAYOUT:
+        uploaded = st.file_uploader(f"{t} background", type=["jpg","jpeg","png"], key=upload_key(f"bg_{t}"))
         if uploaded:
-            img_bytes = uploaded.read()
-            b64 = base64.b64encode(img_bytes).decode()
-            mime = uploaded.type
-            data_url = f"data:{mime};base64,{b64}"
-            st.session_state.bg_images[t] = data_url
+            try:
+                set_background(t, store_background(uploaded.getvalue(), uploaded.type))
+                forget_upload(f"bg_{t}", uploaded)
+                bg_changed = True
+            except Exception as e:
+                logger.exception("Background store failed: %s", e)
+                st.error(f"Could not process {t} background: {e}")
+        if t in st.session_state.bg_images:
             st.success(f"{t} background saved for this session.")
+    if bg_changed: rerun_app()
 
     st.markdown("---")
     st.subheader("Cover image upload (optional)")
@@ -203,16 +456,18 @@ with st.sidebar:
     gcs_json_text = st.text_area("GCS JSON", value="")
     if gcs_json_text.strip():
         try:
-            import json
             st.session_state.gcs_credentials_json = json.loads(gcs_json_text)
         except Exception:
             st.warning("Invalid JSON — please paste valid GCS service account JSON.")
 
     st.markdown("---")
+    st.session_state.ai_cache_enabled = st.checkbox("Reuse cached AI answers", value=st.session_state.ai_cache_enabled,
+                                                    help="Identical prompts are answered from the local response cache.")
     st.write("Connected model:")
     st.write(st.session_state.model_name.split("/")[-1] if st.session_state.model_name else "Not connected")
 
     if st.button("Logout / Clear"):
+        if st.session_state.api_key: get_model_registry().invalidate(st.session_state.api_key)
         st.session_state.api_key = ""
         st.session_state.model_name = None
         st.session_state.available_models = []
@@ -222,53 +477,16 @@ with st.sidebar:
         st.session_state.s3_secret_key = ""
         st.session_state.s3_region = ""
         st.session_state.gcs_credentials_json = ""
-        try:
-            fetch_models_for_key.cache_clear()
-        except: pass
-        st.experimental_rerun()
-
-# ---------- Connect attempt ----------
-if st.session_state.api_key and not st.session_state.model_name:
-    with st.spinner("Discovering available models..."):
-        model_id = try_connect(st.session_state.api_key)
-        if model_id:
-            st.session_state.model_name = model_id
-            st.success("Connected.")
-            st.experimental_rerun()
-        else:
-            st.error("Model discovery failed. Check key or network.")
+        st.session_state.pop("_last_cover_blob", None)
+        st.session_state.pop("_last_cover_source", None)
+        get_blob_store().release_session(blob_session())
+        rerun_app()
 
-# ---------- Locked view ----------
-if not st.session_state.model_name:
-    default_bg = st.session_state.bg_images.get("Landing", "")
-    style_bg = f"background-image: url('{default_bg}');" if default_bg else "background:#f1f5f9;"
-    st.markdown(f"<div class='bg-section' style='{style_bg}'>"
-                "<div class='content-box' style='max-width:620px;text-align:center;'>"
-                "<i class='fa-solid fa-lock' style='font-size:42px;color:#002D62'></i>"
-                "<h1 style='margin-top:10px;color:#002D62'>KonnectOps Login</h1>"
-                "<p class='subtitle'>Secure Digital Operations Center</p>"
-                "</div></div>", unsafe_allow_html=True)
-    key_input = st.text_input("Paste key (kept this session)", type="password", label_visibility="visible")
-    if st.button("Unlock Dashboard"):
-        if key_input:
-            st.session_state.api_key = key_input
-            st.experimental_rerun()
-        else:
-            st.warning("Please paste your key.")
-    st.stop()
-
-# ---------- Main header ----------
-st.markdown("<div style='padding:12px 24px'><span style='font-size:20px;color:#002D62;font-weight:700;'>KonnectOps Mobile</span></div>", unsafe_allow_html=True)
-
-# ---------- Tabs ----------
-tabs = st.tabs(["📄 Landing", "✍️ Content", "🎨 Images", "📅 Calendar", "🛠️ Utilities", "📝 Blog", "☁️ Uploads", "👨‍💻 Zoho"])
-
-def render_tab_section(tab_key: str, inner_html: str):
-    bg = st.session_state.bg_images.get(tab_key, "")
-    if not bg:
+def render_tab_section(bg_url: str, inner_html: str):
+    if not bg_url:
         bg_style = "background: linear-gradient(180deg, #f8fafc 0%, #e9eef6 100%);"
     else:
-        bg_style = f"background-image: url('{bg}');"
+        bg_style = f"background-image: url('{bg_url}');"
     html = f"""
     <div class="bg-section" style="{bg_style}">
       <div class="content-box">
@@ -279,9 +497,10 @@ def render_tab_section(tab_key: str, inner_html: str):
     st.markdown(html, unsafe_allow_html=True)
 
 # ---------- Landing ----------
-with tabs[0]:
+@timed_fragment
+def landing_tab(bg_url: str):
     inner = "<div class='hero-title'><h1>Developer Console — Landing Page Generator</h1></div><p class='subtitle'>Quickly replace names and generate SEO-ready HTML with preview and download.</p>"
-    render_tab_section("Landing", inner)
+    render_tab_section(bg_url, inner)
     c1, c2 = st.columns(2)
     with c1:
         proj = st.text_input("Project Name", placeholder="TVS Emerald")
@@ -294,10 +513,14 @@ with tabs[0]:
         if not html_input:
             st.warning("Paste your HTML first.")
         else:
-            res = html_input.replace(old_txt or "", proj or "").replace("{PRICE}", price or "").replace("{LOCATION}", loc or "")
-            if "{DESC}" in res:
-                seo = ask_ai(f"Write 150 char SEO description for {proj} in {loc}.")
-                if not seo.lower().startswith("error"): res = res.replace("{DESC}", seo)
+            tpl = compile_template(html_input, (old_txt,))
+            values = landing_values(price, loc)
+            if "DESC" in tpl.placeholders:
+                seo = ask_ai(landing_desc_prompt(proj, loc))
+                if not seo.lower().startswith("error"): values["DESC"] = seo
+            res, missing, unused = tpl.render(values, {old_txt: proj or ""})
+            if missing: st.info("Unfilled placeholders: " + ", ".join("{" + m + "}" for m in missing))
+            if unused: st.caption("Not used by this template: " + ", ".join("{" + u + "}" for u in unused))
             try:
                 st.markdown("**Preview**")
                 components.html(res, height=420, scrolling=True)
@@ -305,48 +528,254 @@ with tabs[0]:
                 st.warning("Preview might not render; download to view.")
             st.download_button("Download HTML", data=res, file_name=f"{proj or 'page'}.html", mime="text/html")
 
+    st.markdown("---")
+    st.subheader("Batch mode")
+    st.caption("Upload a CSV with columns project, location, price, old name — one page per row, using the HTML above. "
+               "Any other column fills the matching {COLUMN_NAME} placeholder.")
+    batch_csv = st.file_uploader("Projects CSV", type=["csv"], key="landing_batch_csv")
+    batch_workers = st.slider("Parallel AI calls", min_value=1, max_value=16, value=LANDING_BATCH_WORKERS)
+    if st.button("Generate pages from CSV"):
+        if not html_input:
+            st.warning("Paste your HTML first.")
+        elif not batch_csv:
+            st.warning("Upload a projects CSV.")
+        else:
+            try:
+                rows = read_landing_rows(batch_csv.getvalue())
+            except ValueError as e:
+                rows = []
+                st.error(str(e))
+            if rows:
+                bar = st.progress(0.0, text=f"0 / {len(rows)} pages")
+                zip_file, errors, missing = build_landing_zip(
+                    html_input, rows, ai_context(), default_old=old_txt, workers=batch_workers,
+                    progress=lambda done, total: bar.progress(done / total, text=f"{done} / {total} pages"))
+                if errors:
+                    st.session_state.last_ai_error = errors[-1]["error"]
+                    st.warning(f"{len(errors)} of {len(rows)} rows had errors (listed in _errors.csv).")
+                    st.dataframe(pd.DataFrame(errors), hide_index=True)
+                else:
+                    st.success(f"Generated {len(rows)} pages.")
+                if missing: st.info("Placeholders with no value in the CSV: " + ", ".join("{" + m + "}" for m in missing))
+                st.download_button("Download pages (zip)", data=zip_file.read(), file_name="landing_pages.zip", mime="application/zip")
+
 # ---------- Content ----------
-with tabs[1]:
+@timed_fragment
+def content_tab(bg_url: str):
     header_html = "<div class='hero-title'><h1>Marketing Studio</h1></div><p class='subtitle'>Short, human-friendly marketing drafts — blog, social, email.</p>"
-    render_tab_section("Content", header_html)
-    ctype = st.selectbox("Content Type", ["Blog Post", "Instagram Carousel", "LinkedIn Post", "Client Email"])
+    render_tab_section(bg_url, header_html)
+    ctype = st.selectbox("Content Type", CONTENT_TYPES)
     topic = st.text_input("Topic", placeholder="Why invest in OMR?")
     if st.button("Draft Content"):
         if not topic.strip():
             st.warning("Enter a topic.")
         else:
-            out = ask_ai(f"Act as a Senior Marketing Manager. Write a professional {ctype} about: {topic}.")
-            if out.lower().startswith("error"):
-                st.error(out)
-            else:
-                st.code(out, language="text")
+            stream_ai_to(st.empty(), content_prompt(ctype, topic))
 
 # ---------- Images ----------
-with tabs[2]:
+@timed_fragment
+def images_tab(bg_url: str):
     header_html = "<div class='hero-title'><h1>Image Prompt Studio</h1></div><p class='subtitle'>Generate production-ready prompts for image tools.</p>"
-    render_tab_section("Images", header_html)
+    render_tab_section(bg_url, header_html)
     desc = st.text_input("Image Concept", placeholder="Luxury living room with sea view")
-    style = st.selectbox("Style", ["Photorealistic 8k", "Architectural render", "Lifestyle"])
+    style = st.selectbox("Style", IMAGE_STYLES)
     if st.button("Generate Prompt"):
         if not desc.strip():
             st.warning("Enter an image concept.")
         else:
-            out = ask_ai(f"Write a detailed Midjourney prompt for: {desc}. Style: {style}.")
+            out = ask_ai(image_concept_prompt(desc, style))
             if out.lower().startswith("error"): st.error(out)
             else: st.code(out, language="text")
 
 # ---------- Calendar ----------
-with tabs[3]:
+@st.cache_data
+def festival_calendar() -> pd.DataFrame:
+    return pd.DataFrame(FESTIVALS_2026, columns=["Date", "Festival"])
+
+@timed_fragment
+def calendar_tab(bg_url: str):
     header_html = "<div class='hero-title'><h1>Marketing Calendar — 2026 Festivals</h1></div><p class='subtitle'>Plan campaigns around key dates.</p>"
-    render_tab_section("Calendar", header_html)
-    data = {"Date": ["Jan 14", "Jan 26", "Mar 04", "Mar 20", "Apr 14", "Aug 15", "Aug 26", "Sep 14", "Oct 20", "Nov 08", "Dec 25"],
-            "Festival": ["Pongal","Republic Day","Holi","Ramzan","Tamil New Year","Independence Day","Onam","Ganesh Chaturthi","Ayudha Puja","Diwali","Christmas"]}
-    st.table(pd.DataFrame(data))
+    render_tab_section(bg_url, header_html)
+    st.table(festival_calendar())
 
 # ---------- Utilities ----------
-with tabs[4]:
+HEATMAP_STOPS = np.array([[220, 242, 225], [255, 240, 200], [245, 185, 185]])  # low -> high EMI
+
+def rupees(value: float) -> str:
+    return f"₹ {int(round(value)):,}"
+
+def emi_heatmap(df: pd.DataFrame):
+    """Styler with a green-amber-red background per cell, without matplotlib."""
+    v = df.to_numpy(dtype=float)
+    span = np.ptp(v) or 1.0
+    t = (v - v.min()) / span
+    rgb = np.stack([np.interp(t, [0, 0.5, 1], HEATMAP_STOPS[:, c]) for c in range(3)], axis=-1).round().astype(int)
+    css = pd.DataFrame([[f"background-color: rgb({r},{g},{b}); color: #1f2937" for r, g, b in row] for row in rgb],
+                       index=df.index, columns=df.columns)
+    return df.style.format(rupees).apply(lambda _: css, axis=None)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def emi_grid_csv(loans: tuple, rates: tuple, tenures: tuple) -> bytes:
+    grid = emi_grid(loans, rates, tenures)
+    return "".join(iter_csv(grid_columns(grid), {"principal": "%.0f", "rate": "%g", "years": "%g"})).encode()
+
+def whatsapp_bulk():
+    st.markdown("---")
+    st.markdown("**Bulk links from a lead CSV**")
+    st.caption("Needs a phone or mobile column; name, project and message columns are optional. A filled message column "
+               "overrides the template for that row. Placeholders: {NAME}, {PROJECT} and {COLUMN_NAME} for any column.")
+    leads = st.file_uploader("Leads CSV", type=["csv"], key="wa_bulk_csv")
+    template = st.text_area("Message template", WHATSAPP_TEMPLATE)
+    c1, c2, c3 = st.columns(3)
+    project = c1.text_input("Project (when the CSV has none)", "")
+    country = c2.text_input("Default country code", WHATSAPP_COUNTRY_CODE)
+    blank_name = c3.text_input("Name when blank", "there")
+    if not st.button("Create links from CSV"):
+        return
+    if not leads:
+        st.warning("Upload a leads CSV.")
+        return
+    out = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024, mode="w+", encoding="utf-8", newline="")
+    rejected = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode="w+", encoding="utf-8", newline="")
+    try:
+        with st.spinner("Creating links..."):
+            stats = build_whatsapp_links(BytesIO(leads.getvalue()), template, out, rejected,
+                                         country.strip().lstrip("+") or WHATSAPP_COUNTRY_CODE, project, blank_name)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    st.success(f"{stats['links']:,} links from {stats['rows']:,} rows in {stats['seconds']:.1f}s.")
+    if stats["reasons"]:
+        st.dataframe(pd.DataFrame(sorted(stats["reasons"].items(), key=lambda kv: -kv[1]), columns=["Rejected because", "Rows"]),
+                     hide_index=True)
+    d1, d2 = st.columns(2)
+    out.seek(0)
+    d1.download_button("Download links (CSV)", data=out.read(), file_name="whatsapp_links.csv", mime="text/csv")
+    if stats["rejected"]:
+        rejected.seek(0)
+        d2.download_button("Download rejected rows (CSV)", data=rejected.read(), file_name="whatsapp_rejected.csv", mime="text/csv")
+
+def translation_summary(stats: dict) -> str:
+    return (f"{stats['segments']:,} segments ({stats['unique']:,} distinct): {stats['from_memory']:,} from translation memory, "
+            f"{stats['model_segments']:,} translated in {stats['model_calls']} model calls.")
+
+def run_translation(texts: list):
+    """translate_texts with a progress bar; returns the translations, or None after showing an error."""
+    bar = st.progress(0.0, text="Checking translation memory...")
+    out, stats = translate_texts(texts, ai_context(),
+                                 progress=lambda done, total: bar.progress(done / total, text=f"{done} / {total} new segments"))
+    bar.empty()
+    if stats["failed"]:
+        st.session_state.last_ai_error = stats["errors"][0]
+        st.warning(f"{stats['failed']} segments were left in English: {'; '.join(stats['errors'])}")
+    st.caption(translation_summary(stats))
+    return out
+
+def tamil_translator():
+    tm = get_translation_memory()
+    txt_to_translate = st.text_area("Enter English Text", "Exclusive launch offer ending soon.")
+    if st.button("Translate"):
+        out = run_translation([txt_to_translate])
+        st.code(out[0], language="text")
+
+    with st.expander("Glossary — names kept in English"):
+        terms = st.text_area("One project, developer or brand name per line", "\n".join(tm.glossary()), key="tm_glossary")
+        if st.button("Save glossary"):
+            tm.set_glossary(terms.splitlines())
+            st.success("Glossary saved.")
+
+    st.markdown("**Bulk translate**")
+    st.caption("A CSV with a text/english column (or the first column), or a .txt file with one text per line.")
+    bulk = st.file_uploader("Texts file", type=["csv", "txt"], key="tm_bulk")
+    if st.button("Translate file"):
+        if not bulk:
+            st.warning("Upload a CSV or text file.")
+            return
+        data = bulk.getvalue()
+        if bulk.name.lower().endswith(".txt"):
+            df = pd.DataFrame({"english": [line for line in data.decode("utf-8-sig", errors="replace").splitlines() if line.strip()]})
+            col = "english"
+        else:
+            df = pd.read_csv(BytesIO(data), dtype=object, keep_default_na=False, encoding="utf-8-sig")
+            col = next(iter(csv_header_map(list(df.columns), TRANSLATION_CSV_FIELDS)), df.columns[0] if len(df.columns) else None)
+        if col is None or df.empty:
+            st.warning("No texts found in the file.")
+            return
+        df["tamil"] = run_translation(df[col].astype(str).tolist())
+        st.dataframe(df.head(20), hide_index=True)
+        st.download_button("Download translations (CSV)", data=df.to_csv(index=False).encode("utf-8-sig"),
+                           file_name="translations_ta.csv", mime="text/csv")
+    st.caption(f"Translation memory: {tm.stats()['entries'] or 0:,} segments.")
+
+def emi_calculator():
+    loan = st.number_input("Loan Amount (₹)", value=5_000_000, min_value=0, format="%d")
+    rate = st.number_input("Interest Rate (%)", value=8.5, min_value=0.0, format="%.3f")
+    years = st.number_input("Tenure (Years)", value=20, min_value=1)
+    c1, c2 = st.columns(2)
+    with c1:
+        step_up = st.number_input("EMI step-up every year (%)", value=0.0, min_value=0.0, step=1.0)
+        annual_prepay = st.number_input("Prepayment every year (₹)", value=0, min_value=0, format="%d")
+    with c2:
+        prepay_text = st.text_input("One-off prepayments (month:amount)", placeholder="12:200000, 36:500000")
+        reduces = st.radio("Prepayments reduce", ["Tenure", "EMI"], horizontal=True)
+    if st.button("Calculate EMI"):
+        st.session_state["_emi_open"] = True
+    if not st.session_state.get("_emi_open"):
+        return
+    if loan <= 0:
+        st.warning("Enter a loan amount above zero.")
+        return
+    months = int(years) * 12
+    try:
+        plan = prepayment_plan(prepay_text, annual_prepay, months)
+        schedule = amortization_schedule(loan, rate, years, plan, step_up, reduces.lower())
+    except ValueError as e:
+        st.error(str(e))
+        return
+    totals = schedule_totals(schedule)
+    st.success(f"Monthly EMI: {rupees(totals['first_emi'])}")
+    plain_interest = monthly_emi(loan, rate, years) * months - loan
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Total interest", rupees(totals["total_interest"]))
+    m2.metric("Paid off in", f"{totals['months'] // 12}y {totals['months'] % 12}m")
+    m3.metric("Total paid", rupees(totals["total_paid"]))
+    if plan or step_up:
+        st.caption(f"Saves {rupees(plain_interest - totals['total_interest'])} interest and {months - totals['months']} months "
+                   f"against the plain loan; last EMI {rupees(totals['last_emi'])}.")
+    with st.expander("Amortization schedule"):
+        st.dataframe(pd.DataFrame(yearly_schedule(schedule)).round(0), hide_index=True)
+        d1, d2 = st.columns(2)
+        d1.download_button("Monthly schedule (CSV)", data="".join(iter_csv(schedule, {"month": "%d"})),
+                           file_name="emi_schedule.csv", mime="text/csv")
+        if XLSX_ENGINE:
+            d2.download_button("Schedule (Excel)", data=xlsx_bytes({"Monthly": schedule, "Yearly": yearly_schedule(schedule)}),
+                               file_name="emi_schedule.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+    st.markdown("**Compare rates and tenures**")
+    g1, g2, g3 = st.columns(3)
+    rates_txt = g1.text_input("Rates (%)", "8.4, 8.75, 9.1, 9.5", help="List or start:stop:step, e.g. 8:10:0.25")
+    tenures_txt = g2.text_input("Tenures (years)", "15, 20, 25, 30")
+    loans_txt = g3.text_input("Loan amounts (₹)", "", placeholder="Same as above")
+    try:
+        axes = (tuple(number_list(loans_txt)) or (float(loan),), tuple(number_list(rates_txt)), tuple(number_list(tenures_txt)))
+        if not all(axes): raise ValueError("Enter at least one rate and one tenure.")
+        grid = emi_grid(*axes)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    pick = 0
+    if len(axes[0]) > 1:
+        pick = st.selectbox("Heatmap for loan", range(len(axes[0])), format_func=lambda i: rupees(axes[0][i]))
+    df = pd.DataFrame(grid["emi"][pick], index=[f"{r:g}%" for r in axes[1]], columns=[f"{y:g} yrs" for y in axes[2]])
+    st.dataframe(emi_heatmap(df))
+    st.caption(f"{grid['emi'].size:,} scenarios")
+    st.download_button("All scenarios (CSV)", data=emi_grid_csv(*axes), file_name="emi_scenarios.csv", mime="text/csv")
+
+@timed_fragment
+def utilities_tab(bg_url: str):
     header_html = "<div class='hero-title'><h1>Sales Utilities</h1></div><p class='subtitle'>WhatsApp links, EMI calculator, translations — quick tools.</p>"
-    render_tab_section("Utilities", header_html)
+    render_tab_section(bg_url, header_html)
     tool = st.radio("Tool:", ["WhatsApp Link Generator", "EMI Calculator", "Tamil Translator"], horizontal=True)
     if tool == "WhatsApp Link Generator":
         wa_num = st.text_input("Phone Number (with code)", "919876543210")
@@ -354,28 +783,78 @@ with tabs[4]:
         if st.button("Create WhatsApp Link"):
             if not wa_num.strip(): st.warning("Enter phone number.")
             else:
-                link = f"https://wa.me/{wa_num.strip()}?text={quote_plus(wa_msg)}"
+                link = whatsapp_link(wa_num, wa_msg)
                 st.code(link)
                 st.markdown(f"[Open link]({link})")
+        whatsapp_bulk()
     elif tool == "EMI Calculator":
-        loan = st.number_input("Loan Amount (₹)", value=5_000_000, min_value=0, format="%d")
-        rate = st.number_input("Interest Rate (%)", value=8.5, format="%.3f")
-        years = st.number_input("Tenure (Years)", value=20, min_value=1)
-        if st.button("Calculate EMI"):
-            r = rate / (12 * 100); n = int(years * 12)
-            emi = loan * r * ((1 + r) ** n) / (((1 + r) ** n) - 1)
-            st.success(f"Monthly EMI: ₹ {int(round(emi)):,}")
+        emi_calculator()
     else:
-        txt_to_translate = st.text_area("Enter English Text", "Exclusive launch offer ending soon.")
-        if st.button("Translate"):
-            out = ask_ai(f"Translate this real estate text to professional Tamil: '{txt_to_translate}'")
-            if out.lower().startswith("error"): st.error(out)
-            else: st.code(out, language="text")
+        tamil_translator()
 
 # ---------- Blog ----------
-with tabs[5]:
+def generate_blog_run(run: dict, jobs: list):
+    """Generate ``jobs`` into ``run``: one project's sections stream into their slots, many show progress only."""
+    projects = run["projects"]
+    live = st.empty()
+    with live.container():
+        bar = st.progress(0.0, text=f"0 / {len(jobs)} sections")
+        slots = {}
+        if len(projects) == 1:
+            for i, s in jobs:
+                slots[(i, s.key)] = st.empty()
+                slots[(i, s.key)].caption(f"⏳ {s.heading or 'Title & introduction'}")
+    done = 0
+    def on_section(i, key, text, error):
+        nonlocal done
+        done += 1
+        bar.progress(done / len(jobs), text=f"{done} / {len(jobs)} sections — {projects[i]['project']}: {key}")
+        if (i, key) in slots:
+            if error: slots[(i, key)].error(f"{key}: {error}")
+            else: slots[(i, key)].markdown(text)
+    painted = {}
+    def on_chunk(i, key, text, refresh_seconds=0.15):
+        now = time.monotonic()
+        if now - painted.get(key, 0.0) >= refresh_seconds:
+            slots[(i, key)].markdown(text + " ▌")
+            painted[key] = now
+    with current_metrics().timer("blog_run"):
+        results = run_blog_sections(projects, jobs, ai_context(), on_section=on_section,
+                                    on_chunk=on_chunk if slots else None)
+    for k, (text, error) in results.items():
+        if error:
+            run["errors"][k] = error
+            st.session_state.last_ai_error = error
+        else:
+            run["sections"][k] = text
+            run["errors"].pop(k, None)
+    live.empty()
+
+def show_blog_run(run: dict):
+    projects = run["projects"]
+    blogs = [assemble_blog(p, {key: text for (j, key), text in run["sections"].items() if j == i})
+             for i, p in enumerate(projects)]
+    if run["errors"]:
+        st.warning("Not generated: " + "; ".join(f"{projects[i]['project']} — {key}" for i, key in sorted(run["errors"])))
+    if len(projects) == 1:
+        st.markdown("**Generated blog (Markdown)**")
+        st.code(blogs[0], language="markdown")
+        st.download_button("Download blog (md)", data=blogs[0], file_name=unique_file_name(projects[0]["project"] + "_blog", set(), ".md"),
+                           mime="text/markdown")
+        return
+    st.markdown(f"**Generated {len(projects)} blogs (Markdown)**")
+    pick = st.selectbox("Preview blog", range(len(projects)), format_func=lambda i: projects[i]["project"])
+    st.code(blogs[pick], language="markdown")
+    buf, used = BytesIO(), set()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for p, md in zip(projects, blogs):
+            zf.writestr(unique_file_name(p["project"] + "_blog", used, ".md"), md)
+    st.download_button("Download blogs (zip)", data=buf.getvalue(), file_name="blogs.zip", mime="application/zip")
+
+@timed_fragment
+def blog_tab(bg_url: str):
     header_html = "<div class='hero-title'><h1>Blog — Home Konnect Generator</h1></div><p class='subtitle'>Generate copy-paste blog (Home Konnect format) and cover image prompts.</p>"
-    render_tab_section("Blog", header_html)
+    render_tab_section(bg_url, header_html)
     col1, col2 = st.columns([2, 1])
     with col1:
         b_project = st.text_input("Project Name", "DRA Beena Clover")
@@ -387,109 +866,269 @@ with tabs[5]:
         b_poss = st.text_input("Possession", "Check developer brochure")
         b_phone = st.text_input("Sales phone", "919876543210")
         b_email = st.text_input("Sales email", "sales@draexample.com")
+    defaults = {"project": b_project, "location": b_location, "developer": b_developer, "usps": b_usps,
+                "price": b_price, "possession": b_poss, "phone": b_phone, "email": b_email}
+    blog_csv = st.file_uploader("Many projects at once (optional CSV: project, location, developer, usps, price, possession, phone, email)",
+                                type=["csv"], key="blog_batch_csv", help="Empty cells use the values above.")
     if st.button("Generate Home Konnect blog (Markdown)"):
-        prompt = f\"\"\"
-You are a professional real estate content writer. Produce a copy-paste ready markdown blog post following the Home Konnect blog structure EXACTLY:
-Title, Preview (with emojis), Introduction, Project highlights with emojis, Location advantages, Premium specifications, Amenities (with emojis), About the developer, Contact CTA (phone, whatsapp link), FAQ (5 Q&A), SEO Meta Title & 150-char description, tags.
-Project: {b_project}
-Location: {b_location}
-Developer: {b_developer}
-USPs: {b_usps}
-Phone: {b_phone}
-Email: {b_email}
-Return only markdown content.
-\"\"\"
-        with st.spinner("Drafting blog..."):
-            blog_md = ask_ai(prompt)
-        if blog_md.lower().startswith("error"): st.error(blog_md)
-        else:
-            st.markdown("**Generated blog (Markdown)**")
-            st.code(blog_md, language="markdown")
-            st.download_button("Download blog (md)", data=blog_md, file_name=f"{b_project.replace(' ','_')}_blog.md", mime="text/markdown")
+        projects = [defaults]
+        if blog_csv:
+            try:
+                projects = read_blog_projects(blog_csv.getvalue(), defaults)
+            except ValueError as e:
+                projects = []
+                st.error(str(e))
+        if projects:
+            run = {"projects": projects, "sections": {}, "errors": {}}
+            generate_blog_run(run, blog_jobs(projects))
+            st.session_state["_blog_run"] = run
+    run = st.session_state.get("_blog_run")
+    if run:
+        failed = {}
+        for i, key in run["errors"]: failed.setdefault(i, set()).add(key)
+        retry_slot = st.empty()
+        if failed and retry_slot.button(f"Retry {len(run['errors'])} failed section(s)"):
+            generate_blog_run(run, blog_jobs(run["projects"], failed))
+            if not run["errors"]: retry_slot.empty()
+        show_blog_run(run)
     st.markdown("---")
     st.subheader("Cover image prompt")
-    usps_list = [u.strip() for u in b_usps.split(",") if u.strip()]
-    usps_short = "; ".join(usps_list[:4])
-    image_prompt = (f"Blog cover for '{b_project}' in {b_location}. Photorealistic 1200x628, modern mid-rise exterior at golden hour, "
-                    f"landscaped foreground, safe family silhouettes, room for title overlay, no recognizable faces. Emphasize: {usps_short}.")
+    image_prompt = cover_image_prompt(b_project, b_location, b_usps)
     st.code(image_prompt, language="text")
     if st.button("Try auto-generate cover image"):
         with st.spinner("Attempting to generate image via GenAI..."):
-            img_bytes = generate_cover_image_via_genai(image_prompt, size="1200x628")
-            if img_bytes:
-                st.image(img_bytes, width=700, caption="Generated cover image")
-                st.download_button("Download Cover Image", data=img_bytes, file_name=f"{b_project.replace(' ','_')}_cover.jpg", mime="image/jpeg")
-                st.session_state["_last_cover_bytes"] = img_bytes
-            else:
-                st.warning("Auto-generation not available in this environment. Use the prompt above in an image tool or upload your own image.")
+            img_bytes = generate_cover_image_via_genai(image_prompt, size="1200x628", ctx=ai_context())
+        if img_bytes:
+            set_cover(img_bytes, f"generated:{time.time()}")
+            rerun_app()  # the Uploads tab shows the new cover too
+        else:
+            st.warning("Auto-generation not available in this environment. Use the prompt above in an image tool or upload your own image.")
     st.markdown("**Or upload your own cover image (JPEG/PNG)**")
-    uploaded = st.file_uploader("Upload cover image", type=["jpg", "jpeg", "png"])
+    uploaded = st.file_uploader("Upload cover image", type=["jpg", "jpeg", "png"], key=upload_key("cover_upload"))
     if uploaded:
-        bytes_img = uploaded.read()
-        st.image(bytes_img, width=700, caption="Uploaded cover image")
-        st.session_state["_last_cover_bytes"] = bytes_img
-        st.download_button("Download uploaded cover", data=bytes_img, file_name=f"{b_project.replace(' ','_')}_cover.jpg", mime="image/jpeg")
+        set_cover(uploaded.getvalue(), f"upload:{uploaded.name}")
+        forget_upload("cover_upload", uploaded)
+        rerun_app()
+    if cover_bytes() is not None:
+        rend = cover_renditions()
+        caption = "Current cover image"
+        if rend: caption += f" (preview of {rend['source']['width']}x{rend['source']['height']} {rend['source']['format'] or 'image'})"
+        st.image(cover_preview(rend), width=700, caption=caption)
+        choice = st.selectbox("Cover download size", cover_file_options(rend), key="cover_download_choice")
+        data, cover_type, suffix = cover_file(rend, choice)
+        st.download_button("Download cover image", data=data, file_name=f"{b_project.replace(' ','_')}_cover{suffix}", mime=cover_type)
 
 # ---------- Uploads ----------
-with tabs[6]:
+@timed_fragment
+def uploads_tab(bg_url: str):
     header_html = "<div class='hero-title'><h1>Uploads</h1></div><p class='subtitle'>Upload generated cover images to S3 or GCS (optional).</p>"
-    render_tab_section("Uploads", header_html)
-    if "_last_cover_bytes" not in st.session_state:
+    render_tab_section(bg_url, header_html)
+    if cover_bytes() is None:
         st.info("No cover image available yet. Generate or upload one in the Blog tab first.")
     else:
-        img_bytes = st.session_state["_last_cover_bytes"]
-        st.image(img_bytes, width=600, caption="Selected cover image ready for upload")
-        dest = st.selectbox("Upload destination", ["None", "AWS S3", "Google Cloud Storage"])
+        rend = cover_renditions()
+        st.image(cover_preview(rend), width=600, caption="Selected cover image ready for upload")
+        choice = st.selectbox("Cover file to upload", cover_file_options(rend), key="cover_upload_choice")
+        img_bytes, cover_type, _ = cover_file(rend, choice)
+        with_renditions = bool(rend) and st.checkbox("Also upload the other sizes (hero, thumbnail, WebP)", value=False)
+        extras = st.file_uploader("Additional images to upload with it (optional)", type=["jpg", "jpeg", "png", "webp"],
+                                  accept_multiple_files=True, key=upload_key("upload_extras"))
+        dest = st.selectbox("Upload destination", ["None", "AWS S3", "Google Cloud Storage", "Local folder (offline test)"])
+        put, object_key = None, None
+        metrics = current_metrics()
+        default_key = f"blog_covers/{int(time.time())}_cover{extension_for(cover_type)}"
         if dest == "AWS S3":
             if not BOTO3_AVAILABLE:
                 st.error("boto3 not installed. Install boto3 to enable S3 uploads.")
             else:
                 s3_bucket_in = st.text_input("S3 Bucket (to upload)", value="")
                 s3_region_in = st.text_input("S3 Region", value=st.session_state.s3_region or "")
-                s3_key_in = st.text_input("S3 object key (e.g., blog/covers/mycover.jpg)", value=f"blog_covers/{int(time.time())}_cover.jpg")
-                if st.button("Upload to S3"):
-                    try:
-                        url = upload_to_s3(img_bytes, s3_bucket_in, s3_key_in, s3_region_in, st.session_state.s3_access_key, st.session_state.s3_secret_key)
-                        st.success("Uploaded to S3.")
-                        st.write("Public URL:", url)
-                    except Exception as e:
-                        st.error(f"S3 upload failed: {e}")
+                object_key = st.text_input("S3 object key (e.g., blog/covers/mycover.jpg)", value=default_key)
+                access_key, secret_key = st.session_state.s3_access_key, st.session_state.s3_secret_key
+                put = lambda data, name, ctype, progress: upload_to_s3(data, s3_bucket_in, name, s3_region_in, access_key, secret_key, ctype, progress, metrics)
         elif dest == "Google Cloud Storage":
             if not GCS_AVAILABLE:
                 st.error("google-cloud-storage not installed. Install google-cloud-storage to enable GCS uploads.")
+            elif not st.session_state.gcs_credentials_json:
+                st.error("GCS credentials JSON not provided in sidebar. Paste service account JSON there.")
             else:
                 gcs_bucket_in = st.text_input("GCS Bucket (to upload)", value="")
-                gcs_key_in = st.text_input("GCS object name (e.g., blog/covers/mycover.jpg)", value=f"blog_covers/{int(time.time())}_cover.jpg")
-                if st.button("Upload to GCS"):
-                    try:
-                        if not st.session_state.gcs_credentials_json:
-                            st.error("GCS credentials JSON not provided in sidebar. Paste service account JSON there.")
-                        else:
-                            url = upload_to_gcs(img_bytes, gcs_bucket_in, gcs_key_in, st.session_state.gcs_credentials_json)
-                            st.success("Uploaded to GCS.")
-                            st.write("Public URL:", url)
-                    except Exception as e:
-                        st.error(f"GCS upload failed: {e}")
+                object_key = st.text_input("GCS object name (e.g., blog/covers/mycover.jpg)", value=default_key)
+                creds = st.session_state.gcs_credentials_json
+                st.caption(f"Files of {UPLOAD_MULTIPART_THRESHOLD // (1024 * 1024)} MB or more go up as parallel parts; "
+                           "their progress bar only fills when the whole file is done.")
+                put = lambda data, name, ctype, progress: upload_to_gcs(data, gcs_bucket_in, name, creds, ctype, progress, metrics=metrics)
+        elif dest == "Local folder (offline test)":
+            local_bucket_in = st.text_input("Local bucket name", value="covers")
+            object_key = st.text_input("Object name", value=default_key)
+            st.caption(f"Files are written under {LOCAL_BUCKET_DIR}.")
+            put = lambda data, name, ctype, progress: upload_to_local(data, local_bucket_in, name, ctype, progress, metrics=metrics)
+        if put and st.button(f"Upload to {dest.split(' (')[0]}"):
+            prefix = object_key.rsplit("/", 1)[0] + "/" if "/" in object_key else ""
+            items = [UploadItem(object_key, img_bytes, cover_type)]
+            if with_renditions:
+                stem = os.path.splitext(object_key)[0]
+                for label in cover_file_options(rend):
+                    data, ctype, suffix = cover_file(rend, label)
+                    if label != choice and COVER_FILES[label] is not None:
+                        items.append(UploadItem(stem + suffix, data, ctype))
+            for f in extras or []:
+                data = f.getvalue()
+                items.append(UploadItem(prefix + f.name, data, detect_content_type(data, f.name)))
+            bars = {it.object_name: st.progress(0.0, text=it.object_name) for it in items}
+            def show(state):
+                for name, entry in state.items():
+                    frac = entry["sent"] / entry["total"] if entry["total"] else 1.0
+                    bars[name].progress(min(frac, 1.0), text=f"{name} — {entry['status']}")
+            results = upload_batch(put, items, on_progress=show)
+            show(results)
+            for name, entry in results.items():
+                if entry["status"] == "done":
+                    st.success(f"Uploaded {name}.")
+                    st.write("Public URL:", entry["url"])
+                else:
+                    st.error(f"Upload of {name} failed after {entry['attempts']} attempts: {entry['error']}")
+            if extras and all(entry["status"] == "done" for entry in results.values()):
+                forget_upload("upload_extras", *extras)
 
 # ---------- Zoho ----------
-with tabs[7]:
+@timed_fragment
+def zoho_tab(bg_url: str):
     header_html = "<div class='hero-title'><h1>Zoho Deluge Scripting</h1></div><p class='subtitle'>Generate Deluge scripts for Zoho CRM automations.</p>"
-    render_tab_section("Zoho", header_html)
+    render_tab_section(bg_url, header_html)
+    library = get_deluge_library()
     req = st.text_area("Logic Needed", "e.g. Update lead status when email opens")
-    if st.button("Compile Code"):
-        if not req.strip(): st.warning("Enter the logic.")
-        else:
-            out = ask_ai(f"Write Zoho Deluge script: {req}")
-            if out.lower().startswith("error"): st.error(out)
-            else: st.code(out, language="java")
+    compiled = st.button("Compile Code")
+    if compiled and not req.strip():
+        st.warning("Enter the logic.")
+        compiled = False
+    elif compiled:
+        st.session_state["_deluge_req"] = req.strip()
+        st.session_state["_deluge_fresh"] = None
+    asked = st.session_state.get("_deluge_req")
+    if asked and asked == req.strip():
+        show_deluge_script(library, asked, compiled)
+    lib_stats = library.stats()
+    st.caption(f"Script library: {lib_stats['scripts']:,} scripts"
+               + (f" · last lookup {lib_stats['last_search_ms']} ms" if lib_stats["searches"] else ""))
+
+def show_deluge_script(library, asked: str, compiled: bool = False):
+    """A close library match with a regenerate option, else (or on request) a fresh generation saved to the library.
+
+    The model is only called on the run where "Compile Code" or "Regenerate anyway" was clicked, never on a
+    plain rerun; a failed generation forgets the request so nothing retries behind the user's back.
+    """
+    fresh = st.session_state.get("_deluge_fresh")
+    matches = [] if fresh else library.search(asked)
+    close = close_match(asked, matches)
+    others, regenerate = matches[1:] if close else matches, False
+    if close:
+        slot = st.empty()
+        with slot.container():
+            st.info(f"From the script library — {close['score']:.0%} similar to: “{close['request']}”")
+            st.code(close["script"], language="java")
+            regenerate = st.button("Regenerate anyway")
+        if regenerate:
+            slot.empty()
+            others = []
+    if not fresh and (regenerate or (compiled and not close)):
+        out = ask_ai(deluge_prompt(asked), use_cache=False if regenerate else None)
+        if out.lower().startswith("error"):
+            st.session_state["_deluge_req"] = None
+            st.error(out)
+            return
+        library.add(asked, out, st.session_state.model_name)
+        st.session_state["_deluge_fresh"] = fresh = out
+    if fresh:
+        st.code(fresh, language="java")
+    if others:
+        with st.expander(f"Similar scripts in the library ({len(others)})"):
+            for m in others:
+                st.markdown(f"**{m['score']:.0%}** — {m['request']}")
+                st.code(m["script"], language="java")
 
 # ---------- Diagnostics ----------
-with st.expander("Diagnostics & last AI error", expanded=False):
+@timed_fragment
+def diagnostics_panel():
+    st.button("Refresh diagnostics")
     st.write("Model:", st.session_state.model_name)
     st.write("Available models:", st.session_state.available_models[:8])
     if st.session_state.last_ai_error:
         st.error("Last AI error:")
         st.write(st.session_state.last_ai_error)
     st.write("Session backgrounds keys:", list(st.session_state.bg_images.keys()))
+    st.write("Blob store:", get_blob_store().stats())
+    st.write("AI response cache:", get_response_cache().stats())
+    st.write("Translation memory:", get_translation_memory().stats())
+    st.write("Deluge script library:", get_deluge_library().stats())
+    st.write("Model registry:", get_model_registry().stats())
+    st.write("AI scheduler:", get_ai_scheduler().stats())
+    st.write("Cover image pipeline:", get_cover_pipeline().stats())
+    st.markdown("**Timings (this session)**")
+    st.dataframe(pd.DataFrame(session_metrics_registry().summary()), hide_index=True)
+    prom = get_metrics_registry().to_prometheus()
+    st.download_button("Download process metrics (Prometheus text)", data=prom, file_name="konnectops_metrics.prom", mime="text/plain")
+    st.caption(f"Per-call events are appended to {METRICS_LOG_PATH}." if METRICS_LOG_PATH
+               else "Per-call event log is off; set KONNECTOPS_METRICS_LOG to a file path to enable it.")
+    st.session_state.profile_reruns = st.checkbox("Profile full reruns (cProfile)", value=st.session_state.profile_reruns,
+                                                  help=f"Top {PROFILE_TOP_N} functions by cumulative time; applies from the next full rerun.")
+    if st.session_state.get("_last_profile"):
+        st.code(st.session_state["_last_profile"], language="text")
+    if st.button("Clear AI response cache"):
+        get_response_cache().clear()
+        st.success("Response cache cleared.")
+
+# ---------- Layout ----------
+if "_blob_lease" in st.session_state: blob_session()  # keeps this session off the idle sweep
+sweep_blob_sessions()
+
+with st.sidebar:
+    sidebar_settings()
+
+# ---------- Connect attempt ----------
+if st.session_state.api_key and not st.session_state.model_name:
+    with st.spinner("Discovering available models..."):
+        model_id = try_connect(st.session_state.api_key)
+        if model_id:
+            st.session_state.model_name = model_id
+            st.success("Connected.")
+            rerun_app()
+        else:
+            st.error("Model discovery failed. Check key or network.")
+
+# ---------- Locked view ----------
+if not st.session_state.model_name:
+    default_bg = background_url("Landing")
+    style_bg = f"background-image: url('{default_bg}');" if default_bg else "background:#f1f5f9;"
+    st.markdown(f"<div class='bg-section' style='{style_bg}'>"
+                "<div class='content-box' style='max-width:620px;text-align:center;'>"
+                "<i class='fa-solid fa-lock' style='font-size:42px;color:#002D62'></i>"
+                "<h1 style='margin-top:10px;color:#002D62'>KonnectOps Login</h1>"
+                "<p class='subtitle'>Secure Digital Operations Center</p>"
+                "</div></div>", unsafe_allow_html=True)
+    key_input = st.text_input("Paste key (kept this session)", type="password", label_visibility="visible")
+    if st.button("Unlock Dashboard"):
+        if key_input:
+            st.session_state.api_key = key_input
+            rerun_app()
+        else:
+            st.warning("Please paste your key.")
+    finish_rerun()
+    st.stop()
+
+# ---------- Main header ----------
+st.markdown("<div style='padding:12px 24px'><span style='font-size:20px;color:#002D62;font-weight:700;'>KonnectOps Mobile</span></div>", unsafe_allow_html=True)
+
+# ---------- Tabs ----------
+tabs = st.tabs([label for _, label in TAB_LAYOUT])
+TAB_RENDERERS = {"Landing": landing_tab, "Content": content_tab, "Images": images_tab, "Calendar": calendar_tab,
+                 "Utilities": utilities_tab, "Blog": blog_tab, "Uploads": uploads_tab, "Zoho": zoho_tab}
+for tab, (tab_key, _) in zip(tabs, TAB_LAYOUT):
+    with tab:
+        TAB_RENDERERS[tab_key](background_url(tab_key))
+
+with st.expander("Diagnostics & last AI error", expanded=False):
+    diagnostics_panel()
 
 st.markdown("</div>", unsafe_allow_html=True)
+finish_rerun()
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# konnect_core reads its cache locations at import time; keep test runs out of ~/.cache.
+os.environ.setdefault("KONNECTOPS_CACHE_DIR", tempfile.mkdtemp(prefix="konnectops-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
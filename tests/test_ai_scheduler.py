@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+import konnect_core
+from konnect_core import AIScheduler, TokenBucket
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(konnect_core, "AI_BACKOFF_BASE_SECONDS", 0.001)
+
+
+def scheduler(**kwargs):
+    return AIScheduler(**dict({"rate": 1000, "burst": 1000}, **kwargs))
+
+
+def run_coalesced(sched, n, fn):
+    """n concurrent run() calls with one coalesce key; the first is in flight before the others start."""
+    started, release, results = threading.Event(), threading.Event(), [None] * n
+
+    def upstream():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(i):
+        try: results[i] = sched.run("key", "same prompt", upstream)
+        except Exception as e: results[i] = e
+
+    threads = [threading.Thread(target=call, args=(0,))]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=call, args=(i,)) for i in range(1, n)]
+    for t in threads[1:]: t.start()
+    deadline = time.monotonic() + 5
+    while sched.counters["coalesced"] < n - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in threads: t.join(5)
+    return results
+
+
+def test_identical_calls_share_one_upstream_result():
+    sched, calls = scheduler(), []
+    results = run_coalesced(sched, 5, lambda: calls.append(1) or "answer")
+    assert results == ["answer"] * 5 and len(calls) == 1
+    assert sched.counters["coalesced"] == 4 and sched.stats()["in_flight_groups"] == 0
+
+
+def test_identical_calls_share_one_upstream_error():
+    sched, calls = scheduler(), []
+    def fail():
+        calls.append(1)
+        raise APIError(400)
+    results = run_coalesced(sched, 4, fail)
+    assert len(calls) == 1 and all(isinstance(r, APIError) for r in results) and len({id(r) for r in results}) == 1
+
+
+def test_rate_limits_are_retried():
+    sched, calls = scheduler(), []
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3: raise APIError(429)
+        return "ok"
+    assert sched.run("key", None, flaky) == "ok"
+    assert len(calls) == 3 and sched.counters["retries"] == 2 and sched.counters["failures"] == 0
+
+
+def test_retries_stop_after_max_attempts():
+    sched, calls = scheduler(max_attempts=3), []
+    def limited():
+        calls.append(1)
+        raise APIError(429)
+    with pytest.raises(APIError):
+        sched.run("key", None, limited)
+    assert len(calls) == 3 and sched.counters["failures"] == 1
+
+
+@pytest.mark.parametrize("exc", [APIError(400), APIError(403), ValueError("bad prompt")])
+def test_other_errors_are_raised_at_once(exc):
+    sched, calls = scheduler(), []
+    def fail():
+        calls.append(1)
+        raise exc
+    with pytest.raises(type(exc)):
+        sched.run("key", None, fail)
+    assert len(calls) == 1 and sched.counters["retries"] == 0
+
+
+def test_concurrency_is_capped():
+    sched, lock, state = scheduler(max_concurrency=2), threading.Lock(), {"now": 0, "peak": 0}
+    def work():
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.02)
+        with lock: state["now"] -= 1
+    threads = [threading.Thread(target=sched.run, args=("key", None, work)) for _ in range(6)]
+    for t in threads: t.start()
+    for t in threads: t.join(5)
+    assert state["peak"] == 2 and sched.stats()["running"] == 0
+
+
+def test_token_bucket_waits_once_the_burst_is_spent():
+    bucket = TokenBucket(rate=20, burst=2)
+    started = time.monotonic()
+    bucket.acquire()
+    bucket.acquire()
+    assert time.monotonic() - started < 0.02
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.04
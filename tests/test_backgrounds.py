@@ -0,0 +1,24 @@
+import os
+import time
+
+from konnect_core import prune_backgrounds
+
+
+def touch(path, age):
+    path.write_bytes(b"x")
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+
+def test_prune_keeps_the_most_recently_used(tmp_path):
+    for i in range(5):
+        touch(tmp_path / f"{i}.webp", age=i * 60)
+    touch(tmp_path / "old.webp", age=40 * 24 * 3600)
+    touch(tmp_path / ".new.webp.1.tmp", age=10)
+    touch(tmp_path / ".dead.webp.2.tmp", age=2 * 3600)
+    assert prune_backgrounds(str(tmp_path), max_files=3, max_age_seconds=30 * 24 * 3600) == 4
+    assert sorted(os.listdir(tmp_path)) == [".new.webp.1.tmp", "0.webp", "1.webp", "2.webp"]
+
+
+def test_prune_missing_directory(tmp_path):
+    assert prune_backgrounds(str(tmp_path / "nope")) == 0
@@ -0,0 +1,83 @@
+import mmap
+import os
+import time
+
+import konnect_core
+from konnect_core import BlobStore
+
+
+def files(root):
+    return sorted(f for _, _, names in os.walk(root) for f in names)
+
+
+def test_same_bytes_are_stored_once_across_sessions(tmp_path):
+    store = BlobStore(str(tmp_path))
+    a = store.put("s1", b"cover", "image/png")
+    assert store.put("s2", b"cover") == a
+    assert store.stats()["blobs"] == 1 and store.dedup_hits == 1
+    assert store.content_type(a) == "image/png"
+    store.release("s1", a)
+    assert store.get(a) == b"cover"
+    store.release("s2", a)
+    assert store.get(a) is None and store.stats()["resident_bytes"] == 0
+
+
+def test_over_budget_blobs_spill_and_read_back_as_mmap(tmp_path):
+    store = BlobStore(str(tmp_path), memory_budget=1000, session_budget=20)
+    first, second, third = (store.put("s1", bytes([i]) * 8) for i in range(3))
+    assert store.spills == 1 and store.stats()["resident_bytes"] == 16
+    data = store.get(first)
+    assert isinstance(data, mmap.mmap) and data[:] == bytes([0]) * 8
+    assert store.get(third) == bytes([2]) * 8 and store.disk_reads == 1
+    store.release("s1", first)
+    assert files(tmp_path) == []
+
+
+def test_process_budget_counts_every_session(tmp_path):
+    store = BlobStore(str(tmp_path), memory_budget=20, session_budget=1000)
+    digests = [store.put(f"s{i}", bytes([i]) * 8) for i in range(4)]
+    assert store.spills == 2 and store.stats()["resident_bytes"] == 16
+    assert [store.get(d)[:] for d in digests] == [bytes([i]) * 8 for i in range(4)]
+
+
+def test_release_while_spilling_removes_the_file(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path), memory_budget=1000, session_budget=10)
+    first = store.put("s1", b"a" * 8)
+    real_replace = os.replace
+
+    def release_then_replace(src, dst):
+        store.release("s1", first)  # another thread drops the blob while its file is written
+        real_replace(src, dst)
+
+    monkeypatch.setattr(konnect_core.os, "replace", release_then_replace)
+    store.put("s1", b"b" * 8)
+    assert store.get(first) is None
+    assert files(tmp_path) == [] and store.spills == 0
+    assert store.stats()["resident_bytes"] == 8 and not store._spilling
+
+
+def test_release_session_and_sweep(tmp_path):
+    store = BlobStore(str(tmp_path))
+    shared = store.put("s1", b"shared")
+    own = store.put("s1", b"own")
+    store.put("s2", b"shared")
+    store.put("s3", b"idle")
+    store.release_session("s1")
+    assert store.get(own) is None and store.get(shared) == b"shared"
+
+    store._sessions["s3"]["seen"] = time.time() - 7200
+    store.sweep(idle_seconds=3600)  # swept at most once per BLOB_SWEEP_INTERVAL
+    assert store.stats()["sessions"] == 2
+    store._last_sweep = 0
+    store.sweep(idle_seconds=3600, is_active=lambda sid: sid != "s2")
+    stats = store.stats()
+    assert stats["blobs"] == 0 and stats["sessions"] == 0 and stats["resident_bytes"] == 0
+
+
+def test_orphaned_spill_files_are_removed(tmp_path):
+    dead = tmp_path / "999999999" / "ab"
+    dead.mkdir(parents=True)
+    (dead / "abcd").write_bytes(b"x")
+    (tmp_path / "keep.txt").write_bytes(b"x")
+    BlobStore(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["keep.txt"]
@@ -0,0 +1,49 @@
+import threading
+
+from konnect_core import AIContext, BLOG_SECTIONS, assemble_blog, blog_jobs, run_blog_sections
+
+PROJECT = {"project": "Nova", "location": "OMR", "developer": "DRA", "usps": "Metro", "price": "45L",
+           "possession": "2027", "phone": "+91 98765 43210", "email": ""}
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def generate_content(self, prompt, stream=False):
+        if "Write ONLY the FAQ part" in prompt:
+            raise RuntimeError("quota")
+        heading = prompt.split("'## ")[1].split("'")[0] if "'## " in prompt else None
+        words = ([f"## {heading}\n\n"] if heading else ["# Nova\n\n"]) + ["Some ", "words."]
+        return [Chunk(w) for w in words] if stream else Chunk("".join(words))
+
+
+class FakeContext(AIContext):
+    def __init__(self):
+        super().__init__("fake-model")
+
+    def client(self, model_name=None):
+        return FakeModel()
+
+
+def test_sections_stream_on_the_calling_thread():
+    caller, seen, done = threading.get_ident(), {}, []
+    def on_chunk(i, key, text):
+        assert threading.get_ident() == caller
+        seen.setdefault(key, []).append(text)
+    results = run_blog_sections([PROJECT], blog_jobs([PROJECT]), FakeContext(), workers=4,
+                                on_section=lambda i, key, text, error: done.append(key), on_chunk=on_chunk)
+    generated = [s.key for s in BLOG_SECTIONS if s.instructions]
+    assert sorted(done) == sorted(generated) and set(results) == {(0, k) for k in generated}
+    assert results[(0, "highlights")] == ("## Project Highlights\n\nSome words.", None)
+    assert seen["highlights"][-1] == "## Project Highlights\n\nSome words." and len(seen["highlights"]) == 3
+    assert results[(0, "faq")] == (None, "Error (AI): quota")
+    blog = assemble_blog(PROJECT, {k: t for (_, k), (t, e) in results.items() if t})
+    assert "## FAQ\n\n_(Not generated yet.)_" in blog and "wa.me/919876543210" in blog
+
+
+def test_sections_without_streaming_match():
+    streamed = run_blog_sections([PROJECT], blog_jobs([PROJECT]), FakeContext(), on_chunk=lambda *a: None)
+    assert run_blog_sections([PROJECT], blog_jobs([PROJECT]), FakeContext()) == streamed
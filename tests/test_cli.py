@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from konnect_core import JOB_TYPES, AIContext, main, monthly_emi, run_job, whatsapp_link
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.delenv("KONNECTOPS_API_KEY", raising=False)
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+
+
+def run_cli(tmp_path, jobs, *args):
+    src, dst = tmp_path / "jobs.jsonl", tmp_path / "results.jsonl"
+    src.write_text("\n".join(j if isinstance(j, str) else json.dumps(j) for j in jobs) + "\n", encoding="utf-8")
+    code = main([str(src), "-o", str(dst), "--ordered", *args])
+    return code, [json.loads(line) for line in dst.read_text(encoding="utf-8").splitlines()]
+
+
+def test_local_jobs_run_offline(tmp_path, offline, capsys):
+    code, results = run_cli(tmp_path, [
+        {"id": "a", "type": "emi", "principal": 5_000_000, "rate": 8.5, "years": 20},
+        {"type": "whatsapp", "phone": 919840012345, "message": "Hi there"},
+        "",
+        {"type": "emi_grid", "principal": "1000000 2000000", "rate": "8:9:0.5", "years": 10},
+        {"type": "amortization", "principal": 1_200_000, "rate": 0, "years": 1, "prepayments": {"6": 600_000}},
+        {"type": "landing", "template": "<h1>{PROJECT_NAME}</h1><p>{PRICE}</p>", "price": "85 L",
+         "extra": {"PROJECT_NAME": "Nova"}},
+    ], "--stats")
+    assert code == 0 and all(r["ok"] for r in results)
+    assert [r["id"] for r in results] == ["a", 1, 2, 3, 4]
+    assert results[0]["result"] == {"emi": round(monthly_emi(5_000_000, 8.5, 20), 2)}
+    assert results[1]["result"] == whatsapp_link("919840012345", "Hi there")
+    assert len(results[2]["result"]["emi"]) == 2 and len(results[2]["result"]["emi"][0]) == 3
+    assert results[3]["result"]["months"] == 6 and results[3]["result"]["total_interest"] == 0
+    assert results[4]["result"] == {"html": "<h1>Nova</h1><p>85 L</p>", "missing": [], "unused": ["LOCATION"]}
+    stats = json.loads(capsys.readouterr().err.strip().splitlines()[-1])
+    assert stats["jobs"] == 5 and stats["failed"] == 0 and stats["local_jobs"] == 4
+
+
+def test_bad_jobs_fail_alone(tmp_path, offline):
+    code, results = run_cli(tmp_path, [
+        "{not json",
+        [1, 2],
+        {"type": "nope"},
+        {"type": "emi", "principal": 1_000_000},
+        {"type": "translate"},
+        {"type": "emi", "principal": "lots", "rate": 8.5, "years": 20},
+        {"type": "text", "prompt": "hello"},
+        {"type": "cover_prompt", "project": "Nova"},
+    ])
+    assert code == 1
+    errors = [r.get("error", "") for r in results]
+    assert errors[0].startswith("JSONDecodeError")
+    assert errors[1] == "ValueError: job must be a JSON object"
+    assert errors[2].startswith("ValueError: unknown job type 'nope'")
+    assert errors[3] == "ValueError: missing fields: rate, years"
+    assert errors[4] == "ValueError: missing field: text or texts"
+    assert errors[5] == "ValueError: could not convert string to float: 'lots'"
+    assert errors[6] == "RuntimeError: Offline (no model configured)."
+    assert results[7]["ok"]
+
+
+def test_handler_key_errors_are_not_reported_as_missing_fields(monkeypatch):
+    monkeypatch.setitem(JOB_TYPES, "emi", lambda ctx, job: job["schedule"]["bug"])
+    res = run_job(AIContext(None), 0, json.dumps({"type": "emi", "principal": 1, "rate": 8, "years": 10, "schedule": {}}))
+    assert res["ok"] is False and res["error"] == "KeyError: 'bug'"
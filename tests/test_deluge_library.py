@@ -0,0 +1,72 @@
+import pytest
+
+from konnect_core import DelugeLibrary, close_match, request_vectors
+
+STORED = [
+    "create a task when a deal is won",
+    "update lead status when email opens",
+    "send a welcome email to new contacts",
+]
+
+
+@pytest.fixture
+def library(tmp_path):
+    lib = DelugeLibrary(str(tmp_path))
+    for request in STORED:
+        lib.add(request, f"// {request}", "fake-model")
+    return lib
+
+
+@pytest.mark.parametrize("request_, stored", [
+    ("Update the lead status whenever an email is opened", "update lead status when email opens"),
+    ("create tasks when deals are won", "create a task when a deal is won"),
+    ("Please write a script to send welcome emails to new contacts", "send a welcome email to new contacts"),
+    ("set lead status on email open", "update lead status when email opens"),
+    ("add a task when a deal is won", "create a task when a deal is won"),
+    ("change lead status when email is viewed", "update lead status when email opens"),
+])
+def test_rewordings_reuse_the_stored_script(library, request_, stored):
+    match = close_match(request_, library.search(request_))
+    assert match is not None and match["request"] == stored
+
+
+@pytest.mark.parametrize("request_", [
+    "create a task when a deal is lost",
+    "update lead status when email bounces",
+    "do not update lead status when email opens",
+    "don't send a welcome email to new contacts",
+    "update lead status when email opens and notify the owner",
+    "update lead status when email isn't opened",
+    "remove a task when a deal is won",
+])
+def test_negated_and_antonym_requests_are_not_reused(library, request_):
+    matches = library.search(request_)
+    assert matches, "a similar script should still be suggested"
+    assert close_match(request_, matches) is None
+
+
+def test_search_orders_by_score_and_respects_min_score(library):
+    matches = library.search("update lead status when email opens", k=3, min_score=0.0)
+    assert matches[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert [m["score"] for m in matches] == sorted((m["score"] for m in matches), reverse=True)
+    assert library.search("calculate the monthly emi for a home loan") == []
+
+
+def test_library_reloads_from_disk(tmp_path, library):
+    reopened = DelugeLibrary(str(tmp_path))
+    assert reopened.stats()["scripts"] == len(STORED)
+    assert reopened.search("create a task when a deal is won")[0]["script"] == "// create a task when a deal is won"
+
+
+def test_missing_vectors_are_rebuilt(tmp_path, library):
+    (tmp_path / "vectors.f32").unlink()
+    reopened = DelugeLibrary(str(tmp_path))
+    assert reopened.search(STORED[2])[0]["request"] == STORED[2]
+    assert (tmp_path / "vectors.f32").stat().st_size == len(STORED) * reopened.dim * 4
+
+
+def test_request_vectors_are_unit_length():
+    vecs = request_vectors(STORED + [""])
+    norms = (vecs ** 2).sum(axis=1)
+    assert norms[:-1] == pytest.approx(1.0, abs=1e-5)
+    assert norms[-1] == 0
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from konnect_core import (amortization_schedule, emi_array, emi_grid, grid_columns, monthly_emi, number_list,
+                          prepayment_plan, schedule_totals, yearly_schedule, SCHEDULE_COLUMNS, YEARLY_COLUMNS)
+
+
+def reference_schedule(principal, annual_rate, years, prepayments=None, step_up_pct=0.0, prepay_reduces="tenure"):
+    """Month-by-month loop the vectorized schedule must agree with."""
+    n, r = int(round(years * 12)), annual_rate / 1200
+    emi_for = lambda p, m: p * r / (1 - (1 + r) ** -m) if r else p / m
+    emi, balance, rows = emi_for(principal, n), float(principal), []
+    for month in range(1, n + 1):
+        if balance <= 0.005:
+            break
+        interest = balance * r
+        paid = balance + interest if month == n or balance + interest - emi <= 0.005 else emi
+        closing = balance + interest - paid
+        extra = min((prepayments or {}).get(month, 0.0), closing)
+        closing -= extra
+        rows.append((month, paid, interest, extra, closing))
+        balance = closing
+        if month in (prepayments or {}) and prepay_reduces == "emi" and balance > 0.005:
+            emi = emi_for(balance, n - month)
+        if step_up_pct and month % 12 == 0:
+            emi *= 1 + step_up_pct / 100
+    return np.array(rows)
+
+
+def test_monthly_emi_matches_the_textbook_formula():
+    p, r, n = 5_000_000, 8.5 / 1200, 240
+    assert monthly_emi(p, 8.5, 20) == pytest.approx(p * r * (1 + r) ** n / ((1 + r) ** n - 1), rel=1e-12)
+
+
+def test_zero_rate_is_a_straight_line():
+    assert monthly_emi(120_000, 0, 1) == 10_000
+    s = amortization_schedule(120_000, 0, 1)
+    assert np.allclose(s["emi"], 10_000) and np.allclose(s["interest"], 0)
+    assert s["closing"][-1] == 0
+    assert schedule_totals(s)["total_interest"] == 0
+
+
+def test_zero_principal_gives_an_empty_schedule():
+    s = amortization_schedule(0, 8.5, 20)
+    assert all(s[c].size == 0 for c in SCHEDULE_COLUMNS)
+    y = yearly_schedule(s)
+    assert set(y) == set(YEARLY_COLUMNS) and all(v.size == 0 for v in y.values())
+    assert schedule_totals(s) == {"months": 0, "total_interest": 0.0, "total_prepaid": 0.0, "total_paid": 0.0,
+                                  "first_emi": 0.0, "last_emi": 0.0}
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"prepayments": {12: 200_000, 36: 500_000}},
+    {"prepayments": {12: 200_000, 36: 500_000}, "prepay_reduces": "emi"},
+    {"step_up_pct": 5},
+    {"prepayments": {24: 300_000}, "step_up_pct": 7.5},
+    {"prepayments": {6: 10_000_000}},  # pays the loan off outright
+])
+def test_schedule_matches_a_month_by_month_loop(kwargs):
+    s = amortization_schedule(5_000_000, 8.5, 20, **kwargs)
+    ref = reference_schedule(5_000_000, 8.5, 20, **kwargs)
+    assert s["month"].tolist() == ref[:, 0].astype(int).tolist()
+    for i, col in enumerate(("emi", "interest", "prepayment", "closing"), 1):
+        assert np.allclose(s[col], ref[:, i], rtol=1e-9, atol=1e-4), col
+    assert np.allclose(s["opening"] - s["principal"] - s["prepayment"], s["closing"], atol=1e-6)
+
+
+def test_yearly_schedule_sums_each_year():
+    s = amortization_schedule(1_000_000, 9, 2.5)
+    y = yearly_schedule(s)
+    assert y["year"].tolist() == [1, 2, 3]
+    assert y["emi"].sum() == pytest.approx(s["emi"].sum())
+    assert y["closing"][-1] == 0 and y["closing"][0] == pytest.approx(s["closing"][11])
+
+
+def test_emi_grid_broadcasts_loans_rates_and_tenures():
+    grid = emi_grid([1e6, 5e6], [0, 8.5, 9.1], [10, 20])
+    assert grid["emi"].shape == (2, 3, 2)
+    for i, p in enumerate(grid["principal"]):
+        for j, r in enumerate(grid["rate"]):
+            for k, y in enumerate(grid["years"]):
+                assert grid["emi"][i, j, k] == pytest.approx(monthly_emi(p, r, y), rel=1e-12)
+    assert np.allclose(grid["total_interest"][:, 0, :], 0)
+    cols = grid_columns(grid)
+    assert all(len(v) == 12 for v in cols.values())
+
+
+def test_invalid_loans_are_rejected():
+    with pytest.raises(ValueError):
+        emi_array(1e6, -1, 120)
+    with pytest.raises(ValueError):
+        amortization_schedule(1e6, 8.5, 0)
+    with pytest.raises(ValueError):
+        amortization_schedule(-1, 8.5, 10)
+    with pytest.raises(ValueError):
+        emi_grid(range(1000), range(1000), range(2))
+
+
+def test_number_list_and_prepayment_plan():
+    assert number_list("8.4, 8.75 9.1") == [8.4, 8.75, 9.1]
+    assert number_list("8:9:0.25") == [8.0, 8.25, 8.5, 8.75, 9.0]
+    with pytest.raises(ValueError):
+        number_list("8:9:0")
+    assert prepayment_plan("12:1_000, 18:500", annual_amount=100, months=36) == {12: 1100.0, 24: 100.0, 36: 100.0, 18: 500.0}
+    with pytest.raises(ValueError):
+        prepayment_plan("12-1000")
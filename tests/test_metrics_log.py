@@ -0,0 +1,38 @@
+import json
+
+import konnect_core
+from konnect_core import MetricsLog
+
+
+def read_events(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_writes_go_through_one_open_handle(tmp_path, monkeypatch):
+    path = tmp_path / "logs" / "metrics.jsonl"
+    log = MetricsLog(str(path))
+    log.write({"event": "ask_ai", "n": 0})
+    handle = log._fh
+    monkeypatch.setattr("builtins.open", lambda *a, **k: (_ for _ in ()).throw(AssertionError("reopened")))
+    for n in range(1, 5): log.write({"event": "ask_ai", "n": n})
+    assert log._fh is handle
+    assert [e["n"] for e in read_events(path)] == [0, 1, 2, 3, 4]
+    log.close()
+
+
+def test_rotates_on_the_periodic_size_check(tmp_path, monkeypatch):
+    monkeypatch.setattr(konnect_core, "METRICS_LOG_MAX_BYTES", 100)
+    path = tmp_path / "metrics.jsonl"
+    log = MetricsLog(str(path), check_every=5)
+    for n in range(4): log.write({"event": "x" * 40, "n": n})
+    assert not (tmp_path / "metrics.jsonl.1").exists()
+    log.write({"event": "x" * 40, "n": 4})
+    log.close()
+    assert [e["n"] for e in read_events(tmp_path / "metrics.jsonl.1")] == [0, 1, 2, 3]
+    assert [e["n"] for e in read_events(path)] == [4]
+
+
+def test_empty_path_disables_the_log(tmp_path):
+    log = MetricsLog("")
+    log.write({"event": "ask_ai"})
+    assert log._fh is None
@@ -0,0 +1,42 @@
+import pytest
+
+import konnect_core
+from konnect_core import ModelRegistry
+
+
+class FakeGenAI:
+    def __init__(self):
+        self.listings = 0
+
+    def configure(self, api_key):
+        self.key = api_key
+
+    def list_models(self):
+        self.listings += 1
+        return [{"name": "models/gemini-pro", "supported_generation_methods": ["generateContent"]},
+                {"name": "models/embedding", "supported_generation_methods": ["embedContent"]}]
+
+    def GenerativeModel(self, name):
+        return object()
+
+
+@pytest.fixture
+def genai(monkeypatch):
+    fake = FakeGenAI()
+    monkeypatch.setattr(konnect_core, "genai_module", lambda: fake)
+    return fake
+
+
+def test_discovery_is_shared_until_invalidated(genai):
+    registry = ModelRegistry(ttl_seconds=900)
+    assert registry.default_model("key-a") == "models/gemini-pro"
+    assert registry.discover("key-a")["models/embedding"]["generate"] is False
+    client = registry.client("key-a", "models/gemini-pro")
+    assert registry.client("key-a", "models/gemini-pro") is client and genai.listings == 1
+
+    registry.discover("key-b")
+    registry.invalidate("key-a")
+    assert registry.stats()["keys_indexed"] == 1 and registry.stats()["pooled_clients"] == 0
+    registry.discover("key-a")
+    assert genai.listings == 3
+    assert registry.client("key-a", "models/gemini-pro") is not client
@@ -0,0 +1,80 @@
+import pytest
+
+import konnect_core
+from konnect_core import AIContext, ResponseCache, cache_key, generate_text
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(konnect_core.time, "time", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.set("k", "v")
+    clock[0] += 59
+    assert cache.get("k") == "v"
+    clock[0] += 2
+    assert cache.get("k") is None
+    assert ResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60).get("k") is None  # on disk too
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(None, memory_items=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # a is now the most recent
+    cache.set("c", "3")
+    assert cache.get("b") is None and cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ResponseCache(path).set("k", "v")
+    cache = ResponseCache(path)
+    assert cache.get("k") == "v" and cache.get("k") == "v"
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1 and stats["memory_entries"] == 1
+
+
+def test_disk_is_trimmed_to_the_most_recently_used(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), memory_items=1, disk_items=50)
+    for i in range(99):
+        clock[0] += 1
+        cache.set(f"k{i}", str(i))
+    clock[0] += 1
+    assert cache.get("k0") == "0"  # read back from disk: now the most recently used
+    clock[0] += 1
+    cache.set("k99", "99")  # the 100th write trims the disk
+    assert cache.stats()["disk_entries"] == 50
+    assert cache.get("k0") == "0" and cache.get("k99") == "99" and cache.get("k1") is None
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        return type("Response", (), {"text": f"answer {self.calls}"})()
+
+
+class FakeContext(AIContext):
+    def __init__(self, cache):
+        super().__init__("fake-model", cache=cache)
+        self.model = FakeModel()
+
+    def client(self, model_name=None):
+        return self.model
+
+
+def test_use_cache_false_skips_the_lookup_but_refreshes_the_entry():
+    ctx = FakeContext(ResponseCache(None))
+    assert generate_text(ctx, "prompt") == "answer 1"
+    assert generate_text(ctx, "prompt") == "answer 1" and ctx.model.calls == 1
+    assert generate_text(ctx, "prompt", use_cache=False) == "answer 2" and ctx.model.calls == 2
+    assert generate_text(ctx, "prompt") == "answer 2"
+    assert ctx.cache.get(cache_key("fake-model", "prompt")) == "answer 2"
@@ -0,0 +1,41 @@
+from konnect_core import compile_template, landing_values, read_landing_rows, unique_file_name
+
+
+def test_placeholders_and_literal_swaps_render_in_one_pass():
+    tpl = compile_template("<h1>Old Tower</h1><p>{LOCATION} from {PRICE}</p><p>{DESC}</p>", ("Old Tower",))
+    res = tpl.render({"LOCATION": "OMR", "PRICE": "{DESC}", "BHK": "3"}, {"Old Tower": "New Heights"})
+    assert res.text == "<h1>New Heights</h1><p>OMR from {DESC}</p><p>{DESC}</p>"
+    assert res.missing == ["DESC"]
+    assert res.unused == ["BHK"]
+
+
+def test_longer_literal_wins_over_its_prefix():
+    tpl = compile_template("Casagrand Flagship by Casagrand", ("Casagrand", "Casagrand Flagship"))
+    assert tpl.render({}, {"Casagrand Flagship": "Nova", "Casagrand": "CG"}).text == "Nova by CG"
+
+
+def test_lowercase_braces_are_not_placeholders():
+    tpl = compile_template("body { color: red } {NAME_2} {name}")
+    assert tpl.placeholders == {"NAME_2"}
+    assert tpl.render({"NAME_2": "x"}).text == "body { color: red } x {name}"
+
+
+def test_compiled_templates_are_cached():
+    a = compile_template("<p>{PRICE}</p>", ("old",))
+    assert compile_template("<p>{PRICE}</p>", ("old", "")) is a
+    assert compile_template("<p>{PRICE}</p>") is not a
+
+
+def test_landing_values_keep_extra_columns():
+    assert landing_values("1 Cr", "", {"BHK": "3"}) == {"BHK": "3", "PRICE": "1 Cr", "LOCATION": ""}
+
+
+def test_read_landing_rows_maps_forgiving_headers():
+    rows = read_landing_rows("\ufeffProject Name,LOC,Old_Name,Sq Ft\nNova,OMR,Old Tower,1200\n,skipped,,\n".encode())
+    assert rows == [{"project": "Nova", "location": "OMR", "price": "", "old_name": "Old Tower", "extra": {"SQ_FT": "1200"}}]
+
+
+def test_unique_file_name():
+    used = set()
+    assert [unique_file_name(s, used) for s in ("Nova Towers", "Nova Towers", "", "a/b")] == \
+        ["Nova_Towers.html", "Nova_Towers_2.html", "page.html", "a_b.html"]
@@ -0,0 +1,77 @@
+import re
+import threading
+
+
+from konnect_core import (AIContext, TranslationMemory, glossary_pattern, parse_batch_reply, protect, restore,
+                          split_segments, translate_texts)
+
+
+class FakeModel:
+    """Answers batch prompts line by line with 'ta: <line>'; lines in ``drop`` are left out of the first reply."""
+
+    def __init__(self, drop=()):
+        self.drop, self.prompts, self._lock = set(drop), [], threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        lines = re.findall(r"^<<(\d+)>> (.*)$", prompt, re.MULTILINE)
+        keep = [(n, text) for n, text in lines if text not in self.drop]
+        self.drop -= {text for _, text in lines}
+        return type("Response", (), {"text": "\n".join(f"<<{n}>> ta: {text}" for n, text in keep)})()
+
+
+class FakeContext(AIContext):
+    def __init__(self, model):
+        super().__init__("fake-model")
+        self.model = model
+
+    def client(self, model_name=None):
+        return self.model
+
+
+def test_split_segments_round_trips():
+    text = "  Rs. 85 L onwards. Sq. Ft. 1200!\n\nCall now?  Visit Nova Towers.\n"
+    parts = split_segments(text)
+    assert "".join(p for _, p in parts) == text
+    assert [p for is_seg, p in parts if is_seg] == ["Rs. 85 L onwards.", "Sq. Ft. 1200!", "Call now?", "Visit Nova Towers."]
+
+
+def test_protect_and_restore_glossary_terms():
+    pattern = glossary_pattern(["Nova", "Nova Towers", " "])
+    masked, names = protect("Nova Towers by nova, next to Nova Towers.", pattern)
+    assert masked == "[[1]] by [[2]], next to [[1]]."
+    assert restore(masked, names) == "Nova Towers by nova, next to Nova Towers."
+    assert protect("Nova", None) == ("Nova", [])
+
+
+def test_parse_batch_reply():
+    reply = "```\n<<1>> first\n<<2>> second\ncontinued\n\n```\n<<10>>tenth"
+    assert parse_batch_reply(reply) == {1: "first", 2: "second continued", 10: "tenth"}
+
+
+def test_translate_texts_batches_misses_and_reuses_memory():
+    tm = TranslationMemory(None)
+    model = FakeModel()
+    out, stats = translate_texts(["Welcome to Nova. Book now!", "Book now!\n123"], FakeContext(model), tm, glossary=["Nova"])
+    assert out == ["ta: Welcome to Nova. ta: Book now!", "ta: Book now!\n123"]
+    assert stats["unique"] == 2 and stats["model_segments"] == 2 and stats["model_calls"] == 1 and stats["failed"] == 0
+    assert "<<1>> Welcome to [[1]]." in model.prompts[0]
+
+    again = FakeModel()
+    out, stats = translate_texts(["Welcome to Skyline.", "book now"], FakeContext(again), tm, glossary=["Skyline"])
+    assert out == ["ta: Welcome to Skyline.", "ta: Book now"]
+    assert stats["from_memory"] == 2 and stats["model_calls"] == 0 and again.prompts == []
+
+
+def test_dropped_lines_are_retried():
+    model = FakeModel(drop={"Second line."})
+    out, stats = translate_texts(["First line. Second line."], FakeContext(model), TranslationMemory(None), glossary=[])
+    assert out == ["ta: First line. ta: Second line."]
+    assert stats["model_calls"] == 2 and stats["failed"] == 0
+
+
+def test_offline_leaves_text_in_english():
+    out, stats = translate_texts(["Hello there."], AIContext(None), TranslationMemory(None), glossary=[])
+    assert out == ["Hello there."]
+    assert stats["failed"] == 1
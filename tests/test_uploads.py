@@ -0,0 +1,11 @@
+from konnect_core import ProgressReader
+
+
+def test_progress_reader_counts_each_byte_once():
+    sent = []
+    reader = ProgressReader(b"x" * 10, sent.append)
+    assert reader.read(4) == b"xxxx"
+    reader.seek(0)  # a retried chunk is read again
+    reader.read(6)
+    assert reader.read() == b"xxxx" and reader.read(3) == b""
+    assert sent == [4, 2, 4] and reader.tell() == 10
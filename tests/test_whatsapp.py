@@ -0,0 +1,56 @@
+import csv
+import io
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pytest
+
+from konnect_core import build_whatsapp_links, normalize_phones, whatsapp_link
+
+
+def test_normalize_phones():
+    raw = pd.Series(["98400 12345", "098400-12346", "+91 98400 12347", "0091 9840012348", "+44 7700 900123",
+                     "", None, "12345", "44 2345 6789", "1234567890123456"])
+    digits, reason = normalize_phones(raw, "91")
+    assert digits.tolist()[:5] == ["919840012345", "919840012346", "919840012347", "919840012348", "447700900123"]
+    assert reason.tolist() == ["", "", "", "", "", "missing phone", "missing phone", "invalid length",
+                               "not a mobile number", "invalid length"]
+
+
+def build(rows, chunk_rows=2, **kwargs):
+    src = io.StringIO()
+    csv.writer(src).writerows(rows)
+    out, rejected = io.StringIO(), io.StringIO()
+    stats = build_whatsapp_links(io.BytesIO(src.getvalue().encode()), kwargs.pop("template", "Hi {NAME}, about {PROJECT}"),
+                                 out, rejected, "91", chunk_rows=chunk_rows, **kwargs)
+    return stats, list(csv.DictReader(io.StringIO(out.getvalue()))), list(csv.DictReader(io.StringIO(rejected.getvalue())))
+
+
+def test_bulk_links_dedupe_across_chunks_and_keep_rejected_rows():
+    stats, links, rejected = build([
+        ["Mobile", "Name", "Project", "Message"],
+        ["9840012345", "Asha", "", ""],
+        ["98400 12346", "", "Nova", ""],
+        ["+91 98400 12345", "Asha again", "", ""],  # same number, next chunk
+        ["12345", "Short", "", ""],
+        ["9840012347", "Ravi", "", "Call {NAME} re {PROJECT} & offers"],
+        ["", "Nobody", "", ""],
+    ], project="Default Tower", blank_name="Sir/Madam")
+    assert [r["whatsapp_number"] for r in links] == ["919840012345", "919840012346", "919840012347"]
+    assert [parse_qs(urlsplit(r["whatsapp_link"]).query)["text"][0] for r in links] == \
+        ["Hi Asha, about Default Tower", "Hi Sir/Madam, about Nova", "Call Ravi re Default Tower & offers"]
+    assert links[0]["whatsapp_link"] == whatsapp_link("919840012345", "Hi Asha, about Default Tower")
+    assert [(r["Name"], r["reason"]) for r in rejected] == \
+        [("Asha again", "duplicate"), ("Short", "invalid length"), ("Nobody", "missing phone")]
+    assert stats["rows"] == 6 and stats["links"] == 3 and stats["rejected"] == 3
+    assert stats["reasons"] == {"duplicate": 1, "invalid length": 1, "missing phone": 1}
+
+
+def test_other_columns_fill_their_placeholders():
+    _, links, _ = build([["phone", "first name", "BHK"], ["9840012345", "Asha", "3"]], template="{NAME}: {BHK} BHK {VIEW}")
+    assert parse_qs(urlsplit(links[0]["whatsapp_link"]).query)["text"][0] == "Asha: 3 BHK {VIEW}"
+
+
+def test_bulk_needs_a_phone_column():
+    with pytest.raises(ValueError, match="phone"):
+        build([["name"], ["Asha"]])